@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from . import shipment
+from . import shipment_kpi
 from . import packaging
 from . import qr_confirmation
 from . import returns
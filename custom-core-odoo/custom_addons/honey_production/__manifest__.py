@@ -38,6 +38,9 @@
         'views/quality_control_views.xml',
         'views/menu.xml',
     ],
+    'external_dependencies': {
+        'python': ['numpy'],
+    },
     'demo': [],
     'installable': True,
     'auto_install': False,
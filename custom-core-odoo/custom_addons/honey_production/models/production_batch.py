@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
 
@@ -226,23 +226,22 @@ class ProductionBatch(models.Model):
 
     def action_check_materials(self):
         """Check and update material availability"""
-        for record in self:
-            for requirement in record.material_requirements_ids:
-                requirement._compute_available_quantity()
+        self.mapped('material_requirements_ids')._compute_available_quantity()
 
     def action_create_material_requirements(self):
         """Create material requirements based on batch size and honey type"""
+        # Clear existing requirements
+        self.mapped('material_requirements_ids').unlink()
+
+        requirements = []
         for record in self:
-            # Clear existing requirements
-            record.material_requirements_ids.unlink()
-            
             # Create requirements based on batch size
-            requirements = []
             
             # Honey requirement (ml per stick)
             honey_per_stick = 10  # ml
             total_honey = record.batch_size * honey_per_stick
             requirements.append({
+                'batch_id': record.id,
                 'material_type': 'honey',
                 'material_subtype': record.honey_type,
                 'required_quantity': total_honey,
@@ -253,6 +252,7 @@ class ProductionBatch(models.Model):
             film_per_stick = 15  # cm
             total_film = record.batch_size * film_per_stick
             requirements.append({
+                'batch_id': record.id,
                 'material_type': 'film',
                 'required_quantity': total_film,
                 'unit': 'cm',
@@ -260,6 +260,7 @@ class ProductionBatch(models.Model):
             
             # Stickers requirement
             requirements.append({
+                'batch_id': record.id,
                 'material_type': 'sticker',
                 'required_quantity': record.batch_size,
                 'unit': 'pcs',
@@ -268,18 +269,15 @@ class ProductionBatch(models.Model):
             # Displays requirement (displays per batch)
             displays_per_batch = (record.batch_size // 20) + 1  # 20 sticks per display
             requirements.append({
+                'batch_id': record.id,
                 'material_type': 'display',
                 'material_subtype': record.display_type,
                 'required_quantity': displays_per_batch,
                 'unit': 'pcs',
             })
-            
-            # Create requirement records
-            for req_data in requirements:
-                self.env['honey.material.requirement'].create({
-                    'batch_id': record.id,
-                    **req_data
-                })
+
+        # Create requirement records
+        self.env['honey.material.requirement'].create(requirements)
 
 
 class MaterialRequirement(models.Model):
@@ -333,23 +331,56 @@ class MaterialRequirement(models.Model):
 
     @api.depends('material_type', 'material_subtype', 'required_quantity')
     def _compute_available_quantity(self):
+        # Products come from the cached material mapping, so stock is read
+        # by indexed product ids in a single grouped query. Saved requirements
+        # of unmapped materials are resolved once and added to the mapping.
+        Map = self.env['honey.material.product.map']
+        product_map = Map._get_product_map()
+        unmapped = {
+            record._get_product_map_key(): record._get_product_name()
+            for record in self
+            if record.id and not product_map.get((record.material_type, record.material_subtype or False))
+            and not product_map.get((record.material_type, False))
+        }
+        if unmapped:
+            Map._resolve_products(unmapped)
+            product_map = Map._get_product_map()
+        product_ids = {
+            record.id: product_map.get((record.material_type, record.material_subtype or False))
+            or product_map.get((record.material_type, False))
+            for record in self
+        }
+        quantities = {}
+        mapped_ids = list({product_id for product_id in product_ids.values() if product_id})
+        if mapped_ids:
+            for group in self.env['stock.quant'].read_group(
+                [('product_id', 'in', mapped_ids), ('quantity', '>', 0)],
+                ['product_id', 'quantity:sum'],
+                ['product_id'],
+            ):
+                quantities[group['product_id'][0]] = group['quantity']
+
         for record in self:
-            # This would typically check stock levels
-            # For now, we'll simulate availability
-            if record.material_type == 'honey':
-                # Check honey stock by type
-                stock = self.env['stock.quant'].search([
-                    ('product_id.name', 'ilike', record.material_subtype or 'honey'),
-                    ('quantity', '>', 0)
-                ])
-                record.available_quantity = sum(stock.mapped('quantity'))
-            else:
-                # For other materials, check general stock
-                stock = self.env['stock.quant'].search([
-                    ('product_id.name', 'ilike', record.material_type),
-                    ('quantity', '>', 0)
-                ])
-                record.available_quantity = sum(stock.mapped('quantity'))
+            record.available_quantity = quantities.get(product_ids[record.id], 0.0)
+
+    def _get_product_map_key(self):
+        """Mapping key an unmapped requirement is resolved under
+
+        Honey is mapped per variety, every other material once for all of
+        its subtypes.
+        """
+        self.ensure_one()
+        if self.material_type == 'honey':
+            return ('honey', self.material_subtype or False)
+        return (self.material_type, False)
+
+    def _get_product_name(self):
+        """Name of the product an unmapped requirement is resolved to"""
+        self.ensure_one()
+        label = dict(self._fields['material_type'].selection)[self.material_type]
+        if self.material_type == 'honey' and self.material_subtype:
+            return '%s - %s' % (label, self.material_subtype)
+        return label
 
     @api.depends('required_quantity', 'available_quantity')
     def _compute_status(self):
@@ -360,3 +391,107 @@ class MaterialRequirement(models.Model):
                 record.status = 'shortage'
             else:
                 record.status = 'unavailable'
+
+
+class MaterialProductMap(models.Model):
+    _name = 'honey.material.product.map'
+    _description = 'Material Type to Product Mapping'
+    _order = 'material_type, material_subtype'
+
+    material_type = fields.Selection([
+        ('honey', 'Honey'),
+        ('film', 'Film'),
+        ('sticker', 'Sticker'),
+        ('display', 'Display'),
+        ('packaging', 'Packaging'),
+    ], string='Material Type', required=True)
+    material_subtype = fields.Char(
+        string='Material Subtype',
+        help='Leave empty to use this product for every subtype of the material'
+    )
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade',
+        domain=[('type', '=', 'product')]
+    )
+
+    def init(self):
+        tools.create_unique_index(
+            self.env.cr, 'honey_material_product_map_key_uniq', self._table,
+            ['material_type', "COALESCE(material_subtype, '')"])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_product_map(self):
+        """Registry-level cache: {(material type, subtype or False): product id}"""
+        return {
+            (row['material_type'], row['material_subtype'] or False): row['product_id']
+            for row in self.sudo().search_read([], ['material_type', 'material_subtype', 'product_id'], load=None)
+        }
+
+    @api.model
+    def _resolve_products(self, names):
+        """Products for (material type, subtype) keys: {key: product id}
+
+        names maps each key to a product name. Keys without a mapping get
+        the product with that exact name, else the first stockable product
+        whose name contains the subtype (for honey) or the material type,
+        the way stock used to be looked up, else a new product. The result
+        is stored in the mapping, so each key is searched for only once.
+        """
+        product_map = self._get_product_map()
+        missing = {key: name for key, name in names.items() if key not in product_map}
+        if not missing:
+            return {key: product_map[key] for key in names}
+
+        Product = self.env['product.product'].sudo()
+        existing = {
+            product.name: product.id
+            for product in Product.search([('name', 'in', list(set(missing.values())))])
+        }
+        resolved = {}
+        for (material_type, subtype), name in missing.items():
+            if name in existing:
+                resolved[(material_type, subtype)] = existing[name]
+                continue
+            term = (subtype or 'honey') if material_type == 'honey' else material_type
+            product = Product.search([('name', 'ilike', term), ('type', '=', 'product')], order='id', limit=1)
+            if product:
+                resolved[(material_type, subtype)] = product.id
+        to_create = sorted({name for key, name in missing.items() if key not in resolved})
+        if to_create:
+            category_id = self.env.ref('product.product_category_all').id
+            for product in Product.create([{
+                'name': name,
+                'type': 'product',
+                'categ_id': category_id,
+            } for name in to_create]):
+                existing[product.name] = product.id
+            for key, name in missing.items():
+                resolved.setdefault(key, existing[name])
+
+        self.sudo().create([{
+            'material_type': material_type,
+            'material_subtype': subtype,
+            'product_id': resolved[(material_type, subtype)],
+        } for material_type, subtype in missing])
+        product_map = self._get_product_map()
+        return {key: product_map[key] for key in names}
@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
 
+# Allowed deviation from the target value when no min/max range is set
+TARGET_TOLERANCE = 0.05
+RESULT_CODES = ('pass', 'fail', 'conditional')
+
+
+def evaluate_results(actual, target, min_value, max_value, tolerance=TARGET_TOLERANCE):
+    """Score test readings in one vectorized pass
+
+    Arrays are aligned per reading; zero means "not set", as in the ORM
+    fields. A reading passes inside [min, max] when both are set, otherwise
+    within the tolerance around the target, and is conditional without a
+    target. Returns an array of indexes into RESULT_CODES.
+    """
+    has_range = (min_value != 0) & (max_value != 0)
+    in_range = (min_value <= actual) & (actual <= max_value)
+    in_tolerance = np.abs(actual - target) <= np.abs(target) * tolerance
+    passed = np.where(has_range, in_range, in_tolerance)
+    scored = (target != 0) & (actual != 0)
+    return np.where(scored, np.where(passed, 0, 1), 2)
+
+
 class QualityControl(models.Model):
     _name = 'honey.quality.control'
     _description = 'Quality Control for Honey Production'
@@ -120,23 +143,56 @@ class QualityControl(models.Model):
 
     def action_complete_qc(self):
         """Complete quality control process"""
-        for record in self:
-            if record.state != 'in_progress':
-                raise ValidationError(_('Only in-progress records can be completed.'))
-            
-            # Calculate overall result based on test results
-            if record.test_results_ids:
-                failed_tests = record.test_results_ids.filtered(lambda r: r.result == 'fail')
-                if failed_tests:
-                    record.overall_result = 'fail'
-                else:
-                    conditional_tests = record.test_results_ids.filtered(lambda r: r.result == 'conditional')
-                    if conditional_tests:
-                        record.overall_result = 'conditional'
-                    else:
-                        record.overall_result = 'pass'
-            
-            record.state = 'completed'
+        if any(record.state != 'in_progress' for record in self):
+            raise ValidationError(_('Only in-progress records can be completed.'))
+
+        # Score all readings of the selected controls at once
+        self.mapped('test_results_ids')._evaluate_against_standards()
+        overall = self._get_overall_results()
+        for result in set(overall.values()):
+            self.filtered(lambda r: overall.get(r.id) == result).write({'overall_result': result})
+        self.write({'state': 'completed'})
+
+    def _get_overall_results(self):
+        """Overall result per control from one grouped query on test results
+
+        Any failed test fails the control, any conditional test makes it a
+        conditional pass; controls without test results are left out.
+        """
+        counts = {}
+        for group in self.env['honey.quality.test.result'].read_group(
+            [('qc_id', 'in', self.ids)], ['qc_id', 'result'], ['qc_id', 'result'], lazy=False,
+        ):
+            counts.setdefault(group['qc_id'][0], {})[group['result']] = group['__count']
+        overall = {}
+        for qc_id, by_result in counts.items():
+            if by_result.get('fail'):
+                overall[qc_id] = 'fail'
+            elif by_result.get('conditional'):
+                overall[qc_id] = 'conditional'
+            else:
+                overall[qc_id] = 'pass'
+        return overall
+
+    @api.model
+    def import_readings(self, readings):
+        """Bulk import of lab readings as test results
+
+        readings is a list of dicts with 'qc_id', 'parameter_name' and
+        'actual_value', plus optional 'test_name', 'test_method' and 'unit'.
+        Results are created with one create() and scored against the
+        quality standards in one pass.
+        """
+        results = self.env['honey.quality.test.result'].create([{
+            'qc_id': reading['qc_id'],
+            'test_name': reading.get('test_name') or reading['parameter_name'],
+            'test_method': reading.get('test_method'),
+            'parameter_name': reading['parameter_name'],
+            'unit': reading.get('unit'),
+            'actual_value': reading['actual_value'],
+        } for reading in readings])
+        results._evaluate_against_standards()
+        return results
 
     def action_approve(self):
         """Approve quality control results"""
@@ -230,25 +286,82 @@ class QualityTestResult(models.Model):
 
     @api.depends('target_value', 'min_value', 'max_value', 'actual_value')
     def _compute_result(self):
-        for record in self:
-            if record.target_value and record.actual_value:
-                # Check if actual value is within acceptable range
-                if record.min_value and record.max_value:
-                    if record.min_value <= record.actual_value <= record.max_value:
-                        record.result = 'pass'
-                    else:
-                        record.result = 'fail'
-                elif record.target_value:
-                    # Allow 5% tolerance
-                    tolerance = record.target_value * 0.05
-                    if abs(record.actual_value - record.target_value) <= tolerance:
-                        record.result = 'pass'
-                    else:
-                        record.result = 'fail'
-                else:
-                    record.result = 'conditional'
-            else:
-                record.result = 'conditional'
+        if not self:
+            return
+        codes = evaluate_results(
+            np.array(self.mapped('actual_value'), dtype=np.float64),
+            np.array(self.mapped('target_value'), dtype=np.float64),
+            np.array(self.mapped('min_value'), dtype=np.float64),
+            np.array(self.mapped('max_value'), dtype=np.float64),
+        )
+        for record, code in zip(self, codes):
+            record.result = RESULT_CODES[code]
+
+    @api.model
+    def evaluate_pending(self):
+        """Score the readings of all open quality controls"""
+        pending = self.search([('qc_id.state', 'in', ['draft', 'in_progress'])])
+        pending._evaluate_against_standards()
+        return len(pending)
+
+    def _evaluate_against_standards(self):
+        """Score readings against honey.quality.standard limits in bulk
+
+        For each reading the active standard for the batch honey type on the
+        QC date supplies target/min/max by parameter name; readings without
+        a matching standard parameter keep their own limits. Limits and
+        results are written back with a single UPDATE.
+        """
+        if not self:
+            return
+        self.flush(['qc_id', 'parameter_name', 'actual_value', 'target_value', 'min_value', 'max_value'])
+        self.env.cr.execute("""
+            SELECT r.id, r.actual_value, r.target_value, r.min_value, r.max_value,
+                   p.target_value, p.min_value, p.max_value
+              FROM honey_quality_test_result r
+              JOIN honey_quality_control q ON q.id = r.qc_id
+              JOIN honey_production_batch b ON b.id = q.batch_id
+         LEFT JOIN LATERAL (
+                    SELECT tp.target_value, tp.min_value, tp.max_value
+                      FROM honey_quality_test_parameter tp
+                      JOIN honey_quality_standard s ON s.id = tp.standard_id
+                     WHERE s.active
+                       AND s.honey_type = b.honey_type
+                       AND s.effective_date <= q.qc_date::date
+                       AND (s.expiry_date IS NULL OR s.expiry_date >= q.qc_date::date)
+                       AND tp.parameter_name = r.parameter_name
+                  ORDER BY s.effective_date DESC, s.id DESC
+                     LIMIT 1
+              ) p ON TRUE
+             WHERE r.id IN %s
+        """, (tuple(self.ids),))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return
+
+        data = np.array([[value if value is not None else np.nan for value in row] for row in rows], dtype=np.float64)
+        ids, own, standard = data[:, 0].astype(np.int64), data[:, 2:5], data[:, 5:8]
+        has_standard = ~np.isnan(standard[:, 0])
+        limits = np.where(has_standard[:, None], np.nan_to_num(standard), np.nan_to_num(own))
+        actual = np.nan_to_num(data[:, 1])
+        codes = evaluate_results(actual, limits[:, 0], limits[:, 1], limits[:, 2])
+
+        values = [
+            (int(ids[i]), RESULT_CODES[codes[i]], float(limits[i, 0]), float(limits[i, 1]), float(limits[i, 2]))
+            for i in range(len(rows))
+        ]
+        self.env.cr.execute("""
+            UPDATE honey_quality_test_result r
+               SET result = v.result,
+                   target_value = v.target_value,
+                   min_value = v.min_value,
+                   max_value = v.max_value,
+                   write_uid = %%s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES %s) AS v(id, result, target_value, min_value, max_value)
+             WHERE r.id = v.id
+        """ % ', '.join(['%s'] * len(values)), [self.env.uid] + values)
+        self.invalidate_cache(['result', 'target_value', 'min_value', 'max_value', 'write_uid', 'write_date'], self.ids)
 
 
 class QualityStandard(models.Model):
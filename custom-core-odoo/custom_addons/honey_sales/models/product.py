@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+HONEY_PRODUCT_TYPES = [
+    ('honey_stick', 'Honey Stick'),
+    ('display', 'Display'),
+    ('packaging', 'Packaging'),
+    ('other', 'Other'),
+]
+
+# Name keywords used when the category has no classification; displays and
+# packaging are checked first so that "Honey Stick Display" is not a stick
+HONEY_PRODUCT_KEYWORDS = [
+    ('display', ('display',)),
+    ('packaging', ('packaging', 'box')),
+    ('honey_stick', ('honey', 'stick')),
+]
+
+
+class ProductCategory(models.Model):
+    _inherit = 'product.category'
+
+    honey_product_type = fields.Selection(
+        HONEY_PRODUCT_TYPES,
+        string='Honey Product Type',
+        help='Classification given to products of this category'
+    )
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    honey_product_type = fields.Selection(
+        HONEY_PRODUCT_TYPES,
+        string='Honey Product Type',
+        compute='_compute_honey_product_type',
+        store=True,
+        readonly=False,
+        index=True
+    )
+
+    @api.depends('categ_id.honey_product_type')
+    def _compute_honey_product_type(self):
+        for template in self:
+            if template.categ_id.honey_product_type:
+                template.honey_product_type = template.categ_id.honey_product_type
+            elif not template.honey_product_type:
+                name = (template.name or '').lower()
+                template.honey_product_type = next(
+                    (product_type for product_type, keywords in HONEY_PRODUCT_KEYWORDS
+                     if any(keyword in name for keyword in keywords)),
+                    'other'
+                )
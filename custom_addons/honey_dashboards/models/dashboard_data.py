@@ -199,7 +199,7 @@ class DashboardData(models.Model):
             },
             'time_tracking': {
                 'total_hours_today': sum(time_records.mapped('duration')),
-                'active_employees': len(time_records.mapped('employee_id')),
+                'active_employees': len(self.env['honey.time.tracking'].get_active_employees()),
                 'efficiency': self._calculate_production_efficiency(),
             }
         }
@@ -232,6 +232,9 @@ class DashboardData(models.Model):
             ('return_date', '>=', today - fields.timedelta(days=30))
         ])
         
+        # KPI from the daily shipment rollup
+        kpi = self.env['honey.shipment.kpi.daily'].get_summary(today - fields.timedelta(days=30))
+        
         return {
             'shipments': {
                 'today': len(shipments_today),
@@ -252,9 +255,9 @@ class DashboardData(models.Model):
                 'processed_returns': len(returns.filtered(lambda r: r.state in ['processed', 'completed'])),
             },
             'kpi': {
-                'avg_processing_time': self._calculate_avg_processing_time(),
-                'delivery_success_rate': self._calculate_delivery_success_rate(),
-                'return_rate': self._calculate_return_rate(),
+                'avg_processing_time': kpi['avg_processing_time'],
+                'delivery_success_rate': kpi['delivery_success_rate'],
+                'return_rate': kpi['return_rate'],
             }
         }
 
@@ -311,18 +314,3 @@ class DashboardData(models.Model):
         """Calculate production efficiency"""
         # This would calculate based on planned vs actual production
         return 85.0  # Placeholder
-
-    def _calculate_avg_processing_time(self):
-        """Calculate average processing time"""
-        # This would calculate based on order to shipment time
-        return 24.0  # Placeholder in hours
-
-    def _calculate_delivery_success_rate(self):
-        """Calculate delivery success rate"""
-        # This would calculate based on successful deliveries
-        return 95.0  # Placeholder percentage
-
-    def _calculate_return_rate(self):
-        """Calculate return rate"""
-        # This would calculate based on returns vs total shipments
-        return 2.5  # Placeholder percentage
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Honey Logistics Management',
-    'version': '1.2.0',
+    'version': '1.2.2',
     'category': 'Inventory',
     'summary': 'Logistics, packaging, and QR confirmation system for honey sticks',
     'description': """
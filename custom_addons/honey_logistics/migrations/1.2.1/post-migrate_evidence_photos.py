@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Stored confirmation photos of QR confirmations become evidence photos
+
+    confirmation_photo is now computed from photo_ids, so the attachments
+    that held the old binary field are moved over and removed.
+    """
+    if not version:
+        return
+    cr.execute("""
+        SELECT id
+          FROM ir_attachment
+         WHERE res_model = 'honey.qr.confirmation'
+           AND res_field = 'confirmation_photo'
+      ORDER BY id
+    """)
+    attachment_ids = [row[0] for row in cr.fetchall()]
+    if attachment_ids:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env['honey.evidence.photo']._create_from_attachments(attachment_ids)
@@ -98,8 +98,16 @@ class QRConfirmation(models.Model):
     )
     
     # Photos and attachments
+    photo_ids = fields.One2many(
+        'honey.evidence.photo',
+        'res_id',
+        string='Photos',
+        domain=[('res_model', '=', 'honey.qr.confirmation')],
+        context={'default_res_model': 'honey.qr.confirmation'}
+    )
     confirmation_photo = fields.Binary(
-        string='Confirmation Photo'
+        string='Confirmation Photo',
+        compute='_compute_confirmation_photo'
     )
     attachment_ids = fields.One2many(
         'ir.attachment',
@@ -136,6 +144,12 @@ class QRConfirmation(models.Model):
         
         return super().create(vals)
 
+    @api.depends('photo_ids.thumbnail')
+    def _compute_confirmation_photo(self):
+        """Thumbnail of the latest evidence photo"""
+        for record in self:
+            record.confirmation_photo = record.photo_ids[:1].thumbnail
+
     def action_confirm(self):
         """Confirm QR delivery"""
         for record in self:
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import logging
+import threading
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
+_logger = logging.getLogger(__name__)
+
+
+# Approved requests locked and committed together by the processing cron
+RETURN_PROCESSING_CHUNK_SIZE = 100
+
 
 class ReturnRequest(models.Model):
     _name = 'honey.return.request'
@@ -126,6 +135,21 @@ class ReturnRequest(models.Model):
         store=True
     )
     
+    # Eligibility under the return policies in effect
+    is_eligible = fields.Boolean(
+        string='Eligible',
+        compute='_compute_eligibility'
+    )
+    eligibility_policy_id = fields.Many2one(
+        'honey.return.policy',
+        string='Applied Policy',
+        compute='_compute_eligibility'
+    )
+    eligibility_reason = fields.Char(
+        string='Eligibility',
+        compute='_compute_eligibility'
+    )
+
     # Notes
     notes = fields.Text(
         string='Notes'
@@ -154,6 +178,47 @@ class ReturnRequest(models.Model):
             else:
                 record.commission_adjustment = 0.0
 
+    def _compute_eligibility(self):
+        verdicts = self.env['honey.return.policy'].evaluate_eligibility(self)
+        for record in self:
+            eligible, policy_id, reason = verdicts.get(record.id, (False, False, False))
+            record.is_eligible = eligible
+            record.eligibility_policy_id = policy_id
+            record.eligibility_reason = reason
+
+    def _get_eligibility_facts(self):
+        """Values the policy conditions look at, loaded in one query
+
+        Returns {request id: dict}; new records are left out.
+        """
+        ids = [record_id for record_id in self.ids if isinstance(record_id, int)]
+        if not ids:
+            return {}
+        self.flush(['return_date', 'return_reason', 'shipment_id', 'customer_id'])
+        self.env['honey.return.line'].flush(['return_id', 'quality_grade'])
+        self.env['honey.shipment'].flush(['shipment_date'])
+        self.env['res.partner'].flush(['honey_customer_type'])
+        self.env.cr.execute("""
+            SELECT r.id, r.return_date, r.return_reason, s.shipment_date::date, p.honey_customer_type,
+                   ARRAY(SELECT DISTINCT l.quality_grade
+                           FROM honey_return_line l
+                          WHERE l.return_id = r.id AND l.quality_grade IS NOT NULL)
+              FROM honey_return_request r
+              JOIN honey_shipment s ON s.id = r.shipment_id
+         LEFT JOIN res_partner p ON p.id = r.customer_id
+             WHERE r.id IN %s
+        """, (tuple(ids),))
+        return {
+            row[0]: {
+                'return_date': row[1],
+                'return_reason': row[2],
+                'shipment_date': row[3],
+                'customer_type': row[4],
+                'quality_grades': set(row[5]),
+            }
+            for row in self.env.cr.fetchall()
+        }
+
     @api.model
     def create(self, vals):
         if vals.get('name', _('New')) == _('New'):
@@ -185,16 +250,63 @@ class ReturnRequest(models.Model):
 
     def action_process(self):
         """Process return request"""
-        for record in self:
-            if record.state != 'approved':
-                raise ValidationError(_('Only approved requests can be processed.'))
-            record.state = 'processed'
-            record.processed_by = self.env.user.id
-            record.processing_date = fields.Datetime.now()
-            
-            # Adjust commissions
-            if record.commission_adjustment != 0:
-                self._adjust_commissions()
+        if any(record.state != 'approved' for record in self):
+            raise ValidationError(_('Only approved requests can be processed.'))
+        self._process_returns()
+
+    def _process_returns(self):
+        """Mark approved requests processed and adjust their commissions"""
+        self.write({
+            'state': 'processed',
+            'processed_by': self.env.user.id,
+            'processing_date': fields.Datetime.now(),
+        })
+        self.filtered('commission_adjustment')._adjust_commissions()
+
+    @api.model
+    def _process_approved_returns(self, chunk_size=RETURN_PROCESSING_CHUNK_SIZE):
+        """Process approved requests in chunks, committing after each one
+
+        Rows are claimed with FOR UPDATE SKIP LOCKED, so several workers can
+        run this at the same time without picking the same requests, and a
+        run that is interrupted resumes from the first uncommitted chunk.
+        A failing chunk is retried request by request; requests that still
+        fail stay approved and are skipped for the rest of the run.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.flush(['state'])
+        failed_ids = []
+        processed = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT id
+                  FROM honey_return_request
+                 WHERE state = 'approved'
+                   AND NOT (id = ANY(%s))
+              ORDER BY approval_date, id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, (failed_ids, chunk_size))
+            returns = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not returns:
+                break
+            try:
+                with self.env.cr.savepoint():
+                    returns._process_returns()
+                processed += len(returns)
+            except Exception:
+                _logger.exception("Chunk of %s return requests failed, retrying one by one", len(returns))
+                for record in returns:
+                    try:
+                        with self.env.cr.savepoint():
+                            record._process_returns()
+                        processed += 1
+                    except Exception:
+                        _logger.exception("Could not process return request %s", record.id)
+                        failed_ids.append(record.id)
+            if auto_commit:
+                self.env.cr.commit()
+        return processed
 
     def action_complete(self):
         """Complete return request"""
@@ -212,19 +324,20 @@ class ReturnRequest(models.Model):
 
     def _adjust_commissions(self):
         """Adjust commissions based on return"""
+        vals_list = []
         for record in self:
-            if record.sale_order_id and record.sale_order_id.commission_ids:
-                for commission in record.sale_order_id.commission_ids:
-                    if commission.state == 'paid':
-                        # Create adjustment entry
-                        self.env['honey.commission'].create({
-                            'agent_id': commission.agent_id.id,
-                            'sale_order_id': commission.sale_order_id.id,
-                            'base_amount': -record.commission_adjustment,
-                            'commission_rate': commission.commission_rate,
-                            'state': 'confirmed',
-                            'notes': f'Return adjustment for {record.name}',
-                        })
+            for commission in record.sale_order_id.commission_ids:
+                if commission.state == 'paid':
+                    vals_list.append({
+                        'agent_id': commission.agent_id.id,
+                        'sale_order_id': commission.sale_order_id.id,
+                        'base_amount': -record.commission_adjustment,
+                        'commission_rate': commission.commission_rate,
+                        'state': 'confirmed',
+                        'notes': f'Return adjustment for {record.name}',
+                    })
+        if vals_list:
+            self.env['honey.commission'].create(vals_list)
 
 
 class ReturnLine(models.Model):
@@ -375,32 +488,129 @@ class ReturnPolicy(models.Model):
         string='Active',
         default=True
     )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        default=lambda self: self.env.company,
+        help='Leave empty to apply the policy in every company'
+    )
     
     # Notes
     description = fields.Text(
         string='Description'
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        policies = super().create(vals_list)
+        self.clear_caches()
+        return policies
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+    def _compile_conditions(self):
+        """Policy conditions as plain predicates over request facts
+
+        Each predicate takes the facts of one request and returns the reason
+        it is rejected, or None. Only conditions the policy restricts are
+        compiled, and nothing in them refers back to the ORM.
+        """
+        self.ensure_one()
+        conditions = []
+
+        if self.customer_types != 'all':
+            customer_type = self.customer_types
+
+            def check_customer_type(facts):
+                if facts['customer_type'] != customer_type:
+                    return f"Return not allowed for customer type: {facts['customer_type']}"
+            conditions.append(check_customer_type)
+
+        period = self.return_period_days
+
+        def check_period(facts):
+            if facts['return_date'] and facts['shipment_date']:
+                days_since_shipment = (facts['return_date'] - facts['shipment_date']).days
+                if days_since_shipment > period:
+                    return f"Return period exceeded. Allowed: {period} days, Actual: {days_since_shipment} days"
+        conditions.append(check_period)
+
+        if self.allowed_reasons == 'defective_only':
+            conditions.append(lambda facts: None if facts['return_reason'] == 'defective'
+                              else "Only defective products can be returned under this policy")
+        elif self.allowed_reasons == 'quality_issues':
+            conditions.append(lambda facts: None if facts['return_reason'] in ('defective', 'quality_issue')
+                              else "Only quality issues can be returned under this policy")
+
+        if self.honey_types != 'all':
+            grade = self.honey_types
+
+            def check_grade(facts):
+                if facts['quality_grades'] - {grade}:
+                    return f"Only {grade} products can be returned under this policy"
+            conditions.append(check_grade)
+
+        return tuple(conditions)
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_compiled_policies(self, company_id):
+        """Registry-level cache of active policies with compiled conditions
+
+        Tuple of (policy id, effective date, expiry date, conditions) of the
+        policies of the company and those shared by all companies, newest
+        effective date first. Read as superuser, since the cache is shared
+        by every user.
+        """
+        return tuple(
+            (policy.id, policy.effective_date, policy.expiry_date, policy._compile_conditions())
+            for policy in self.sudo().search(
+                [('company_id', 'in', [company_id, False])], order='effective_date desc, id desc')
+        )
+
+    @api.model
+    def evaluate_eligibility(self, return_requests):
+        """Eligibility of many return requests against all active policies
+
+        Policies are loaded and compiled once and request data is read in a
+        single query, so the cost does not grow with policies x requests in
+        ORM calls. A request is eligible under the first policy in effect on
+        its return date whose conditions all pass. Returns
+        {request id: (eligible, policy id or False, reason)}.
+        """
+        policies = self._get_compiled_policies(self.env.company.id)
+        verdicts = {}
+        for request_id, facts in return_requests._get_eligibility_facts().items():
+            return_date = facts['return_date']
+            rejection = None
+            for policy_id, effective_date, expiry_date, conditions in policies:
+                if return_date and (return_date < effective_date or (expiry_date and return_date > expiry_date)):
+                    continue
+                reason = next(filter(None, (condition(facts) for condition in conditions)), None)
+                if reason is None:
+                    verdicts[request_id] = (True, policy_id, "Return is eligible under this policy")
+                    break
+                rejection = rejection or (False, policy_id, reason)
+            else:
+                verdicts[request_id] = rejection or (False, False, "No return policy in effect on the return date")
+        return verdicts
+
     def check_return_eligibility(self, return_request):
         """Check if return request is eligible under this policy"""
         self.ensure_one()
-        
-        # Check customer type
-        if self.customer_types != 'all':
-            if return_request.customer_id.honey_customer_type != self.customer_types:
-                return False, f"Return not allowed for customer type: {return_request.customer_id.honey_customer_type}"
-        
-        # Check return period
-        if return_request.return_date:
-            days_since_shipment = (return_request.return_date - return_request.shipment_id.shipment_date.date()).days
-            if days_since_shipment > self.return_period_days:
-                return False, f"Return period exceeded. Allowed: {self.return_period_days} days, Actual: {days_since_shipment} days"
-        
-        # Check return reason
-        if self.allowed_reasons != 'all':
-            if self.allowed_reasons == 'defective_only' and return_request.return_reason != 'defective':
-                return False, "Only defective products can be returned under this policy"
-            elif self.allowed_reasons == 'quality_issues' and return_request.return_reason not in ['defective', 'quality_issue']:
-                return False, "Only quality issues can be returned under this policy"
-        
+        facts = return_request._get_eligibility_facts().get(return_request.id)
+        if not facts:
+            return False, "Return request must be saved before checking eligibility"
+        for condition in self._compile_conditions():
+            reason = condition(facts)
+            if reason:
+                return False, reason
         return True, "Return is eligible under this policy"
@@ -2,11 +2,18 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from datetime import timedelta
 import qrcode
 import base64
 from io import BytesIO
 
 
+SHIPMENT_KPI_WATERMARK_PARAM = 'honey_logistics.shipment_kpi_watermark'
+# write_date is the transaction start time: shipments are re-scanned this far
+# behind the watermark so transactions committing late are not missed
+SHIPMENT_KPI_WATERMARK_LAG = timedelta(hours=1)
+
+
 class Shipment(models.Model):
     _name = 'honey.shipment'
     _description = 'Honey Sticks Shipment'
@@ -120,6 +127,11 @@ class Shipment(models.Model):
         string='Shipping Cost',
         digits=(16, 2)
     )
+    packaging_ids = fields.One2many(
+        'honey.packaging',
+        'shipment_id',
+        string='Packages'
+    )
     
     # Delivery address
     delivery_address = fields.Text(
@@ -141,16 +153,14 @@ class Shipment(models.Model):
         default=False
     )
     
-    # KPI tracking
+    # KPI tracking, maintained on state transitions and by the KPI cron
     processing_time = fields.Float(
         string='Processing Time (Hours)',
-        compute='_compute_processing_time',
-        store=True
+        readonly=True
     )
     delivery_time = fields.Float(
         string='Delivery Time (Days)',
-        compute='_compute_delivery_time',
-        store=True
+        readonly=True
     )
     
     # Notes
@@ -164,23 +174,46 @@ class Shipment(models.Model):
             record.total_boxes = sum(record.packaging_ids.mapped('boxes_count'))
             record.total_sticks = sum(record.packaging_ids.mapped('sticks_count'))
 
-    @api.depends('sale_order_id.date_order', 'shipment_date')
-    def _compute_processing_time(self):
-        for record in self:
-            if record.sale_order_id.date_order and record.shipment_date:
-                delta = record.shipment_date - record.sale_order_id.date_order
-                record.processing_time = delta.total_seconds() / 3600  # Convert to hours
-            else:
-                record.processing_time = 0.0
+    def _update_kpis(self):
+        """Recompute processing and delivery time in one statement
 
-    @api.depends('shipment_date', 'actual_delivery_date')
-    def _compute_delivery_time(self):
-        for record in self:
-            if record.shipment_date and record.actual_delivery_date:
-                delta = record.actual_delivery_date - record.shipment_date.date()
-                record.delivery_time = delta.days
-            else:
-                record.delivery_time = 0.0
+        write_date is left untouched so the KPI cron does not pick the
+        shipments up again.
+        """
+        if not self.ids:
+            return
+        self.flush(['sale_order_id', 'shipment_date', 'actual_delivery_date'])
+        self.env['sale.order'].flush(['date_order'])
+        self.env.cr.execute("""
+            UPDATE honey_shipment s
+               SET processing_time = COALESCE(EXTRACT(EPOCH FROM (s.shipment_date - o.date_order)) / 3600, 0),
+                   delivery_time = COALESCE(s.actual_delivery_date - s.shipment_date::date, 0)
+              FROM sale_order o
+             WHERE o.id = s.sale_order_id
+               AND s.id IN %s
+        """, (tuple(self.ids),))
+        self.invalidate_cache(['processing_time', 'delivery_time'], self.ids)
+
+    @api.model
+    def _cron_update_shipment_kpis(self):
+        """Refresh KPIs of shipments changed since the previous run and roll them up per day
+
+        The watermark is the newest write_date processed. Because
+        write_date is set when a transaction starts, not when it commits,
+        each run re-scans SHIPMENT_KPI_WATERMARK_LAG before the watermark.
+        Days that lost shipments are flagged stale and rebuilt as well.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        watermark = params.get_param(SHIPMENT_KPI_WATERMARK_PARAM)
+        since = fields.Datetime.to_datetime(watermark) - SHIPMENT_KPI_WATERMARK_LAG if watermark else None
+        shipments = self.search([('write_date', '>=', since)] if since else [])
+        shipments._update_kpis()
+        KpiDaily = self.env['honey.shipment.kpi.daily']
+        dates = {shipment.shipment_date.date() for shipment in shipments if shipment.shipment_date}
+        KpiDaily._rebuild(dates | KpiDaily._get_stale_dates())
+        last_write = max(shipments.mapped('write_date'), default=None)
+        if last_write and (not watermark or last_write > fields.Datetime.to_datetime(watermark)):
+            params.set_param(SHIPMENT_KPI_WATERMARK_PARAM, fields.Datetime.to_string(last_write))
 
     @api.model
     def create(self, vals):
@@ -188,6 +221,20 @@ class Shipment(models.Model):
             vals['name'] = self.env['ir.sequence'].next_by_code('honey.shipment') or _('New')
         return super().create(vals)
 
+    def write(self, vals):
+        if 'shipment_date' in vals:
+            self._mark_kpi_days_stale()
+        return super().write(vals)
+
+    def unlink(self):
+        self._mark_kpi_days_stale()
+        return super().unlink()
+
+    def _mark_kpi_days_stale(self):
+        """Flag the daily rollup of the current shipment dates before they move or disappear"""
+        self.env['honey.shipment.kpi.daily']._mark_stale(
+            {shipment.shipment_date.date() for shipment in self if shipment.shipment_date})
+
     def action_generate_qr_code(self):
         """Generate QR code for shipment"""
         for record in self:
@@ -222,6 +269,7 @@ class Shipment(models.Model):
             # Update shipment status
             record.state = 'delivered'
             record.actual_delivery_date = fields.Date.today()
+        self._update_kpis()
 
     def action_pack(self):
         """Pack shipment"""
@@ -237,6 +285,7 @@ class Shipment(models.Model):
                 raise ValidationError(_('Shipment must be packed before shipping.'))
             record.state = 'shipped'
             record.shipment_date = fields.Datetime.now()
+        self._update_kpis()
 
     def action_deliver(self):
         """Mark as delivered"""
@@ -245,6 +294,7 @@ class Shipment(models.Model):
                 raise ValidationError(_('Shipment must be shipped before delivery.'))
             record.state = 'delivered'
             record.actual_delivery_date = fields.Date.today()
+        self._update_kpis()
 
     def action_return(self):
         """Mark as returned"""
@@ -310,9 +360,20 @@ class Packaging(models.Model):
         ('manuka', 'Manuka Honey'),
     ], string='Honey Type', required=True)
     
+    batch_id = fields.Many2one(
+        'honey.production.batch',
+        string='Production Batch'
+    )
     batch_numbers = fields.Char(
         string='Batch Numbers'
     )
+    expiry_date = fields.Date(
+        string='Expiry Date'
+    )
+    qr_image = fields.Binary(
+        string='QR Code Image',
+        readonly=True
+    )
     
     # Quality information
     quality_grade = fields.Selection([
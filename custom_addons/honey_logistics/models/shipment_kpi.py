@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+
+
+class ShipmentKpiDaily(models.Model):
+    _name = 'honey.shipment.kpi.daily'
+    _description = 'Daily Shipment KPI'
+    _order = 'date desc, region_id'
+    # Rebuilt by the shipment KPI cron only
+    _log_access = False
+
+    date = fields.Date(
+        string='Date',
+        required=True,
+        readonly=True,
+        index=True
+    )
+    region_id = fields.Many2one(
+        'honey.region',
+        string='Region',
+        readonly=True
+    )
+    shipment_count = fields.Integer(
+        string='Shipments',
+        readonly=True
+    )
+    processed_count = fields.Integer(
+        string='Shipped',
+        readonly=True,
+        help='Shipments that left the warehouse (shipped, delivered or returned)'
+    )
+    delivered_count = fields.Integer(
+        string='Delivered',
+        readonly=True
+    )
+    on_time_count = fields.Integer(
+        string='Delivered On Time',
+        readonly=True
+    )
+    returned_count = fields.Integer(
+        string='Returned',
+        readonly=True
+    )
+    qr_confirmed_count = fields.Integer(
+        string='QR Confirmed',
+        readonly=True
+    )
+    total_processing_time = fields.Float(
+        string='Total Processing Time (Hours)',
+        readonly=True
+    )
+    avg_processing_time = fields.Float(
+        string='Avg Processing Time (Hours)',
+        readonly=True
+    )
+    avg_delivery_time = fields.Float(
+        string='Avg Delivery Time (Days)',
+        readonly=True
+    )
+    stale = fields.Boolean(
+        string='Stale',
+        readonly=True,
+        help='A shipment left this day (date changed or deleted); rebuilt by the next cron run'
+    )
+
+    def init(self):
+        tools.create_unique_index(
+            self.env.cr, 'honey_shipment_kpi_daily_key_uniq', self._table,
+            ['date', 'COALESCE(region_id, 0)'])
+
+    @api.model
+    def _rebuild(self, dates):
+        """Replace the rollup rows of the given shipment dates"""
+        if not dates:
+            return
+        self.env['honey.shipment'].flush([
+            'shipment_date', 'region_id', 'state', 'actual_delivery_date', 'expected_delivery_date',
+            'qr_confirmed', 'processing_time', 'delivery_time',
+        ])
+        dates = tuple(dates)
+        self.env.cr.execute("DELETE FROM honey_shipment_kpi_daily WHERE date IN %s", (dates,))
+        self.env.cr.execute("""
+            INSERT INTO honey_shipment_kpi_daily
+                (date, region_id, shipment_count, processed_count, delivered_count, on_time_count, returned_count,
+                 qr_confirmed_count, total_processing_time, avg_processing_time, avg_delivery_time)
+            SELECT s.shipment_date::date,
+                   s.region_id,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE s.state IN ('shipped', 'delivered', 'returned')),
+                   COUNT(*) FILTER (WHERE s.state = 'delivered'),
+                   COUNT(*) FILTER (WHERE s.state = 'delivered'
+                                      AND s.actual_delivery_date <= s.expected_delivery_date),
+                   COUNT(*) FILTER (WHERE s.state = 'returned'),
+                   COUNT(*) FILTER (WHERE s.qr_confirmed),
+                   COALESCE(SUM(s.processing_time) FILTER (WHERE s.state IN ('shipped', 'delivered', 'returned')), 0),
+                   COALESCE(AVG(s.processing_time) FILTER (WHERE s.state IN ('shipped', 'delivered', 'returned')), 0),
+                   COALESCE(AVG(s.delivery_time) FILTER (WHERE s.actual_delivery_date IS NOT NULL), 0)
+              FROM honey_shipment s
+             WHERE s.shipment_date::date IN %s
+               AND s.state != 'cancelled'
+          GROUP BY s.shipment_date::date, s.region_id
+        """, (dates,))
+        self.invalidate_cache()
+
+    @api.model
+    def _mark_stale(self, dates):
+        """Flag rollup rows of days that lose shipments"""
+        if not dates:
+            return
+        self.env.cr.execute("""
+            UPDATE honey_shipment_kpi_daily SET stale = TRUE WHERE date IN %s AND NOT COALESCE(stale, FALSE)
+        """, (tuple(dates),))
+        self.invalidate_cache(['stale'])
+
+    @api.model
+    def _get_stale_dates(self):
+        """Days flagged by _mark_stale since the last rebuild"""
+        self.env.cr.execute("SELECT DISTINCT date FROM honey_shipment_kpi_daily WHERE stale")
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def get_summary(self, date_from, date_to=None):
+        """Totals over a date range for dashboards"""
+        domain = [('date', '>=', date_from)]
+        if date_to:
+            domain.append(('date', '<=', date_to))
+        totals = self.read_group(domain, [
+            'shipment_count:sum', 'processed_count:sum', 'delivered_count:sum', 'on_time_count:sum',
+            'returned_count:sum', 'qr_confirmed_count:sum', 'total_processing_time:sum',
+        ], [])
+        totals = totals[0] if totals else {}
+        shipments = totals.get('shipment_count') or 0
+        delivered = totals.get('delivered_count') or 0
+        processed = totals.get('processed_count') or 0
+        return {
+            'shipments': shipments,
+            'delivered': delivered,
+            'returned': totals.get('returned_count') or 0,
+            'qr_confirmed': totals.get('qr_confirmed_count') or 0,
+            'avg_processing_time': (totals.get('total_processing_time') or 0.0) / processed if processed else 0.0,
+            'delivery_success_rate': (totals.get('on_time_count') or 0) / delivered * 100 if delivered else 0.0,
+            'return_rate': (totals.get('returned_count') or 0) / shipments * 100 if shipments else 0.0,
+        }
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Honey Production Management',
-    'version': '1.2.0',
+    'version': '1.2.1',
     'category': 'Manufacturing',
     'summary': 'Production planning and control for honey sticks manufacturing',
     'description': """
@@ -35,10 +35,15 @@
         'views/production_batch_views.xml',
         'views/batch_search_wizard_views.xml',
         'views/quality_control_views.xml',
+        'views/qc_import_wizard_views.xml',
         'views/material_views.xml',
+        'views/material_planning_views.xml',
         'views/time_tracking_views.xml',
         'views/menu.xml',
     ],
+    'external_dependencies': {
+        'python': ['numpy', 'PIL'],
+    },
     'demo': [],
     'installable': True,
     'auto_install': False,
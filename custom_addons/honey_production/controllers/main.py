@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import hmac
+import json
+
+from odoo import http
+from odoo.http import request
+
+
+class ProductionKiosk(http.Controller):
+
+    def _check_kiosk_token(self):
+        """Check the shared terminal token sent in the request header"""
+        expected = request.env['ir.config_parameter'].sudo().get_param('honey_production.kiosk_token')
+        received = request.httprequest.headers.get('X-Honey-Kiosk-Token', '')
+        return bool(expected) and hmac.compare_digest(expected, received)
+
+    def _get_batch(self, payload, key):
+        """List of dicts from the request body: {key: [...]} or the list itself, else None"""
+        items = payload.get(key, []) if isinstance(payload, dict) else payload
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+        return items
+
+    def _json_response(self, payload, status=200):
+        return request.make_response(
+            json.dumps(payload),
+            headers=[('Content-Type', 'application/json')],
+            status=status,
+        )
+
+    @http.route('/honey_production/kiosk/events', type='http', auth='public', methods=['POST'], csrf=False)
+    def kiosk_events(self, **kwargs):
+        """Receive a batch of badge scans from a floor terminal"""
+        if not self._check_kiosk_token():
+            return self._json_response({'error': 'forbidden'}, status=403)
+
+        try:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+        except ValueError:
+            return self._json_response({'error': 'invalid json'}, status=400)
+
+        events = self._get_batch(payload, 'events')
+        if events is None:
+            return self._json_response({'error': 'events must be a list of objects'}, status=400)
+        terminal = payload.get('terminal') if isinstance(payload, dict) else None
+        if terminal:
+            for event in events:
+                event.setdefault('terminal', terminal)
+        result = request.env['honey.kiosk.event'].sudo().process_events(events)
+        return self._json_response({'received': len(events), 'events': result})
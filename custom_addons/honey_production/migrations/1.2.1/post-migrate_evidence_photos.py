@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Photos attached to quality controls become evidence photos
+
+    Only image attachments are moved; files posted in the chatter stay
+    with their messages.
+    """
+    if not version:
+        return
+    cr.execute("""
+        SELECT a.id
+          FROM ir_attachment a
+         WHERE a.res_model = 'honey.quality.control'
+           AND a.res_field IS NULL
+           AND a.mimetype LIKE %s
+           AND NOT EXISTS (SELECT 1 FROM message_attachment_rel r WHERE r.attachment_id = a.id)
+      ORDER BY a.id
+    """, ('image/%',))
+    attachment_ids = [row[0] for row in cr.fetchall()]
+    if attachment_ids:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env['honey.evidence.photo']._create_from_attachments(attachment_ids)
@@ -2,7 +2,13 @@
 
 from . import production_batch
 from . import quality_control
+from . import quality_spc
+from . import evidence_photo
 from . import material_requirement
 from . import material
+from . import material_ledger
+from . import material_forecast
+from . import material_planning
 from . import time_tracking
+from . import kiosk
 from . import quality_control
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from PIL import Image
+
+from odoo import models, fields, api, _
+from odoo.tools.mimetypes import guess_mimetype
+
+_logger = logging.getLogger(__name__)
+
+
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 80
+# Blobs handled per cron run and worker threads used for encoding
+THUMBNAIL_BATCH_SIZE = 200
+THUMBNAIL_WORKERS = 4
+# Legacy attachments converted per batch by the migration
+MIGRATION_BATCH_SIZE = 100
+# Unreferenced blobs are kept this long, so an upload reusing one in a
+# transaction still running does not lose it, and deleted per cron run
+BLOB_GC_GRACE_PERIOD = timedelta(days=1)
+BLOB_GC_BATCH_SIZE = 1000
+
+
+def make_thumbnail(data):
+    """WebP thumbnail of an image given as raw bytes"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        output = io.BytesIO()
+        image.save(output, format='WEBP', quality=THUMBNAIL_QUALITY)
+        return output.getvalue()
+
+
+class PhotoBlob(models.Model):
+    _name = 'honey.photo.blob'
+    _description = 'Deduplicated Photo Content'
+    _rec_name = 'checksum'
+
+    checksum = fields.Char(
+        string='SHA-256',
+        required=True,
+        readonly=True
+    )
+    image = fields.Binary(
+        string='Original',
+        attachment=True,
+        readonly=True
+    )
+    thumbnail = fields.Binary(
+        string='Thumbnail',
+        attachment=True,
+        readonly=True
+    )
+    mimetype = fields.Char(
+        string='MIME Type',
+        readonly=True
+    )
+    file_size = fields.Integer(
+        string='File Size',
+        readonly=True
+    )
+    thumbnail_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Thumbnail Status', default='pending', required=True, index=True)
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique (checksum)', 'Photo content must be unique!'),
+    ]
+
+    @api.model
+    def _get_or_create(self, datas):
+        """Blobs for a list of base64 images, reusing content already stored
+
+        Returns blob ids aligned with datas. Identical uploads, within the
+        list or from earlier calls, share one blob and one stored file.
+        """
+        raws = [base64.b64decode(data) for data in datas]
+        checksums = [hashlib.sha256(raw).hexdigest() for raw in raws]
+        existing = {
+            blob.checksum: blob.id
+            for blob in self.search([('checksum', 'in', list(set(checksums)))])
+        }
+        to_create = {}
+        for checksum, raw, data in zip(checksums, raws, datas):
+            if checksum not in existing and checksum not in to_create:
+                to_create[checksum] = {
+                    'checksum': checksum,
+                    'image': data,
+                    'mimetype': guess_mimetype(raw),
+                    'file_size': len(raw),
+                }
+        if to_create:
+            for blob in self.create(list(to_create.values())):
+                existing[blob.checksum] = blob.id
+            cron = self.env.ref('honey_production.ir_cron_generate_photo_thumbnails', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+        return [existing[checksum] for checksum in checksums]
+
+    @api.model
+    def _gc_unreferenced_blobs(self):
+        """Delete blobs no evidence photo points to any more
+
+        Deleting or replacing a photo leaves its blob behind, since other
+        photos may share it. The blob, its original and thumbnail go once
+        no photo uses them and the grace period is over.
+        """
+        self.env['honey.evidence.photo'].flush(['blob_id'])
+        self.env.cr.execute("""
+            SELECT b.id
+              FROM honey_photo_blob b
+             WHERE b.create_date < %s
+               AND NOT EXISTS (SELECT 1 FROM honey_evidence_photo p WHERE p.blob_id = b.id)
+          ORDER BY b.id
+             LIMIT %s
+        """, (fields.Datetime.now() - BLOB_GC_GRACE_PERIOD, BLOB_GC_BATCH_SIZE))
+        blob_ids = [row[0] for row in self.env.cr.fetchall()]
+        if blob_ids:
+            self.browse(blob_ids).unlink()
+            _logger.info("Deleted %s unreferenced photo blobs", len(blob_ids))
+        return len(blob_ids)
+
+    @api.model
+    def _cron_generate_thumbnails(self):
+        """Generate WebP thumbnails for pending blobs in a worker pool
+
+        Unreferenced blobs are cleaned up first, so no thumbnail is made
+        for content nothing shows any more.
+        """
+        self._gc_unreferenced_blobs()
+        blobs = self.search([('thumbnail_state', '=', 'pending')], limit=THUMBNAIL_BATCH_SIZE)
+        if not blobs:
+            return
+        # Decoding and encoding happen in the pool; only raw bytes cross threads
+        originals = [base64.b64decode(blob.image or b'') for blob in blobs]
+        with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as executor:
+            futures = [executor.submit(make_thumbnail, raw) for raw in originals]
+
+        for blob, future in zip(blobs, futures):
+            try:
+                thumbnail = future.result()
+            except Exception as e:
+                _logger.warning("Could not generate thumbnail for photo %s: %s", blob.checksum, e)
+                blob.thumbnail_state = 'failed'
+                continue
+            blob.write({
+                'thumbnail': base64.b64encode(thumbnail),
+                'thumbnail_state': 'done',
+            })
+        if len(blobs) == THUMBNAIL_BATCH_SIZE:
+            self.env.ref('honey_production.ir_cron_generate_photo_thumbnails')._trigger()
+
+
+class EvidencePhoto(models.Model):
+    _name = 'honey.evidence.photo'
+    _description = 'Evidence Photo'
+    _order = 'upload_date desc, id desc'
+
+    name = fields.Char(
+        string='Name'
+    )
+    res_model = fields.Char(
+        string='Related Model',
+        required=True
+    )
+    res_id = fields.Many2oneReference(
+        string='Related Record',
+        model_field='res_model',
+        required=True
+    )
+    blob_id = fields.Many2one(
+        'honey.photo.blob',
+        string='Content',
+        required=True,
+        ondelete='restrict',
+        index=True
+    )
+
+    # Thumbnail is what lists show; the original is only read when opened
+    thumbnail = fields.Binary(
+        string='Thumbnail',
+        related='blob_id.thumbnail'
+    )
+    image = fields.Binary(
+        string='Photo',
+        compute='_compute_image',
+        inverse='_inverse_image'
+    )
+    mimetype = fields.Char(
+        string='MIME Type',
+        related='blob_id.mimetype'
+    )
+    file_size = fields.Integer(
+        string='File Size',
+        related='blob_id.file_size'
+    )
+    upload_date = fields.Datetime(
+        string='Uploaded On',
+        default=fields.Datetime.now,
+        readonly=True
+    )
+    uploaded_by = fields.Many2one(
+        'res.users',
+        string='Uploaded By',
+        default=lambda self: self.env.user,
+        readonly=True
+    )
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_evidence_photo_res_idx
+                ON honey_evidence_photo (res_model, res_id)
+        """)
+
+    @api.model
+    def _create_from_attachments(self, attachment_ids):
+        """Move legacy image attachments into evidence photos
+
+        Used by the migration scripts. Attachments are converted in batches
+        so only one batch of originals is in memory, and each attachment is
+        deleted once its photo exists.
+        """
+        Attachment = self.env['ir.attachment']
+        for start in range(0, len(attachment_ids), MIGRATION_BATCH_SIZE):
+            attachments = Attachment.browse(attachment_ids[start:start + MIGRATION_BATCH_SIZE])
+            vals_list = [{
+                'name': attachment.name,
+                'res_model': attachment.res_model,
+                'res_id': attachment.res_id,
+                'image': attachment.datas,
+                'upload_date': attachment.create_date,
+                'uploaded_by': attachment.create_uid.id,
+            } for attachment in attachments if attachment.datas and attachment.res_id]
+            if vals_list:
+                self.create(vals_list)
+            attachments.unlink()
+            self.flush()
+            self.invalidate_cache()
+            _logger.info("Migrated %s of %s photo attachments",
+                         min(start + MIGRATION_BATCH_SIZE, len(attachment_ids)), len(attachment_ids))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Uploads are hashed together so duplicates in one call share a blob
+        uploads = [vals for vals in vals_list if vals.get('image')]
+        if uploads:
+            blob_ids = self.env['honey.photo.blob']._get_or_create([vals.pop('image') for vals in uploads])
+            for vals, blob_id in zip(uploads, blob_ids):
+                vals['blob_id'] = blob_id
+        return super().create(vals_list)
+
+    @api.depends('blob_id')
+    def _compute_image(self):
+        for photo in self:
+            photo.image = photo.blob_id.image
+
+    def _inverse_image(self):
+        for photo in self.filtered('image'):
+            photo.blob_id = self.env['honey.photo.blob']._get_or_create([photo.image])[0]
+
+    def action_open_original(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/honey.photo.blob/%s/image?download=false' % self.blob_id.id,
+            'target': 'new',
+        }
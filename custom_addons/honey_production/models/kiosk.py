@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from odoo import models, fields, api, tools, _
+
+
+class KioskEvent(models.Model):
+    _name = 'honey.kiosk.event'
+    _description = 'Production Kiosk Badge Event'
+    _order = 'event_time desc, id desc'
+    # Written in bulk by the kiosk endpoint only
+    _log_access = False
+
+    event_uid = fields.Char(
+        string='Event ID',
+        required=True,
+        help='Unique id generated by the terminal; replayed events with a known id are skipped'
+    )
+    terminal = fields.Char(
+        string='Terminal'
+    )
+    badge = fields.Char(
+        string='Badge',
+        required=True
+    )
+    employee_id = fields.Many2one(
+        'hr.employee',
+        string='Employee',
+        index=True
+    )
+    batch_id = fields.Many2one(
+        'honey.production.batch',
+        string='Production Batch'
+    )
+    event_type = fields.Selection([
+        ('in', 'Clock In'),
+        ('out', 'Clock Out'),
+    ], string='Event Type', required=True)
+    event_time = fields.Datetime(
+        string='Event Time',
+        required=True
+    )
+    received_date = fields.Datetime(
+        string='Received',
+        required=True,
+        default=fields.Datetime.now
+    )
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('stale', 'Out of Order'),
+        ('unknown_badge', 'Unknown Badge'),
+    ], string='Status', required=True, default='pending')
+    time_record_id = fields.Many2one(
+        'honey.employee.time',
+        string='Time Record',
+        ondelete='set null'
+    )
+
+    _sql_constraints = [
+        ('event_uid_uniq', 'unique (event_uid)', 'Kiosk event ids must be unique!'),
+    ]
+
+    @api.model
+    def _parse_event_time(self, value):
+        """Event time from a unix timestamp or a datetime string
+
+        Anything else, including timestamps out of the datetime range, is
+        taken as received now.
+        """
+        try:
+            if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+                return datetime.utcfromtimestamp(int(value))
+            if isinstance(value, str):
+                return fields.Datetime.to_datetime(value) or fields.Datetime.now()
+        except (OverflowError, ValueError, OSError):
+            pass
+        return fields.Datetime.now()
+
+    @api.model
+    def process_events(self, events):
+        """Record and apply a batch of badge scans from kiosk terminals
+
+        events is a list of dicts with 'event_id', 'badge', 'type' ('in' or
+        'out'), 'timestamp' and, for clock-in, 'batch_id'. Events whose id was
+        already received are skipped, so terminals can replay their offline
+        buffer safely. Returns {event_id: status}.
+        """
+        now = fields.Datetime.now()
+        events = [
+            event for event in events
+            if event.get('event_id') and event.get('badge') and event.get('type') in ('in', 'out')
+        ]
+        batch_ids = {event['batch_id'] for event in events if isinstance(event.get('batch_id'), int)}
+        known_batches = set(self.env['honey.production.batch'].browse(batch_ids).exists().ids)
+
+        rows = {}
+        for event in events:
+            event_uid = str(event['event_id'])
+            batch_id = event.get('batch_id')
+            rows[event_uid] = (
+                event_uid, event.get('terminal'), str(event['badge']), batch_id if batch_id in known_batches else None,
+                event['type'], self._parse_event_time(event.get('timestamp')), now, 'pending',
+            )
+        if not rows:
+            return {}
+
+        self.env.cr.execute("""
+            INSERT INTO honey_kiosk_event
+                (event_uid, terminal, badge, batch_id, event_type, event_time, received_date, state)
+            VALUES %s
+            ON CONFLICT (event_uid) DO NOTHING
+            RETURNING id
+        """ % ', '.join(['%s'] * len(rows)), list(rows.values()))
+        new_events = self.browse([row[0] for row in self.env.cr.fetchall()])
+        result = dict.fromkeys(rows, 'duplicate')
+        if new_events:
+            result.update(new_events._apply_events())
+        return result
+
+    def _apply_events(self):
+        """Open and close employee time intervals for new events in bulk"""
+        badges = self.env['hr.employee']._get_badge_map()
+        events = self.sorted(lambda e: (e.event_time, e.id))
+        employee_ids = list({badges[e.badge] for e in events if e.badge in badges})
+
+        # Current open interval and latest activity per employee
+        open_records = {}
+        last_activity = {}
+        if employee_ids:
+            self.env['honey.employee.time'].flush(['employee_id', 'login_time', 'logout_time', 'state'])
+            self.env.cr.execute("""
+                SELECT employee_id,
+                       MAX(id) FILTER (WHERE state = 'logged_in'),
+                       MAX(COALESCE(logout_time, login_time))
+                  FROM honey_employee_time
+                 WHERE employee_id IN %s
+              GROUP BY employee_id
+            """, (tuple(employee_ids),))
+            for employee_id, open_id, last_time in self.env.cr.fetchall():
+                if open_id:
+                    open_records[employee_id] = open_id
+                last_activity[employee_id] = last_time
+
+        states = {}
+        closes = {}
+        new_intervals = {}
+        closed_new = {}
+        for event in events:
+            employee_id = badges.get(event.badge)
+            if not employee_id:
+                states[event.id] = ('unknown_badge', None, None)
+                continue
+            if last_activity.get(employee_id) and event.event_time < last_activity[employee_id]:
+                states[event.id] = ('stale', employee_id, None)
+                continue
+
+            current = open_records.get(employee_id)
+            if event.event_type == 'in':
+                if current or not event.batch_id:
+                    states[event.id] = ('ignored', employee_id, None)
+                    continue
+                new_intervals[event.id] = {
+                    'employee_id': employee_id,
+                    'batch_id': event.batch_id.id,
+                    'login_time': event.event_time,
+                    'state': 'logged_in',
+                }
+                open_records[employee_id] = ('new', event.id)
+            else:
+                if not current:
+                    states[event.id] = ('ignored', employee_id, None)
+                    continue
+                if isinstance(current, tuple):
+                    new_intervals[current[1]].update(logout_time=event.event_time, state='logged_out')
+                    closed_new[event.id] = current[1]
+                else:
+                    closes[current] = event.event_time
+                    states[event.id] = ('done', employee_id, current)
+                del open_records[employee_id]
+            last_activity[employee_id] = event.event_time
+            states.setdefault(event.id, ('done', employee_id, None))
+
+        EmployeeTime = self.env['honey.employee.time']
+        if closes:
+            values = list(closes.items())
+            self.env.cr.execute("""
+                UPDATE honey_employee_time t
+                   SET logout_time = v.logout_time,
+                       state = 'logged_out',
+                       work_duration = EXTRACT(EPOCH FROM (v.logout_time - t.login_time)) / 3600,
+                       write_uid = %%s,
+                       write_date = now() at time zone 'UTC'
+                  FROM (VALUES %s) AS v(id, logout_time)
+                 WHERE t.id = v.id
+            """ % ', '.join(['%s'] * len(values)), [self.env.uid] + values)
+            EmployeeTime.browse(list(closes)).invalidate_cache(
+                ['logout_time', 'state', 'work_duration', 'write_uid', 'write_date'], list(closes))
+        if new_intervals:
+            records = EmployeeTime.create(list(new_intervals.values()))
+            record_ids = dict(zip(new_intervals, records.ids))
+            for event_id, record_id in record_ids.items():
+                states[event_id] = ('done', states[event_id][1], record_id)
+            for event_id, in_event_id in closed_new.items():
+                states[event_id] = ('done', states[event_id][1], record_ids[in_event_id])
+
+        values = [
+            value
+            for event_id, (state, employee_id, record_id) in states.items()
+            for value in (event_id, state, employee_id, record_id)
+        ]
+        # Explicit casts: in a batch of only stale/ignored events the ids are all NULL
+        self.env.cr.execute("""
+            UPDATE honey_kiosk_event e
+               SET state = v.state,
+                   employee_id = v.employee_id,
+                   time_record_id = v.time_record_id
+              FROM (VALUES %s) AS v(id, state, employee_id, time_record_id)
+             WHERE e.id = v.id
+        """ % ', '.join(['(%s::int, %s::varchar, %s::int, %s::int)'] * len(states)), values)
+        self.invalidate_cache(['state', 'employee_id', 'time_record_id'], self.ids)
+        return {event.event_uid: states[event.id][0] for event in events}
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        if any(vals.get('barcode') for vals in vals_list):
+            self.env['hr.employee'].clear_caches()
+        return employees
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'barcode' in vals or 'active' in vals:
+            self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_badge_map(self):
+        """Registry-level cache of active badges: {barcode: employee id}"""
+        self.env.cr.execute("""
+            SELECT barcode, id FROM hr_employee WHERE barcode IS NOT NULL AND active
+        """)
+        return dict(self.env.cr.fetchall())
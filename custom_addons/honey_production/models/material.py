@@ -1,6 +1,18 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import logging
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+# Fields that define a posted movement's effect on stock
+POSTED_MOVEMENT_FIELDS = {
+    'material_type_id', 'material_subtype', 'movement_type', 'quantity',
+    'from_location_id', 'to_location_id', 'date',
+}
 
 
 class MaterialType(models.Model):
@@ -54,6 +66,11 @@ class MaterialType(models.Model):
         string='Last Purchase Cost',
         digits=(16, 2)
     )
+    lead_time_days = fields.Integer(
+        string='Lead Time (Days)',
+        default=7,
+        help='Days between ordering and receiving the material, used for reorder points'
+    )
     
     active = fields.Boolean(
         string='Active',
@@ -111,6 +128,32 @@ class MaterialStock(models.Model):
         ('out_of_stock', 'Out of Stock'),
     ], string='Stock Status', compute='_compute_stock_status', store=True)
     
+    # Consumption forecast, refreshed nightly from movement history
+    avg_daily_consumption = fields.Float(
+        string='Average Daily Consumption',
+        readonly=True,
+        help='Simple moving average of daily outgoing quantities'
+    )
+    forecast_daily_consumption = fields.Float(
+        string='Forecast Daily Consumption',
+        readonly=True,
+        help='Exponentially smoothed daily outgoing quantity'
+    )
+    reorder_point = fields.Float(
+        string='Reorder Point',
+        readonly=True,
+        help='Forecast demand over the lead time plus safety stock; replaces the minimum stock level once set'
+    )
+    days_of_cover = fields.Float(
+        string='Days of Cover',
+        readonly=True,
+        help='Days the current stock lasts at the forecast consumption; 0 when there is no consumption'
+    )
+    forecast_date = fields.Datetime(
+        string='Forecast Date',
+        readonly=True
+    )
+
     # Last movement
     last_in_date = fields.Datetime(
         string='Last In Date'
@@ -124,18 +167,147 @@ class MaterialStock(models.Model):
         string='Notes'
     )
 
-    @api.depends('current_stock', 'minimum_stock')
+    def init(self):
+        # One stock row per (material, subtype, location); posting relies on it
+        if not tools.index_exists(self.env.cr, 'honey_material_stock_key_uniq'):
+            self._merge_duplicate_stock()
+        tools.create_unique_index(
+            self.env.cr, 'honey_material_stock_key_uniq', self._table,
+            ['material_type_id', "COALESCE(material_subtype, '')", 'location_id'])
+
+    def _merge_duplicate_stock(self):
+        """Merge stock rows sharing a (material, subtype, location) key
+
+        Rows created before the key was unique would make the unique index
+        fail. The oldest row of each key keeps the summed stock and takes
+        over the ledger entries of the others, which are deleted.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT MIN(id), ARRAY_AGG(id), SUM(current_stock), MAX(minimum_stock), MAX(maximum_stock),
+                   MAX(last_in_date), MAX(last_out_date)
+              FROM honey_material_stock
+          GROUP BY material_type_id, COALESCE(material_subtype, ''), location_id
+            HAVING COUNT(*) > 1
+        """)
+        groups = cr.fetchall()
+        if not groups:
+            return
+        merged_ids = []
+        for keep_id, stock_ids, current_stock, minimum_stock, maximum_stock, last_in, last_out in groups:
+            cr.execute("""
+                UPDATE honey_material_stock
+                   SET current_stock = %s, minimum_stock = %s, maximum_stock = %s,
+                       last_in_date = %s, last_out_date = %s
+                 WHERE id = %s
+            """, (current_stock, minimum_stock, maximum_stock, last_in, last_out, keep_id))
+            duplicate_ids = [stock_id for stock_id in stock_ids if stock_id != keep_id]
+            if tools.table_exists(cr, 'honey_material_ledger'):
+                cr.execute("UPDATE honey_material_ledger SET stock_id = %s WHERE stock_id IN %s",
+                           (keep_id, tuple(duplicate_ids)))
+            merged_ids += duplicate_ids
+        cr.execute("DELETE FROM honey_material_stock WHERE id IN %s", (tuple(merged_ids),))
+        _logger.info("Merged %s duplicate material stock rows into %s", len(merged_ids), len(groups))
+
+    @api.depends('current_stock', 'minimum_stock', 'reorder_point')
     def _compute_stock_status(self):
         for record in self:
+            threshold = record.reorder_point or record.minimum_stock
             if record.current_stock <= 0:
                 record.stock_status = 'out_of_stock'
-            elif record.current_stock <= record.minimum_stock * 0.5:
+            elif record.current_stock <= threshold * 0.5:
                 record.stock_status = 'critical'
-            elif record.current_stock <= record.minimum_stock:
+            elif record.current_stock <= threshold:
                 record.stock_status = 'low'
             else:
                 record.stock_status = 'sufficient'
 
+    @api.model
+    def _apply_stock_deltas(self, deltas):
+        """Add quantity deltas to stock rows identified by key
+
+        deltas maps (material type id, subtype or '', location id) to a dict
+        with 'quantity', 'warehouse_id', 'last_in' and 'last_out'. Missing rows
+        are inserted first, then the increment goes through _increment_stock.
+        Returns {key: (stock id, balance)}.
+        """
+        if not deltas:
+            return {}
+        self.flush()
+        keys = list(deltas)
+
+        rows = [(key[0], key[1] or None, key[2], deltas[key]['warehouse_id']) for key in keys]
+        self.env.cr.execute("""
+            INSERT INTO honey_material_stock
+                (material_type_id, material_subtype, location_id, warehouse_id,
+                 current_stock, minimum_stock, maximum_stock, stock_status,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT v.material_type_id, v.material_subtype, v.location_id, v.warehouse_id,
+                   0, 0, 0, 'out_of_stock',
+                   %%s, now() at time zone 'UTC', %%s, now() at time zone 'UTC'
+              FROM (VALUES %s) AS v(material_type_id, material_subtype, location_id, warehouse_id)
+            ON CONFLICT (material_type_id, (COALESCE(material_subtype, '')), location_id) DO NOTHING
+        """ % ', '.join(['%s'] * len(rows)), [self.env.uid, self.env.uid] + rows)
+
+        self.env.cr.execute("""
+            SELECT s.id, v.material_type_id, v.material_subtype, v.location_id
+              FROM honey_material_stock s
+              JOIN (VALUES %s) AS v(material_type_id, material_subtype, location_id)
+                ON s.material_type_id = v.material_type_id
+               AND COALESCE(s.material_subtype, '') = v.material_subtype
+               AND s.location_id = v.location_id
+        """ % ', '.join(['%s'] * len(keys)), keys)
+        stock_ids = {(material_type_id, subtype, location_id): stock_id
+                     for stock_id, material_type_id, subtype, location_id in self.env.cr.fetchall()}
+
+        balances = self._increment_stock({
+            stock_ids[key]: (deltas[key]['quantity'], deltas[key]['last_in'], deltas[key]['last_out'])
+            for key in keys
+        })
+        return {key: (stock_ids[key], balances[stock_ids[key]]) for key in keys}
+
+    @api.model
+    def _increment_stock(self, deltas):
+        """Atomically add quantities to stock rows: {stock id: (quantity, last in, last out)}
+
+        Rows are locked in id order before the increment, so concurrent
+        postings touching overlapping rows queue up instead of deadlocking,
+        and current_stock is changed with SQL arithmetic rather than a
+        read-modify-write through the ORM. stock_status is set in the same
+        UPDATE. Returns {stock id: new balance}.
+        """
+        if not deltas:
+            return {}
+        self.flush(['current_stock', 'minimum_stock', 'reorder_point', 'last_in_date', 'last_out_date'])
+        stock_ids = sorted(deltas)
+        self.env.cr.execute("""
+            SELECT id FROM honey_material_stock WHERE id IN %s ORDER BY id FOR UPDATE
+        """, (tuple(stock_ids),))
+
+        values = [(stock_id,) + tuple(deltas[stock_id]) for stock_id in stock_ids]
+        # stock_status mirrors _compute_stock_status
+        self.env.cr.execute("""
+            UPDATE honey_material_stock s
+               SET current_stock = s.current_stock + v.quantity,
+                   stock_status = CASE
+                       WHEN s.current_stock + v.quantity <= 0 THEN 'out_of_stock'
+                       WHEN s.current_stock + v.quantity <= COALESCE(NULLIF(s.reorder_point, 0), s.minimum_stock) * 0.5 THEN 'critical'
+                       WHEN s.current_stock + v.quantity <= COALESCE(NULLIF(s.reorder_point, 0), s.minimum_stock) THEN 'low'
+                       ELSE 'sufficient' END,
+                   last_in_date = GREATEST(s.last_in_date, v.last_in::timestamp),
+                   last_out_date = GREATEST(s.last_out_date, v.last_out::timestamp),
+                   write_uid = %%s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES %s) AS v(id, quantity, last_in, last_out)
+             WHERE s.id = v.id
+         RETURNING s.id, s.current_stock
+        """ % ', '.join(['%s'] * len(values)), [self.env.uid] + values)
+        balances = dict(self.env.cr.fetchall())
+
+        self.browse(stock_ids).invalidate_cache(
+            ['current_stock', 'stock_status', 'last_in_date', 'last_out_date', 'write_uid', 'write_date'], stock_ids)
+        return balances
+
 
 class MaterialMovement(models.Model):
     _name = 'honey.material.movement'
@@ -215,37 +387,129 @@ class MaterialMovement(models.Model):
         string='Notes'
     )
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('honey.material.movement') or _('New')
-        return super().create(vals)
+    # Posting
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('done', 'Posted'),
+    ], string='Status', default='draft', required=True, readonly=True, copy=False)
+    ledger_ids = fields.One2many(
+        'honey.material.ledger',
+        'movement_id',
+        string='Ledger Entries',
+        readonly=True
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', _('New')) == _('New'):
+                vals['name'] = self.env['ir.sequence'].next_by_code('honey.material.movement') or _('New')
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if set(vals) & POSTED_MOVEMENT_FIELDS and any(record.state == 'done' for record in self):
+            raise UserError(_('Posted material movements cannot be modified.'))
+        return super().write(vals)
+
+    def unlink(self):
+        if any(record.state == 'done' for record in self):
+            raise UserError(_('Posted material movements cannot be deleted.'))
+        return super().unlink()
 
     def action_process_movement(self):
         """Process the material movement and update stock"""
+        self._post_movements()
+
+    @api.model
+    def post_movements(self, vals_list):
+        """Create and post many movements in one call"""
+        movements = self.create(vals_list)
+        movements._post_movements()
+        return movements
+
+    def _get_stock_legs(self):
+        """Split movements into signed per-location stock changes
+
+        Returns (movement, location, quantity) tuples: in and out change one
+        location, a transfer moves stock between two locations and an
+        adjustment applies a signed correction to its location.
+        """
+        legs = []
         for record in self:
-            # Update material stock
-            stock = self.env['honey.material.stock'].search([
-                ('material_type_id', '=', record.material_type_id.id),
-                ('material_subtype', '=', record.material_subtype),
-                ('location_id', '=', record.to_location_id.id if record.movement_type == 'in' else record.from_location_id.id)
-            ])
-            
-            if not stock:
-                # Create new stock record
-                stock = self.env['honey.material.stock'].create({
-                    'material_type_id': record.material_type_id.id,
-                    'material_subtype': record.material_subtype,
-                    'warehouse_id': record.to_location_id.warehouse_id.id if record.movement_type == 'in' else record.from_location_id.warehouse_id.id,
-                    'location_id': record.to_location_id.id if record.movement_type == 'in' else record.from_location_id.id,
-                })
-            
-            # Update stock quantity
+            if record.movement_type != 'adjustment' and record.quantity <= 0:
+                raise ValidationError(_('Movement %s must have a positive quantity.') % record.name)
             if record.movement_type == 'in':
-                stock.current_stock += record.quantity
-                stock.last_in_date = record.date
+                legs.append((record, record.to_location_id, record.quantity))
             elif record.movement_type == 'out':
-                stock.current_stock -= record.quantity
-                stock.last_out_date = record.date
-                if stock.current_stock < 0:
-                    stock.current_stock = 0  # Prevent negative stock
+                legs.append((record, record.from_location_id, -record.quantity))
+            elif record.movement_type == 'transfer':
+                legs.append((record, record.from_location_id, -record.quantity))
+                legs.append((record, record.to_location_id, record.quantity))
+            else:
+                legs.append((record, record.to_location_id or record.from_location_id, record.quantity))
+
+        for record, location, _quantity in legs:
+            if not location:
+                raise ValidationError(_('Movement %s is missing a location.') % record.name)
+            if not location.warehouse_id:
+                raise ValidationError(_('Location %s does not belong to a warehouse.') % location.display_name)
+        return legs
+
+    def _post_movements(self):
+        """Post draft movements to stock and the ledger in one pass
+
+        Stock rows are incremented atomically, each ledger entry stores the
+        running balance after it, and outgoing quantities that would drive a
+        balance below zero are rejected instead of being clamped.
+        """
+        now = fields.Datetime.now()
+        movements = self.filtered(lambda m: m.state == 'draft').sorted(lambda m: (m.date or now, m.id))
+        if not movements:
+            return
+        legs = movements._get_stock_legs()
+
+        deltas = {}
+        for movement, location, quantity in legs:
+            key = (movement.material_type_id.id, movement.material_subtype or '', location.id)
+            date = movement.date or now
+            entry = deltas.setdefault(key, {
+                'quantity': 0.0,
+                'warehouse_id': location.warehouse_id.id,
+                'last_in': None,
+                'last_out': None,
+            })
+            entry['quantity'] += quantity
+            direction = 'last_in' if quantity > 0 else 'last_out'
+            entry[direction] = max(entry[direction] or date, date)
+
+        balances = self.env['honey.material.stock']._apply_stock_deltas(deltas)
+
+        # Walk the legs backwards from the final balance to get the running balance
+        running = {key: balance for key, (_stock_id, balance) in balances.items()}
+        entries = []
+        for movement, location, quantity in reversed(legs):
+            key = (movement.material_type_id.id, movement.material_subtype or '', location.id)
+            balance = running[key]
+            if quantity < 0 and balance < 0:
+                raise ValidationError(_(
+                    'Not enough %(material)s at %(location)s to post %(movement)s: '
+                    'the balance would drop to %(balance).2f.'
+                ) % {
+                    'material': movement.material_type_id.name,
+                    'location': location.display_name,
+                    'movement': movement.name,
+                    'balance': balance,
+                })
+            entries.append((
+                movement.id, balances[key][0], key[0], key[1], key[2],
+                quantity, balance, movement.date or now, movement.user_id.id or self.env.uid,
+            ))
+            running[key] = balance - quantity
+        entries.reverse()
+
+        self.env['honey.material.ledger']._insert_entries(entries)
+        self.env['honey.material.snapshot']._invalidate_from(
+            min(movement.date or now for movement in movements),
+            list({key[0] for key in deltas}),
+        )
+        movements.write({'state': 'done'})
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import numpy as np
+
+from odoo import models, fields, api
+
+
+# History loaded per nightly run and smoothing parameters
+FORECAST_HISTORY_DAYS = 5 * 365
+MOVING_AVERAGE_DAYS = 30
+SMOOTHING_ALPHA = 0.1
+# z-score for a ~95% service level in the safety stock
+SERVICE_LEVEL_Z = 1.65
+
+
+def forecast_consumption(history, window=MOVING_AVERAGE_DAYS, alpha=SMOOTHING_ALPHA):
+    """Vectorized consumption statistics for a materials x days matrix
+
+    history holds daily outgoing quantities, oldest day first. Returns
+    (moving average, exponentially smoothed rate, daily standard deviation)
+    per row; the smoothing is a single matrix-vector product with decaying
+    weights, so all materials are processed at once.
+    """
+    days = history.shape[1]
+    recent = history[:, -min(window, days):]
+    moving_average = recent.mean(axis=1)
+    deviation = recent.std(axis=1)
+
+    weights = (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    smoothed = history @ weights / weights.sum()
+    return moving_average, smoothed, deviation
+
+
+class MaterialStockForecast(models.Model):
+    _inherit = 'honey.material.stock'
+
+    def _load_consumption_history(self, start_date, days):
+        """Daily outgoing quantities per stock row: (stock ids, matrix)"""
+        self.env['honey.material.ledger'].flush()
+        self.env['honey.material.movement'].flush(['movement_type'])
+        self.env.cr.execute("""
+            SELECT l.stock_id, l.date::date, -SUM(l.quantity)
+              FROM honey_material_ledger l
+              JOIN honey_material_movement m ON m.id = l.movement_id
+             WHERE m.movement_type = 'out'
+               AND l.stock_id IS NOT NULL
+               AND l.date >= %s
+               AND l.date < %s
+          GROUP BY l.stock_id, l.date::date
+        """, (start_date, start_date + timedelta(days=days)))
+        rows = self.env.cr.fetchall()
+
+        self.env.cr.execute("SELECT id FROM honey_material_stock ORDER BY id")
+        stock_ids = [row[0] for row in self.env.cr.fetchall()]
+        history = np.zeros((len(stock_ids), days), dtype=np.float64)
+        if rows:
+            stock_index = {stock_id: index for index, stock_id in enumerate(stock_ids)}
+            row_idx = np.fromiter((stock_index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+            dates = np.array([row[1] for row in rows], dtype='datetime64[D]')
+            day_idx = (dates - np.datetime64(start_date, 'D')).astype(np.int64)
+            quantities = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+            np.add.at(history, (row_idx, day_idx), quantities)
+        return stock_ids, history
+
+    @api.model
+    def _cron_forecast_consumption(self):
+        """Nightly forecast: consumption rates, reorder points and days of cover"""
+        today = fields.Date.today()
+        start_date = today - timedelta(days=FORECAST_HISTORY_DAYS)
+        stock_ids, history = self._load_consumption_history(start_date, FORECAST_HISTORY_DAYS + 1)
+        if not stock_ids:
+            return
+
+        self.flush(['current_stock', 'material_type_id'])
+        self.env.cr.execute("""
+            SELECT s.id, s.current_stock, COALESCE(t.lead_time_days, 0)
+              FROM honey_material_stock s
+              JOIN honey_material_type t ON t.id = s.material_type_id
+             WHERE s.id IN %s
+          ORDER BY s.id
+        """, (tuple(stock_ids),))
+        stock_rows = self.env.cr.fetchall()
+        current_stock = np.fromiter((row[1] for row in stock_rows), dtype=np.float64, count=len(stock_rows))
+        lead_time = np.fromiter((row[2] for row in stock_rows), dtype=np.float64, count=len(stock_rows))
+
+        moving_average, smoothed, deviation = forecast_consumption(history)
+        reorder_point = smoothed * lead_time + SERVICE_LEVEL_Z * deviation * np.sqrt(lead_time)
+        days_of_cover = np.divide(
+            np.maximum(current_stock, 0.0), smoothed,
+            out=np.zeros_like(smoothed), where=smoothed > 0,
+        )
+
+        values = [
+            (stock_id, float(moving_average[i]), float(smoothed[i]), float(reorder_point[i]), float(days_of_cover[i]))
+            for i, stock_id in enumerate(stock_ids)
+        ]
+        # stock_status mirrors _compute_stock_status with the new reorder point
+        self.env.cr.execute("""
+            UPDATE honey_material_stock s
+               SET avg_daily_consumption = v.average,
+                   forecast_daily_consumption = v.forecast,
+                   reorder_point = v.reorder_point,
+                   days_of_cover = v.days_of_cover,
+                   forecast_date = now() at time zone 'UTC',
+                   stock_status = CASE
+                       WHEN s.current_stock <= 0 THEN 'out_of_stock'
+                       WHEN s.current_stock <= COALESCE(NULLIF(v.reorder_point, 0), s.minimum_stock) * 0.5 THEN 'critical'
+                       WHEN s.current_stock <= COALESCE(NULLIF(v.reorder_point, 0), s.minimum_stock) THEN 'low'
+                       ELSE 'sufficient' END
+              FROM (VALUES %s) AS v(id, average, forecast, reorder_point, days_of_cover)
+             WHERE s.id = v.id
+        """ % ', '.join(['%s'] * len(values)), values)
+        self.browse(stock_ids).invalidate_cache([
+            'avg_daily_consumption', 'forecast_daily_consumption', 'reorder_point',
+            'days_of_cover', 'forecast_date', 'stock_status',
+        ], stock_ids)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class MaterialLedger(models.Model):
+    _name = 'honey.material.ledger'
+    _description = 'Material Stock Ledger'
+    _order = 'date desc, id desc'
+    # Append-only: entries are written once by movement posting
+    _log_access = False
+
+    movement_id = fields.Many2one(
+        'honey.material.movement',
+        string='Movement',
+        index=True,
+        ondelete='restrict',
+        help='Empty for opening balances taken over from existing stock'
+    )
+    stock_id = fields.Many2one(
+        'honey.material.stock',
+        string='Stock',
+        index=True,
+        ondelete='set null'
+    )
+    material_type_id = fields.Many2one(
+        'honey.material.type',
+        string='Material Type',
+        required=True
+    )
+    material_subtype = fields.Char(
+        string='Material Subtype'
+    )
+    location_id = fields.Many2one(
+        'stock.location',
+        string='Location',
+        required=True
+    )
+
+    # Signed change and running balance of the (material, subtype, location) key
+    quantity = fields.Float(
+        string='Quantity',
+        required=True
+    )
+    balance_after = fields.Float(
+        string='Balance After',
+        required=True
+    )
+    date = fields.Datetime(
+        string='Date',
+        required=True,
+        index=True
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string='User'
+    )
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_material_ledger_key_date_idx
+                ON honey_material_ledger (material_type_id, material_subtype, location_id, date)
+        """)
+        # Existing stock enters the ledger once as an opening balance
+        self.env.cr.execute("""
+            INSERT INTO honey_material_ledger
+                (stock_id, material_type_id, material_subtype, location_id,
+                 quantity, balance_after, date)
+            SELECT s.id, s.material_type_id, COALESCE(s.material_subtype, ''), s.location_id,
+                   s.current_stock, s.current_stock, COALESCE(s.write_date, now() at time zone 'UTC')
+              FROM honey_material_stock s
+             WHERE s.current_stock != 0
+               AND NOT EXISTS (SELECT 1 FROM honey_material_ledger l WHERE l.stock_id = s.id)
+        """)
+
+    def write(self, vals):
+        raise UserError(_('Material ledger entries are append-only and cannot be modified.'))
+
+    def unlink(self):
+        raise UserError(_('Material ledger entries are append-only and cannot be deleted.'))
+
+    @api.model
+    def _insert_entries(self, entries):
+        """Bulk insert ledger rows
+
+        entries are tuples of (movement id, stock id, material type id,
+        subtype, location id, quantity, balance after, date, user id).
+        """
+        if not entries:
+            return
+        self.env.cr.execute("""
+            INSERT INTO honey_material_ledger
+                (movement_id, stock_id, material_type_id, material_subtype, location_id,
+                 quantity, balance_after, date, user_id)
+            VALUES %s
+        """ % ', '.join(['%s'] * len(entries)), entries)
+        self.invalidate_cache()
+
+
+class MaterialSnapshot(models.Model):
+    _name = 'honey.material.snapshot'
+    _description = 'Material Stock Snapshot'
+    _order = 'snapshot_date desc, material_type_id'
+    _log_access = False
+
+    snapshot_date = fields.Date(
+        string='Snapshot Date',
+        required=True,
+        index=True,
+        help='Balance at the end of this day'
+    )
+    material_type_id = fields.Many2one(
+        'honey.material.type',
+        string='Material Type',
+        required=True
+    )
+    material_subtype = fields.Char(
+        string='Material Subtype'
+    )
+    location_id = fields.Many2one(
+        'stock.location',
+        string='Location',
+        required=True
+    )
+    balance = fields.Float(
+        string='Balance'
+    )
+
+    _sql_constraints = [
+        ('snapshot_uniq', 'unique (snapshot_date, material_type_id, material_subtype, location_id)',
+         'Only one snapshot per material, subtype and location per day!'),
+    ]
+
+    @api.model
+    def _get_balances_as_of(self, as_of_date, material_type_ids=None):
+        """Balances at the end of as_of_date: {(material type id, subtype, location id): balance}
+
+        Starts from the latest snapshot on or before the date and adds the
+        ledger entries posted after it, so the query only scans the ledger
+        since the last snapshot.
+        """
+        as_of_date = fields.Date.to_date(as_of_date)
+        self.env['honey.material.ledger'].flush()
+        params = {
+            'as_of': as_of_date,
+            'end': as_of_date + timedelta(days=1),
+            'types': tuple(material_type_ids or [0]),
+            'all_types': not material_type_ids,
+        }
+        self.env.cr.execute("""
+            WITH snap AS (
+                SELECT DISTINCT ON (material_type_id, material_subtype, location_id)
+                       material_type_id, material_subtype, location_id, snapshot_date, balance
+                  FROM honey_material_snapshot
+                 WHERE snapshot_date <= %(as_of)s
+                   AND (%(all_types)s OR material_type_id IN %(types)s)
+              ORDER BY material_type_id, material_subtype, location_id, snapshot_date DESC
+            ), moves AS (
+                SELECT l.material_type_id, l.material_subtype, l.location_id, SUM(l.quantity) AS quantity
+                  FROM honey_material_ledger l
+             LEFT JOIN snap s
+                    ON s.material_type_id = l.material_type_id
+                   AND s.material_subtype = l.material_subtype
+                   AND s.location_id = l.location_id
+                 WHERE l.date < %(end)s
+                   AND (s.snapshot_date IS NULL OR l.date >= s.snapshot_date + 1)
+                   AND (%(all_types)s OR l.material_type_id IN %(types)s)
+              GROUP BY l.material_type_id, l.material_subtype, l.location_id
+            )
+            SELECT COALESCE(s.material_type_id, m.material_type_id),
+                   COALESCE(s.material_subtype, m.material_subtype),
+                   COALESCE(s.location_id, m.location_id),
+                   COALESCE(s.balance, 0) + COALESCE(m.quantity, 0)
+              FROM snap s
+         FULL JOIN moves m
+                ON m.material_type_id = s.material_type_id
+               AND m.material_subtype = s.material_subtype
+               AND m.location_id = s.location_id
+        """, params)
+        return {
+            (material_type_id, subtype, location_id): balance
+            for material_type_id, subtype, location_id, balance in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _invalidate_from(self, date, material_type_ids):
+        """Drop snapshots made stale by movements dated on or before them"""
+        self.env.cr.execute("""
+            DELETE FROM honey_material_snapshot
+             WHERE snapshot_date >= %s
+               AND material_type_id IN %s
+        """, (fields.Date.to_date(date), tuple(material_type_ids)))
+        self.invalidate_cache()
+
+    @api.model
+    def _cron_take_snapshots(self):
+        """Store yesterday's closing balances for all materials"""
+        snapshot_date = fields.Date.today() - timedelta(days=1)
+        balances = self._get_balances_as_of(snapshot_date)
+        if not balances:
+            return
+        rows = [
+            (snapshot_date, material_type_id, subtype, location_id, balance)
+            for (material_type_id, subtype, location_id), balance in balances.items()
+        ]
+        self.env.cr.execute("""
+            INSERT INTO honey_material_snapshot
+                (snapshot_date, material_type_id, material_subtype, location_id, balance)
+            VALUES %s
+            ON CONFLICT (snapshot_date, material_type_id, material_subtype, location_id)
+            DO UPDATE SET balance = EXCLUDED.balance
+        """ % ', '.join(['%s'] * len(rows)), rows)
+        self.invalidate_cache()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from odoo import models, fields, api, _
+
+
+# Партии, потребность которых ещё не покрыта списанием материалов
+OPEN_BATCH_STATES = ('planned', 'in_progress')
+
+
+class MaterialPlanningRun(models.Model):
+    _name = 'honey.mrp.run'
+    _description = 'Material Requirements Planning Run'
+    _order = 'run_date desc, id desc'
+
+    name = fields.Char(
+        string='Reference',
+        required=True,
+        copy=False,
+        readonly=True,
+        default=lambda self: _('New')
+    )
+    run_date = fields.Datetime(
+        string='Run Date',
+        required=True,
+        readonly=True,
+        default=fields.Datetime.now
+    )
+    horizon_days = fields.Integer(
+        string='Horizon (Days)',
+        required=True,
+        default=365
+    )
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('done', 'Done'),
+    ], string='Status', default='draft', readonly=True)
+
+    line_ids = fields.One2many(
+        'honey.mrp.line',
+        'run_id',
+        string='Planning Lines',
+        readonly=True
+    )
+    batch_count = fields.Integer(
+        string='Planned Batches',
+        readonly=True
+    )
+    shortage_count = fields.Integer(
+        string='Materials Short',
+        readonly=True
+    )
+    duration = fields.Float(
+        string='Duration (Seconds)',
+        digits=(16, 3),
+        readonly=True
+    )
+
+    @api.model
+    def create(self, vals):
+        if vals.get('name', _('New')) == _('New'):
+            vals['name'] = self.env['ir.sequence'].next_by_code('honey.mrp.run') or _('New')
+        return super().create(vals)
+
+    def action_run(self):
+        """Run MRP: explode open batches, net against stock, suggest purchases"""
+        for run in self:
+            started = time.perf_counter()
+            run.line_ids.unlink()
+            lines, batch_count = run._compute_plan()
+            self.env['honey.mrp.line'].create([dict(line, run_id=run.id) for line in lines])
+            run.write({
+                'state': 'done',
+                'run_date': fields.Datetime.now(),
+                'batch_count': batch_count,
+                'shortage_count': sum(1 for line in lines if line['shortage_date']),
+                'duration': time.perf_counter() - started,
+            })
+
+    @api.model
+    def _cron_run_mrp(self):
+        """Nightly MRP run over the default horizon"""
+        self.create({}).action_run()
+
+    def _get_gross_requirements(self):
+        """Open requirement rows: (product, material type, honey type, need date, quantity)"""
+        self.ensure_one()
+        horizon_end = fields.Date.today() + timedelta(days=self.horizon_days)
+        self.env['honey.material.requirement'].flush(['material_id', 'material_type', 'required_quantity', 'used_quantity', 'batch_id'])
+        self.env['honey.production.batch'].flush(['state', 'production_date', 'honey_type'])
+        self.env.cr.execute("""
+            SELECT r.material_id,
+                   r.material_type,
+                   b.honey_type,
+                   b.production_date,
+                   GREATEST(r.required_quantity - COALESCE(r.used_quantity, 0), 0) AS open_quantity,
+                   b.id
+              FROM honey_material_requirement r
+              JOIN honey_production_batch b ON b.id = r.batch_id
+             WHERE b.state IN %s
+               AND b.production_date < %s
+               AND r.required_quantity > COALESCE(r.used_quantity, 0)
+        """, (OPEN_BATCH_STATES, horizon_end))
+        return self.env.cr.fetchall()
+
+    def _get_on_hand(self, product_ids, product_keys):
+        """On-hand quantity per product from stock.quant and honey.material.stock
+
+        honey.material.stock is kept per material type code and subtype, so it
+        is attributed to products through the (material type, honey type) of
+        the requirements that use them; each stock bucket is counted once.
+        """
+        on_hand = dict.fromkeys(product_ids, 0.0)
+        if not product_ids:
+            return on_hand
+
+        self.env['stock.quant'].flush(['product_id', 'location_id', 'quantity', 'reserved_quantity'])
+        self.env.cr.execute("""
+            SELECT q.product_id, SUM(q.quantity - q.reserved_quantity)
+              FROM stock_quant q
+              JOIN stock_location l ON l.id = q.location_id
+             WHERE l.usage = 'internal'
+               AND q.product_id IN %s
+          GROUP BY q.product_id
+        """, (tuple(product_ids),))
+        for product_id, quantity in self.env.cr.fetchall():
+            on_hand[product_id] += quantity or 0.0
+
+        self.env['honey.material.stock'].flush(['material_type_id', 'material_subtype', 'current_stock'])
+        self.env.cr.execute("""
+            SELECT t.code, COALESCE(s.material_subtype, ''), SUM(s.current_stock)
+              FROM honey_material_stock s
+              JOIN honey_material_type t ON t.id = s.material_type_id
+          GROUP BY t.code, COALESCE(s.material_subtype, '')
+        """)
+        material_stock = {}
+        for code, subtype, quantity in self.env.cr.fetchall():
+            # Honey is stocked per honey type, other materials only per material type
+            key = (code, subtype) if code == 'honey' else (code, '')
+            material_stock[key] = material_stock.get(key, 0.0) + (quantity or 0.0)
+
+        attributed = set()
+        for product_id in product_ids:
+            key = product_keys[product_id]
+            if key in material_stock and key not in attributed:
+                on_hand[product_id] += material_stock[key]
+                attributed.add(key)
+        return on_hand
+
+    def _compute_plan(self):
+        """Time-phased netting of all open batches in one vectorized pass"""
+        self.ensure_one()
+        rows = self._get_gross_requirements()
+        if not rows:
+            return [], 0
+
+        today = fields.Date.today()
+        horizon = max(self.horizon_days, 1)
+
+        product_ids = sorted({row[0] for row in rows})
+        product_index = {product_id: index for index, product_id in enumerate(product_ids)}
+        product_keys = {}
+        for product_id, material_type, honey_type, _date, _qty, _batch in rows:
+            product_keys.setdefault(product_id, (material_type, honey_type if material_type == 'honey' else ''))
+
+        # Gross requirements matrix: products x days; overdue needs land on day 0
+        product_idx = np.fromiter((product_index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        need_dates = np.array([row[3] for row in rows], dtype='datetime64[D]')
+        day_idx = np.clip((need_dates - np.datetime64(today, 'D')).astype(np.int64), 0, horizon - 1)
+        quantities = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+
+        gross = np.zeros((len(product_ids), horizon), dtype=np.float64)
+        np.add.at(gross, (product_idx, day_idx), quantities)
+
+        on_hand_map = self._get_on_hand(product_ids, product_keys)
+        on_hand = np.fromiter((on_hand_map[product_id] for product_id in product_ids), dtype=np.float64, count=len(product_ids))
+
+        projected = on_hand[:, None] - np.cumsum(gross, axis=1)
+        short = projected < 0
+        has_shortage = short.any(axis=1)
+        first_shortage = short.argmax(axis=1)
+        first_need = (gross > 0).argmax(axis=1)
+        total_requirement = gross.sum(axis=1)
+        # Cumulative demand only grows, so the final projected balance is the deepest shortage
+        suggested = np.maximum(-projected[:, -1], 0.0)
+
+        lines = []
+        for index, product_id in enumerate(product_ids):
+            material_type, honey_type = product_keys[product_id]
+            lines.append({
+                'material_id': product_id,
+                'material_type': material_type,
+                'honey_type': honey_type or False,
+                'first_need_date': today + timedelta(days=int(first_need[index])),
+                'total_requirement': float(total_requirement[index]),
+                'on_hand': float(on_hand[index]),
+                'projected_balance': float(projected[index, -1]),
+                'shortage_date': today + timedelta(days=int(first_shortage[index])) if has_shortage[index] else False,
+                'suggested_quantity': float(np.ceil(suggested[index] * 1000) / 1000),
+            })
+        return lines, len({row[5] for row in rows})
+
+
+class MaterialPlanningLine(models.Model):
+    _name = 'honey.mrp.line'
+    _description = 'Material Requirements Planning Line'
+    _order = 'shortage_date, first_need_date, id'
+
+    run_id = fields.Many2one(
+        'honey.mrp.run',
+        string='MRP Run',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    material_id = fields.Many2one(
+        'product.product',
+        string='Material',
+        required=True
+    )
+    material_type = fields.Selection([
+        ('honey', 'Honey'),
+        ('tape', 'Packaging Tape'),
+        ('display', 'Display Box'),
+        ('cardboard', 'Cardboard Box'),
+        ('label', 'Label'),
+        ('other', 'Other'),
+    ], string='Material Type')
+    honey_type = fields.Selection([
+        ('acacia', 'Acacia Honey'),
+        ('linden', 'Linden Honey'),
+        ('sunflower', 'Sunflower Honey'),
+        ('buckwheat', 'Buckwheat Honey'),
+        ('wildflower', 'Wildflower Honey'),
+        ('manuka', 'Manuka Honey'),
+    ], string='Honey Type')
+
+    # Netting results
+    first_need_date = fields.Date(
+        string='First Need Date'
+    )
+    total_requirement = fields.Float(
+        string='Gross Requirement'
+    )
+    on_hand = fields.Float(
+        string='On Hand'
+    )
+    projected_balance = fields.Float(
+        string='Projected Balance'
+    )
+    shortage_date = fields.Date(
+        string='Shortage Date',
+        help='First day on which projected stock drops below zero'
+    )
+    suggested_quantity = fields.Float(
+        string='Suggested Purchase Quantity'
+    )
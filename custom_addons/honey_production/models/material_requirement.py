@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 
 
 class MaterialRequirement(models.Model):
@@ -71,46 +71,127 @@ class MaterialRequirement(models.Model):
     @api.model
     def create_requirements_for_batch(self, batch):
         """Создание требований к материалам для партии"""
-        # Стандартные материалы для мёдовых стиков
-        materials = [
-            {
-                'material_type': 'honey',
-                'required_quantity': batch.total_stickers * 0.008,  # 8г на стик
-                'name': 'Honey - ' + dict(batch._fields['honey_type'].selection)[batch.honey_type]
-            },
-            {
-                'material_type': 'tape',
-                'required_quantity': 1,  # 1 рулон на партию
-                'name': 'Packaging Tape Roll'
-            },
-            {
-                'material_type': 'display',
-                'required_quantity': batch.total_stickers / 100,  # 100 стиков в дисплее
-                'name': 'Display Box'
-            },
-            {
-                'material_type': 'cardboard',
-                'required_quantity': 1,  # 1 картонная коробка
-                'name': 'Cardboard Box'
-            },
-        ]
-        
-        for material_data in materials:
-            # Поиск существующего продукта или создание нового
-            product = self.env['product.product'].search([
-                ('name', 'ilike', material_data['name'])
-            ], limit=1)
-            
-            if not product:
-                product = self.env['product.product'].create({
-                    'name': material_data['name'],
-                    'type': 'product',
-                    'categ_id': self.env.ref('product.product_category_all').id,
-                })
-            
-            self.create({
-                'batch_id': batch.id,
-                'material_id': product.id,
-                'material_type': material_data['material_type'],
-                'required_quantity': material_data['required_quantity'],
-            })
+        return self.create_requirements_for_batches(batch)
+
+    @api.model
+    def create_requirements_for_batches(self, batches):
+        """Создание требований к материалам для набора партий одним create()"""
+        honey_types = dict(self.env['honey.production.batch']._fields['honey_type'].selection)
+        lines = []
+        for batch in batches:
+            # Стандартные материалы для мёдовых стиков
+            lines += [
+                (batch, 'honey', batch.honey_type, batch.total_stickers * 0.008,  # 8г на стик
+                 'Honey - ' + honey_types.get(batch.honey_type, '')),
+                (batch, 'tape', False, 1, 'Packaging Tape Roll'),  # 1 рулон на партию
+                (batch, 'display', False, batch.total_stickers / 100, 'Display Box'),  # 100 стиков в дисплее
+                (batch, 'cardboard', False, 1, 'Cardboard Box'),  # 1 картонная коробка
+            ]
+
+        products = self.env['honey.material.product.map']._resolve_products({
+            (material_type, honey_type): name
+            for _batch, material_type, honey_type, _quantity, name in lines
+        })
+        return self.create([{
+            'batch_id': batch.id,
+            'material_id': products[(material_type, honey_type)],
+            'material_type': material_type,
+            'required_quantity': quantity,
+        } for batch, material_type, honey_type, quantity, _name in lines])
+
+
+class MaterialProductMap(models.Model):
+    _name = 'honey.material.product.map'
+    _description = 'Material Type to Product Mapping'
+    _order = 'material_type, honey_type'
+
+    material_type = fields.Selection([
+        ('honey', 'Honey'),
+        ('tape', 'Packaging Tape'),
+        ('display', 'Display Box'),
+        ('cardboard', 'Cardboard Box'),
+        ('label', 'Label'),
+        ('other', 'Other'),
+    ], string='Material Type', required=True)
+    honey_type = fields.Selection([
+        ('acacia', 'Acacia Honey'),
+        ('linden', 'Linden Honey'),
+        ('sunflower', 'Sunflower Honey'),
+        ('buckwheat', 'Buckwheat Honey'),
+        ('wildflower', 'Wildflower Honey'),
+        ('manuka', 'Manuka Honey'),
+    ], string='Honey Type', help='Только для мёда: продукт для конкретного сорта')
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade',
+        domain=[('type', '=', 'product')]
+    )
+
+    def init(self):
+        # Уникальность пары (тип материала, сорт), сорт может быть пустым
+        tools.create_unique_index(
+            self.env.cr, 'honey_material_product_map_key_uniq', self._table,
+            ['material_type', "COALESCE(honey_type, '')"])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_product_map(self):
+        """Кэш реестра: {(тип материала, сорт мёда или False): id продукта}"""
+        return {
+            (row['material_type'], row['honey_type'] or False): row['product_id']
+            for row in self.sudo().search_read([], ['material_type', 'honey_type', 'product_id'], load=None)
+        }
+
+    @api.model
+    def _resolve_products(self, names):
+        """Продукты для ключей (тип материала, сорт): {ключ: id продукта}
+
+        names - {ключ: название продукта}. Ключи без сопоставления получают
+        продукт по точному названию (или новый продукт) и сразу заносятся
+        в таблицу сопоставления, так что поиск выполняется один раз на ключ.
+        """
+        product_map = self._get_product_map()
+        missing = {key: name for key, name in names.items() if key not in product_map}
+        if not missing:
+            return {key: product_map[key] for key in names}
+
+        Product = self.env['product.product']
+        existing = {
+            product.name: product.id
+            for product in Product.search([('name', 'in', list(set(missing.values())))])
+        }
+        to_create = sorted(set(missing.values()) - set(existing))
+        if to_create:
+            category_id = self.env.ref('product.product_category_all').id
+            for product in Product.create([{
+                'name': name,
+                'type': 'product',
+                'categ_id': category_id,
+            } for name in to_create]):
+                existing[product.name] = product.id
+
+        self.sudo().create([{
+            'material_type': material_type,
+            'honey_type': honey_type,
+            'product_id': existing[name],
+        } for (material_type, honey_type), name in missing.items()])
+        product_map = self._get_product_map()
+        return {key: product_map[key] for key in names}
@@ -3,6 +3,8 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .time_tracking import create_overlap_constraint
+
 
 class ProductionBatch(models.Model):
     _name = 'honey.production.batch'
@@ -140,6 +142,11 @@ class ProductionBatch(models.Model):
         ('passed', 'Passed'),
         ('failed', 'Failed'),
     ], string='Quality Status', default='pending')
+    spc_alert = fields.Boolean(
+        string='SPC Alert',
+        readonly=True,
+        help='Контроль качества партии показал дрейф параметров (правила Western Electric)'
+    )
     
     # Материалы
     material_requirements_ids = fields.One2many(
@@ -261,6 +268,40 @@ class EmployeeTime(models.Model):
             else:
                 record.work_duration = 0.0
 
+    def init(self):
+        # Открытые входы сотрудников, используется в get_active_employees()
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_employee_time_open_idx
+                ON honey_employee_time (employee_id) WHERE state = 'logged_in'
+        """)
+        create_overlap_constraint(
+            self.env.cr, self._table, 'honey_employee_time_no_overlap',
+            'login_time', 'logout_time', 'employee_id IS NOT NULL')
+
+    @api.constrains('login_time', 'logout_time')
+    def _check_time_range(self):
+        for record in self:
+            if record.login_time and record.logout_time and record.login_time > record.logout_time:
+                raise ValidationError(_('Login time must be before logout time.'))
+
+    @api.constrains('employee_id', 'login_time', 'logout_time')
+    def _check_overlapping_logins(self):
+        """Сотрудник не может быть одновременно в нескольких интервалах"""
+        self.flush(['employee_id', 'login_time', 'logout_time'])
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM honey_employee_time a
+              JOIN honey_employee_time b
+                ON b.employee_id = a.employee_id
+               AND b.id != a.id
+               AND tsrange(b.login_time, COALESCE(b.logout_time, 'infinity'), '[)')
+                && tsrange(a.login_time, COALESCE(a.logout_time, 'infinity'), '[)')
+             WHERE a.id IN %s
+             LIMIT 1
+        """, (tuple(self.ids),))
+        if self.env.cr.fetchone():
+            raise ValidationError(_('An employee cannot have overlapping login intervals.'))
+
     def action_logout(self):
         """Выход из системы"""
         for record in self:
@@ -274,5 +315,9 @@ class EmployeeTime(models.Model):
         for record in self:
             if record.state != 'logged_out':
                 raise ValidationError(_('Employee must be logged out to login.'))
-            record.login_time = fields.Datetime.now()
-            record.state = 'logged_in'
\ No newline at end of file
+            # Новый интервал: предыдущий выход сбрасывается
+            record.write({
+                'login_time': fields.Datetime.now(),
+                'logout_time': False,
+                'state': 'logged_in',
+            })
\ No newline at end of file
@@ -86,28 +86,58 @@ class QualityControl(models.Model):
         string='Recommendations'
     )
     
+    # Статистический контроль процесса
+    spc_alert = fields.Boolean(
+        string='SPC Alert',
+        readonly=True,
+        help='Измерения нарушают правила Western Electric для сорта мёда'
+    )
+    spc_violations = fields.Char(
+        string='SPC Violations',
+        readonly=True
+    )
+
     # Фотографии
     photo_ids = fields.One2many(
-        'ir.attachment',
+        'honey.evidence.photo',
         'res_id',
         string='Photos',
-        domain=[('res_model', '=', 'honey.quality.control')]
+        domain=[('res_model', '=', 'honey.quality.control')],
+        context={'default_res_model': 'honey.quality.control'}
     )
 
-    @api.model
-    def create(self, vals):
-        """Создание контроля качества с обновлением статуса партии"""
-        control = super().create(vals)
-        control._update_batch_quality_status()
-        return control
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Создание контроля качества с обновлением статуса партии
+
+        С контекстом skip_batch_quality_update статус партий не обновляется:
+        импорт обновляет его один раз после загрузки всех контролей.
+        """
+        controls = super().create(vals_list)
+        if not self.env.context.get('skip_batch_quality_update'):
+            controls._update_batch_quality_status()
+        controls._flag_spc_alerts()
+        return controls
 
     def _update_batch_quality_status(self):
-        """Обновление статуса качества партии"""
-        for control in self:
-            if control.batch_id:
-                if control.result == 'passed':
-                    control.batch_id.quality_status = 'passed'
-                elif control.result == 'failed':
-                    control.batch_id.quality_status = 'failed'
-                else:
-                    control.batch_id.quality_status = 'pending'
\ No newline at end of file
+        """Обновление статуса качества партии по последнему контролю"""
+        latest = {}
+        for control in self.filtered('batch_id').sorted(lambda c: (c.control_date, c.id)):
+            latest[control.batch_id] = control.result
+        statuses = {}
+        for batch, result in latest.items():
+            status = result if result in ('passed', 'failed') else 'pending'
+            statuses.setdefault(status, self.env['honey.production.batch'])
+            statuses[status] |= batch
+        for status, batches in statuses.items():
+            batches.write({'quality_status': status})
+
+    def _flag_spc_alerts(self):
+        """Отметка контролей и партий, измерения которых выходят из-под контроля"""
+        alerts = self.env['honey.quality.spc.chart']._check_new_controls(self)
+        for control in self.filtered(lambda c: c.id in alerts):
+            control.write({
+                'spc_alert': True,
+                'spc_violations': ', '.join(alerts[control.id]),
+            })
+        self.filtered(lambda c: c.id in alerts).mapped('batch_id').write({'spc_alert': True})
\ No newline at end of file
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from odoo import models, fields, api, _
+
+
+# Измеряемые параметры контроля качества (колонки honey.quality.control)
+SPC_PARAMETERS = [
+    ('temperature', 'Temperature (°C)'),
+    ('humidity', 'Humidity (%)'),
+    ('ph_level', 'pH Level'),
+    ('viscosity', 'Viscosity'),
+    ('bacteria_count', 'Bacteria Count'),
+    ('yeast_count', 'Yeast Count'),
+    ('mold_count', 'Mold Count'),
+]
+
+# Минимум точек для расчёта контрольных границ
+SPC_MIN_SAMPLES = 20
+# Окно последних измерений, проверяемое при поступлении новых контролей
+SPC_RULE_WINDOW = 8
+# d2 для скользящего размаха по двум точкам (карта индивидуальных значений)
+D2_MOVING_RANGE = 1.128
+
+WESTERN_ELECTRIC_RULES = ('1', '2', '3', '4')
+
+
+def control_limits(values):
+    """Центральная линия и сигма карты индивидуальных значений (I-MR)"""
+    center = float(values.mean())
+    moving_range = np.abs(np.diff(values))
+    sigma = float(moving_range.mean() / D2_MOVING_RANGE) if moving_range.size else 0.0
+    return center, sigma
+
+
+def process_capability(center, sigma, lsl=None, usl=None):
+    """Индексы воспроизводимости Cp и Cpk; None, если не хватает границ допуска"""
+    if not sigma:
+        return None, None
+    cp = (usl - lsl) / (6 * sigma) if lsl is not None and usl is not None else None
+    sides = []
+    if usl is not None:
+        sides.append((usl - center) / (3 * sigma))
+    if lsl is not None:
+        sides.append((center - lsl) / (3 * sigma))
+    return cp, (min(sides) if sides else None)
+
+
+def _window_count(mask, width):
+    """Количество True в скользящем окне, заканчивающемся в каждой точке"""
+    cumulative = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    counts = np.zeros(mask.size, dtype=np.int64)
+    if mask.size >= width:
+        counts[width - 1:] = cumulative[width:] - cumulative[:-width]
+    return counts
+
+
+def western_electric_violations(values, center, sigma):
+    """Нарушения правил Western Electric: матрица 4 x N (правило x точка)
+
+    1 - точка за 3 сигмами; 2 - две из трёх подряд за 2 сигмами с одной
+    стороны; 3 - четыре из пяти за 1 сигмой с одной стороны; 4 - восемь
+    подряд по одну сторону от центральной линии.
+    """
+    if not sigma:
+        return np.zeros((len(WESTERN_ELECTRIC_RULES), values.size), dtype=bool)
+    z = (values - center) / sigma
+    return np.vstack([
+        np.abs(z) > 3,
+        (_window_count(z > 2, 3) >= 2) | (_window_count(z < -2, 3) >= 2),
+        (_window_count(z > 1, 5) >= 4) | (_window_count(z < -1, 5) >= 4),
+        (_window_count(z > 0, 8) == 8) | (_window_count(z < 0, 8) == 8),
+    ])
+
+
+class QualitySpcChart(models.Model):
+    _name = 'honey.quality.spc.chart'
+    _description = 'Quality SPC Control Chart'
+    _order = 'honey_type, parameter'
+
+    honey_type = fields.Selection([
+        ('acacia', 'Acacia Honey'),
+        ('linden', 'Linden Honey'),
+        ('sunflower', 'Sunflower Honey'),
+        ('buckwheat', 'Buckwheat Honey'),
+        ('wildflower', 'Wildflower Honey'),
+        ('manuka', 'Manuka Honey'),
+    ], string='Honey Type', required=True)
+    parameter = fields.Selection(
+        SPC_PARAMETERS,
+        string='Parameter',
+        required=True
+    )
+
+    # Границы допуска задаются технологом
+    lower_spec_limit = fields.Float(
+        string='Lower Spec Limit'
+    )
+    upper_spec_limit = fields.Float(
+        string='Upper Spec Limit'
+    )
+    use_lower_spec = fields.Boolean(
+        string='Use Lower Spec Limit'
+    )
+    use_upper_spec = fields.Boolean(
+        string='Use Upper Spec Limit'
+    )
+
+    # Контрольные границы, пересчитываются ночным заданием
+    center_line = fields.Float(
+        string='Center Line',
+        readonly=True
+    )
+    sigma = fields.Float(
+        string='Sigma',
+        readonly=True
+    )
+    lower_control_limit = fields.Float(
+        string='LCL',
+        readonly=True
+    )
+    upper_control_limit = fields.Float(
+        string='UCL',
+        readonly=True
+    )
+    sample_count = fields.Integer(
+        string='Samples',
+        readonly=True
+    )
+    cp = fields.Float(
+        string='Cp',
+        digits=(16, 3),
+        readonly=True
+    )
+    cpk = fields.Float(
+        string='Cpk',
+        digits=(16, 3),
+        readonly=True
+    )
+    violation_count = fields.Integer(
+        string='Rule Violations',
+        readonly=True,
+        help='Точки с нарушением правил Western Electric за всю историю'
+    )
+    last_computed = fields.Datetime(
+        string='Last Computed',
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ('chart_uniq', 'unique (honey_type, parameter)', 'Only one SPC chart per honey type and parameter!'),
+    ]
+
+    def name_get(self):
+        honey_types = dict(self._fields['honey_type'].selection)
+        parameters = dict(SPC_PARAMETERS)
+        return [
+            (chart.id, '%s / %s' % (honey_types.get(chart.honey_type), parameters.get(chart.parameter)))
+            for chart in self
+        ]
+
+    @api.model
+    def _load_measurements(self, honey_types=None, last=None):
+        """История измерений: {сорт: (id контролей, матрица контроли x параметры)}
+
+        Отсутствующие значения - NaN. При last загружаются только последние
+        last контролей каждого сорта (оконная функция по сорту).
+        """
+        self.env['honey.quality.control'].flush([name for name, _label in SPC_PARAMETERS] + ['batch_id', 'control_date'])
+        self.env['honey.production.batch'].flush(['honey_type'])
+        columns = ', '.join('q.%s' % name for name, _label in SPC_PARAMETERS)
+        self.env.cr.execute("""
+            SELECT honey_type, id, %(columns)s
+              FROM (
+                    SELECT b.honey_type, q.id, q.control_date, %(columns)s,
+                           row_number() OVER (PARTITION BY b.honey_type
+                                              ORDER BY q.control_date DESC, q.id DESC) AS position
+                      FROM honey_quality_control q
+                      JOIN honey_production_batch b ON b.id = q.batch_id
+                     WHERE b.honey_type IS NOT NULL
+                       AND (%%(all_types)s OR b.honey_type IN %%(types)s)
+              ) q
+             WHERE %%(all_rows)s OR position <= %%(last)s
+          ORDER BY honey_type, control_date, id
+        """ % {'columns': columns}, {
+            'all_types': not honey_types,
+            'types': tuple(honey_types or ['']),
+            'all_rows': not last,
+            'last': last or 0,
+        })
+        rows = self.env.cr.fetchall()
+
+        result = {}
+        start = 0
+        for end in range(1, len(rows) + 1):
+            if end == len(rows) or rows[end][0] != rows[start][0]:
+                block = rows[start:end]
+                matrix = np.array([row[2:] for row in block], dtype=np.float64)
+                result[rows[start][0]] = ([row[1] for row in block], matrix)
+                start = end
+        return result
+
+    @api.model
+    def _cron_recompute_charts(self):
+        """Ночной пересчёт контрольных границ, Cp/Cpk и нарушений правил"""
+        charts = {(chart.honey_type, chart.parameter): chart for chart in self.search([])}
+        now = fields.Datetime.now()
+        to_create = []
+        for honey_type, (_control_ids, matrix) in self._load_measurements().items():
+            for column, (parameter, _label) in enumerate(SPC_PARAMETERS):
+                values = matrix[:, column]
+                values = values[~np.isnan(values)]
+                if values.size < SPC_MIN_SAMPLES:
+                    continue
+                chart = charts.get((honey_type, parameter))
+                center, sigma = control_limits(values)
+                cp, cpk = process_capability(
+                    center, sigma,
+                    chart.lower_spec_limit if chart and chart.use_lower_spec else None,
+                    chart.upper_spec_limit if chart and chart.use_upper_spec else None,
+                )
+                vals = {
+                    'center_line': center,
+                    'sigma': sigma,
+                    'lower_control_limit': center - 3 * sigma,
+                    'upper_control_limit': center + 3 * sigma,
+                    'sample_count': int(values.size),
+                    'cp': cp or 0.0,
+                    'cpk': cpk or 0.0,
+                    'violation_count': int(western_electric_violations(values, center, sigma).any(axis=0).sum()),
+                    'last_computed': now,
+                }
+                if chart:
+                    chart.write(vals)
+                else:
+                    to_create.append(dict(vals, honey_type=honey_type, parameter=parameter))
+        if to_create:
+            self.create(to_create)
+
+    @api.model
+    def _check_new_controls(self, controls):
+        """Проверка новых контролей по правилам Western Electric
+
+        Для каждого сорта загружаются последние измерения вместе с новыми
+        контролями, и правила проверяются одним векторным проходом по
+        каждому параметру с уже рассчитанными границами карты.
+        Возвращает {id контроля: список нарушений вида 'pH Level: 1'}.
+        """
+        honey_types = list(set(controls.mapped('batch_id.honey_type')) - {False})
+        charts = self.search([('honey_type', 'in', honey_types), ('sigma', '>', 0)])
+        if not charts:
+            return {}
+        control_ids = set(controls.ids)
+        charts_by_key = {(chart.honey_type, chart.parameter): chart for chart in charts}
+        labels = dict(SPC_PARAMETERS)
+        history = self._load_measurements(honey_types, last=SPC_RULE_WINDOW + len(controls))
+
+        alerts = {}
+        for honey_type, (ids, matrix) in history.items():
+            is_new = np.fromiter((control_id in control_ids for control_id in ids), dtype=bool, count=len(ids))
+            for column, (parameter, _label) in enumerate(SPC_PARAMETERS):
+                chart = charts_by_key.get((honey_type, parameter))
+                if not chart:
+                    continue
+                present = ~np.isnan(matrix[:, column])
+                values = matrix[present, column]
+                violations = western_electric_violations(values, chart.center_line, chart.sigma)
+                flagged = violations & is_new[present]
+                for rule_index, point_index in zip(*np.nonzero(flagged)):
+                    control_id = np.asarray(ids)[present][point_index]
+                    alerts.setdefault(int(control_id), []).append(
+                        '%s: %s' % (labels[parameter], WESTERN_ELECTRIC_RULES[rule_index]))
+        return alerts
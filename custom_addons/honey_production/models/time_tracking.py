@@ -1,8 +1,49 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import logging
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
+_logger = logging.getLogger(__name__)
+
+
+# Last time the shift KPI cron picked up time tracking changes
+SHIFT_KPI_WATERMARK_PARAM = 'honey_production.shift_kpi_watermark'
+# write_date is the transaction start time: changes are re-scanned this far
+# behind the watermark so transactions committing late are not missed
+SHIFT_KPI_WATERMARK_LAG = timedelta(hours=1)
+
+# Timer states that occupy the employee's time
+TIMER_STATES = ('in_progress', 'completed')
+
+# Time tracking fields that feed the shift KPIs
+SHIFT_KPI_FIELDS = {'employee_id', 'batch_id', 'start_time', 'state', 'quantity_produced'}
+
+
+def create_overlap_constraint(cr, table, name, start_column, end_column, where):
+    """Exclusion constraint forbidding overlapping intervals per employee
+
+    Needs the btree_gist extension; when it cannot be installed or existing
+    rows already overlap, the Python constraints remain the only check.
+    """
+    if tools.constraint_definition(cr, table, name):
+        return
+    try:
+        with cr.savepoint():
+            cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cr.execute("""
+                ALTER TABLE {table} ADD CONSTRAINT {name} EXCLUDE USING gist (
+                    employee_id WITH =,
+                    tsrange({start}, COALESCE({end}, 'infinity'), '[)') WITH &&
+                ) WHERE ({where})
+            """.format(table=table, name=name, start=start_column, end=end_column, where=where))
+    except psycopg2.Error as e:
+        _logger.warning("Could not create exclusion constraint %s on %s: %s", name, table, e)
+
 
 class TimeTracking(models.Model):
     _name = 'honey.time.tracking'
@@ -104,27 +145,119 @@ class TimeTracking(models.Model):
             vals['name'] = self.env['ir.sequence'].next_by_code('honey.time.tracking') or _('New')
         return super().create(vals)
 
+    def write(self, vals):
+        if SHIFT_KPI_FIELDS & set(vals):
+            self._flag_shift_kpis()
+        return super().write(vals)
+
+    def unlink(self):
+        self._flag_shift_kpis()
+        return super().unlink()
+
+    def _flag_shift_kpis(self):
+        """Flag the shifts these completed records currently count towards
+
+        Called before a change or deletion: the join in _get_touched_shifts
+        only sees the new values, so the shift a record leaves is refreshed
+        through the flag.
+        """
+        if not self.ids:
+            return
+        self.flush(['employee_id', 'start_time', 'state'])
+        self.env.cr.execute("""
+            UPDATE honey_shift_planning s
+               SET kpi_stale = TRUE
+              FROM honey_time_tracking t
+              JOIN honey_shift_employee_rel r ON r.employee_id = t.employee_id
+             WHERE t.id IN %s
+               AND t.state = 'completed'
+               AND s.id = r.shift_id
+               AND t.start_time >= s.shift_date
+               AND t.start_time < s.shift_date + 1
+               AND NOT COALESCE(s.kpi_stale, FALSE)
+        """, (tuple(self.ids),))
+        self.env['honey.shift.planning'].invalidate_cache(['kpi_stale'])
+
     @api.constrains('start_time', 'end_time')
     def _check_time_range(self):
         for record in self:
             if record.start_time and record.end_time and record.start_time >= record.end_time:
                 raise ValidationError(_('Start time must be before end time.'))
 
+    @api.constrains('employee_id', 'start_time', 'end_time', 'state')
+    def _check_overlapping_timers(self):
+        self.flush(['employee_id', 'start_time', 'end_time', 'state'])
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM honey_time_tracking a
+              JOIN honey_time_tracking b
+                ON b.employee_id = a.employee_id
+               AND b.id != a.id
+               AND b.state IN %(states)s
+               AND tsrange(b.start_time, COALESCE(b.end_time, 'infinity'), '[)')
+                && tsrange(a.start_time, COALESCE(a.end_time, 'infinity'), '[)')
+             WHERE a.id IN %(ids)s
+               AND a.state IN %(states)s
+             LIMIT 1
+        """, {'ids': tuple(self.ids), 'states': TIMER_STATES})
+        if self.env.cr.fetchone():
+            raise ValidationError(_('An employee cannot have overlapping time tracking records.'))
+
+    def init(self):
+        # Open timers per employee, used by get_active_employees()
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_time_tracking_open_idx
+                ON honey_time_tracking (employee_id) WHERE state = 'in_progress'
+        """)
+        create_overlap_constraint(
+            self.env.cr, self._table, 'honey_time_tracking_no_overlap',
+            'start_time', 'end_time', "state IN ('in_progress', 'completed')")
+
+    @api.model
+    def get_active_employees(self):
+        """Employees currently on the production floor
+
+        An employee is on the floor with an open timer or an open batch
+        login; both lookups hit the partial indexes on open records.
+        """
+        self.env['honey.time.tracking'].flush(['employee_id', 'batch_id', 'start_time', 'state'])
+        self.env['honey.employee.time'].flush(['employee_id', 'batch_id', 'login_time', 'state'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (employee_id) employee_id, batch_id, since
+              FROM (
+                    SELECT employee_id, batch_id, start_time AS since
+                      FROM honey_time_tracking
+                     WHERE state = 'in_progress'
+                 UNION ALL
+                    SELECT employee_id, batch_id, login_time AS since
+                      FROM honey_employee_time
+                     WHERE state = 'logged_in'
+              ) AS open_records
+          ORDER BY employee_id, since
+        """)
+        rows = self.env.cr.fetchall()
+        names = dict(self.env['hr.employee'].browse([row[0] for row in rows]).name_get())
+        return [{
+            'employee_id': employee_id,
+            'employee_name': names.get(employee_id),
+            'batch_id': batch_id,
+            'since': since,
+        } for employee_id, batch_id, since in rows]
+
     def action_start(self):
         """Start time tracking"""
         for record in self:
             if record.state != 'draft':
                 raise ValidationError(_('Only draft records can be started.'))
-            record.state = 'in_progress'
-            record.start_time = fields.Datetime.now()
+            # One write, so the overlap constraint never sees an open timer with its old start time
+            record.write({'state': 'in_progress', 'start_time': fields.Datetime.now()})
 
     def action_stop(self):
         """Stop time tracking"""
         for record in self:
             if record.state != 'in_progress':
                 raise ValidationError(_('Only in-progress records can be stopped.'))
-            record.state = 'completed'
-            record.end_time = fields.Datetime.now()
+            record.write({'state': 'completed', 'end_time': fields.Datetime.now()})
 
     def action_approve(self):
         """Approve time tracking"""
@@ -225,19 +358,95 @@ class ShiftPlanning(models.Model):
         string='Notes'
     )
 
+    # Set when time tracking leaves the shift; cleared by the KPI cron
+    kpi_stale = fields.Boolean(
+        string='KPIs Stale',
+        readonly=True,
+        copy=False
+    )
+
     @api.depends('shift_date', 'team_member_ids')
     def _compute_actual_results(self):
+        results = self._get_actual_results()
         for record in self:
-            # Calculate actual results from time tracking records
-            time_records = self.env['honey.time.tracking'].search([
-                ('employee_id', 'in', record.team_member_ids.ids),
-                ('start_time', '>=', fields.Datetime.combine(record.shift_date, fields.time(0, 0, 0))),
-                ('start_time', '<=', fields.Datetime.combine(record.shift_date, fields.time(23, 59, 59))),
-                ('state', '=', 'completed')
-            ])
-            
-            record.actual_batches = len(time_records.mapped('batch_id'))
-            record.actual_quantity = sum(time_records.mapped('quantity_produced'))
+            record.actual_batches, record.actual_quantity = results.get(record._origin.id, (0, 0))
+
+    def _get_actual_results(self):
+        """Actual batches and quantity per shift from completed time tracking
+
+        One grouped query over the shift team relation and time tracking
+        for the whole recordset: {shift id: (batches, quantity)}.
+        """
+        shift_ids = tuple(record._origin.id for record in self if record._origin.id)
+        if not shift_ids:
+            return {}
+        self.env['honey.time.tracking'].flush(['employee_id', 'batch_id', 'start_time', 'state', 'quantity_produced'])
+        self.flush(['shift_date', 'team_member_ids'])
+        self.env.cr.execute("""
+            SELECT s.id, COUNT(DISTINCT t.batch_id), COALESCE(SUM(t.quantity_produced), 0)
+              FROM honey_shift_planning s
+              JOIN honey_shift_employee_rel r ON r.shift_id = s.id
+              JOIN honey_time_tracking t
+                ON t.employee_id = r.employee_id
+               AND t.start_time >= s.shift_date
+               AND t.start_time < s.shift_date + 1
+               AND t.state = 'completed'
+             WHERE s.id IN %s
+          GROUP BY s.id
+        """, (shift_ids,))
+        return {shift_id: (batches, quantity) for shift_id, batches, quantity in self.env.cr.fetchall()}
+
+    def _refresh_kpis(self):
+        """Recompute stored actual results and efficiency for these shifts"""
+        for fname in ('actual_batches', 'actual_quantity', 'efficiency'):
+            self.env.add_to_compute(self._fields[fname], self)
+        self.flush(['actual_batches', 'actual_quantity', 'efficiency'])
+        self.filtered('kpi_stale').write({'kpi_stale': False})
+
+    @api.model
+    def _get_touched_shifts(self, since):
+        """Shifts to refresh and the latest time tracking write_date seen
+
+        A shift is touched when its completed time tracking changed since
+        the given datetime or when it was flagged stale.
+        """
+        self.env['honey.time.tracking'].flush(['employee_id', 'start_time'])
+        self.flush(['kpi_stale'])
+        if not since:
+            self.env.cr.execute("SELECT MAX(write_date) FROM honey_time_tracking")
+            return self.search([]), self.env.cr.fetchone()[0]
+        self.env.cr.execute("SELECT MAX(write_date) FROM honey_time_tracking WHERE write_date >= %s", (since,))
+        last_write = self.env.cr.fetchone()[0]
+        self.env.cr.execute("""
+            SELECT s.id
+              FROM honey_time_tracking t
+              JOIN honey_shift_employee_rel r ON r.employee_id = t.employee_id
+              JOIN honey_shift_planning s
+                ON s.id = r.shift_id
+               AND t.start_time >= s.shift_date
+               AND t.start_time < s.shift_date + 1
+             WHERE t.write_date >= %s
+             UNION
+            SELECT id FROM honey_shift_planning WHERE kpi_stale
+        """, (since,))
+        return self.browse([row[0] for row in self.env.cr.fetchall()]), last_write
+
+    @api.model
+    def _cron_refresh_shift_kpis(self):
+        """Refresh KPIs of shifts touched since the previous run
+
+        The watermark is the newest write_date processed. Because
+        write_date is set when a transaction starts, not when it commits,
+        each run re-scans SHIFT_KPI_WATERMARK_LAG before the watermark;
+        refreshing a shift twice is harmless.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        watermark = params.get_param(SHIFT_KPI_WATERMARK_PARAM)
+        since = fields.Datetime.to_datetime(watermark) - SHIFT_KPI_WATERMARK_LAG if watermark else None
+        shifts, last_write = self._get_touched_shifts(since)
+        shifts._refresh_kpis()
+        if last_write and (not watermark or last_write > fields.Datetime.to_datetime(watermark)):
+            params.set_param(SHIFT_KPI_WATERMARK_PARAM, fields.Datetime.to_string(last_write))
 
     @api.depends('target_quantity', 'actual_quantity')
     def _compute_efficiency(self):
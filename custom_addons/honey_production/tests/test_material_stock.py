@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from psycopg2 import OperationalError
+
+from odoo import api, SUPERUSER_ID
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+THREADS = 4
+MOVEMENTS_PER_THREAD = 10
+OPENING_QUANTITY = 100.0
+MAX_RETRIES = 20
+
+
+@tagged('post_install', '-at_install')
+class TestMaterialStockConcurrency(TransactionCase):
+    """Postings from parallel transactions must not lose stock increments
+
+    Every posting runs in its own cursor and commits, the way concurrent
+    requests do, so the fixtures are committed as well and removed again
+    in the cleanup.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.location_id = env.ref('stock.warehouse0').lot_stock_id.id
+            self.material_type_id = env['honey.material.type'].create({
+                'name': 'Concurrency Test Film',
+                'code': 'TEST-CONCURRENCY',
+                'category': 'packaging',
+                'unit_of_measure': 'm',
+            }).id
+            env['honey.material.movement'].post_movements([{
+                'material_type_id': self.material_type_id,
+                'movement_type': 'in',
+                'quantity': OPENING_QUANTITY,
+                'to_location_id': self.location_id,
+            }])
+        self.addCleanup(self._delete_committed_data)
+
+    def _delete_committed_data(self):
+        with self.registry.cursor() as cr:
+            params = (self.material_type_id,)
+            cr.execute("DELETE FROM honey_material_ledger WHERE material_type_id = %s", params)
+            cr.execute("DELETE FROM honey_material_snapshot WHERE material_type_id = %s", params)
+            cr.execute("DELETE FROM honey_material_movement WHERE material_type_id = %s", params)
+            cr.execute("DELETE FROM honey_material_stock WHERE material_type_id = %s", params)
+            cr.execute("DELETE FROM honey_material_type WHERE id = %s", params)
+
+    def _post_in_new_cursor(self, vals_list, barrier, errors):
+        """Post movements in a separate transaction, retrying serialization failures like RPC calls do"""
+        barrier.wait()
+        for _attempt in range(MAX_RETRIES):
+            try:
+                with self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env['honey.material.movement'].post_movements(vals_list)
+                return
+            except OperationalError as e:
+                if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                    errors.append(e)
+                    return
+            except Exception as e:
+                errors.append(e)
+                return
+        errors.append(AssertionError('Posting still conflicted after %s attempts' % MAX_RETRIES))
+
+    def test_concurrent_postings_keep_exact_balance(self):
+        expected = OPENING_QUANTITY
+        workloads = []
+        for thread_index in range(THREADS):
+            vals_list = []
+            for index in range(MOVEMENTS_PER_THREAD):
+                incoming = (thread_index + index) % 2 == 0
+                quantity = float(thread_index + index + 1)
+                expected += quantity if incoming else -quantity
+                vals_list.append({
+                    'material_type_id': self.material_type_id,
+                    'movement_type': 'in' if incoming else 'out',
+                    'quantity': quantity,
+                    'to_location_id': self.location_id if incoming else False,
+                    'from_location_id': False if incoming else self.location_id,
+                })
+            workloads.append(vals_list)
+
+        barrier = threading.Barrier(THREADS)
+        errors = []
+        threads = [
+            threading.Thread(target=self._post_in_new_cursor, args=(vals_list, barrier, errors))
+            for vals_list in workloads
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(errors, 'Concurrent postings failed: %s' % errors)
+
+        with self.registry.cursor() as cr:
+            cr.execute("""
+                SELECT current_stock FROM honey_material_stock
+                 WHERE material_type_id = %s AND location_id = %s
+            """, (self.material_type_id, self.location_id))
+            self.assertEqual(cr.fetchall(), [(expected,)], 'Exactly one stock row with every posting applied')
+
+            cr.execute("""
+                SELECT COUNT(*), SUM(quantity),
+                       (ARRAY_AGG(balance_after ORDER BY id DESC))[1]
+                  FROM honey_material_ledger
+                 WHERE material_type_id = %s AND location_id = %s
+            """, (self.material_type_id, self.location_id))
+            count, total, last_balance = cr.fetchone()
+            self.assertEqual(count, THREADS * MOVEMENTS_PER_THREAD + 1)
+            self.assertAlmostEqual(total, expected)
+            self.assertAlmostEqual(last_balance, expected)
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import batch_search_wizard
+from . import qc_import_wizard
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import json
+import time
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from ..models.quality_spc import SPC_PARAMETERS
+
+
+# Допустимые значения результата в выгрузке прибора
+QC_IMPORT_RESULTS = ('passed', 'failed', 'conditional')
+
+
+def chunked(iterable, size):
+    """Разбиение потока на списки по size элементов"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class QcImportWizard(models.TransientModel):
+    _name = 'honey.qc.import.wizard'
+    _description = 'Import Quality Control Readings'
+
+    data_file = fields.Binary(
+        string='File',
+        required=True,
+        help='Выгрузка прибора в формате CSV или JSON Lines'
+    )
+    filename = fields.Char(
+        string='File Name'
+    )
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ], string='Format', required=True, default='csv')
+    chunk_size = fields.Integer(
+        string='Chunk Size',
+        default=1000,
+        help='Количество контролей, создаваемых одним вызовом create()'
+    )
+
+    # Результаты импорта
+    imported_count = fields.Integer(
+        string='Imported',
+        readonly=True
+    )
+    error_count = fields.Integer(
+        string='Errors',
+        readonly=True
+    )
+    rows_per_second = fields.Float(
+        string='Rows per Second',
+        digits=(16, 1),
+        readonly=True
+    )
+    error_log = fields.Text(
+        string='Error Log',
+        readonly=True
+    )
+
+    @api.onchange('filename')
+    def _onchange_filename(self):
+        if self.filename and self.filename.lower().endswith(('.jsonl', '.json', '.ndjson')):
+            self.file_format = 'jsonl'
+        elif self.filename:
+            self.file_format = 'csv'
+
+    def _iter_rows(self, errors):
+        """Поток строк файла: пары (номер строки файла, словарь)
+
+        Нечитаемые строки JSON Lines пропускаются и попадают в errors,
+        остальная часть файла импортируется.
+        """
+        stream = io.TextIOWrapper(io.BytesIO(base64.b64decode(self.data_file)), encoding='utf-8-sig')
+        if self.file_format == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    errors.append(_('Line %s: invalid JSON (%s)') % (line_number, e.msg))
+                    continue
+                if not isinstance(row, dict):
+                    errors.append(_('Line %s: expected a JSON object') % line_number)
+                    continue
+                yield line_number, row
+
+    def _get_standards(self):
+        """Границы допуска из SPC-карт: {(сорт, параметр): (нижняя, верхняя)}"""
+        return {
+            (chart.honey_type, chart.parameter): (
+                chart.lower_spec_limit if chart.use_lower_spec else None,
+                chart.upper_spec_limit if chart.use_upper_spec else None,
+            )
+            for chart in self.env['honey.quality.spc.chart'].search([])
+        }
+
+    def _iter_readings(self, rows, errors):
+        """Разбор и проверка строк: поток значений для create()
+
+        Ошибочные строки пропускаются и попадают в errors. Если в строке
+        нет результата, он определяется по границам допуска сорта мёда.
+        """
+        Batch = self.env['honey.production.batch']
+        standards = self._get_standards()
+        batches = {}
+        for rows_chunk in chunked(rows, max(self.chunk_size, 1)):
+            # Партии ищутся одним запросом на порцию строк
+            names = {row.get('batch') for _line, row in rows_chunk if row.get('batch')} - set(batches)
+            if names:
+                for batch in Batch.search([('name', 'in', list(names))]):
+                    batches[batch.name] = batch
+            for line_number, row in rows_chunk:
+                batch = batches.get(row.get('batch'))
+                if not batch:
+                    errors.append(_('Line %s: unknown batch %s') % (line_number, row.get('batch')))
+                    continue
+                try:
+                    vals = {
+                        name: float(row[name])
+                        for name, _label in SPC_PARAMETERS
+                        if row.get(name) not in (None, '')
+                    }
+                except (TypeError, ValueError):
+                    errors.append(_('Line %s: invalid measurement value') % line_number)
+                    continue
+
+                out_of_spec = []
+                for name, value in vals.items():
+                    lower, upper = standards.get((batch.honey_type, name), (None, None))
+                    if (lower is not None and value < lower) or (upper is not None and value > upper):
+                        out_of_spec.append(name)
+                result = str(row.get('result') or '').strip().lower()
+                if result and result not in QC_IMPORT_RESULTS:
+                    errors.append(_('Line %s: invalid result %s') % (line_number, result))
+                    continue
+                control_date = None
+                if row.get('control_date'):
+                    try:
+                        control_date = fields.Datetime.to_datetime(row['control_date'])
+                    except (TypeError, ValueError):
+                        errors.append(_('Line %s: invalid control date %s') % (line_number, row['control_date']))
+                        continue
+                vals.update({
+                    'batch_id': batch.id,
+                    'result': result or ('failed' if out_of_spec else 'passed'),
+                    'notes': (_('Out of specification: %s') % ', '.join(out_of_spec)) if out_of_spec else row.get('notes'),
+                })
+                if control_date:
+                    vals['control_date'] = control_date
+                yield vals
+
+    def action_import(self):
+        """Потоковый импорт показаний с пакетным созданием контролей"""
+        self.ensure_one()
+        if not self.data_file:
+            raise UserError(_('Please select a file to import.'))
+
+        started = time.perf_counter()
+        errors = []
+        Control = self.env['honey.quality.control'].with_context(skip_batch_quality_update=True)
+        control_ids = []
+        try:
+            for vals_list in chunked(self._iter_readings(self._iter_rows(errors), errors), max(self.chunk_size, 1)):
+                control_ids += Control.create(vals_list).ids
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            raise UserError(_('Could not read the file: %s') % e)
+        controls = self.env['honey.quality.control'].browse(control_ids)
+        # Статус каждой затронутой партии обновляется один раз
+        controls._update_batch_quality_status()
+
+        elapsed = time.perf_counter() - started
+        total = len(controls) + len(errors)
+        self.write({
+            'imported_count': len(controls),
+            'error_count': len(errors),
+            'rows_per_second': total / elapsed if elapsed else 0.0,
+            'error_log': '\n'.join(errors[:1000]),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
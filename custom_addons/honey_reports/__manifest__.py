@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Honey Reports and Printing',
-    'version': '1.2.0',
+    'version': '1.2.1',
     'category': 'Reporting',
     'summary': 'Reports and printing for Honey Sticks Management System',
     'description': """
@@ -12,9 +12,6 @@
         Включает:
         - Lieferschein (накладные) с QR кодами
         - Этикетки коробок A6
-        - Отчёты по производству
-        - Отчёты по комиссиям
-        - Отчёты по логистике
         - QR код генерация
     """,
     'author': 'Honey Sticks Company',
@@ -27,15 +24,13 @@
         'honey_sales',
         'honey_production',
         'honey_logistics',
+        'honey_dashboards',
     ],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'reports/lieferschein_report.xml',
         'reports/box_label_report.xml',
-        'reports/production_report.xml',
-        'reports/commission_report.xml',
-        'reports/shipment_report.xml',
-        'views/report_views.xml',
     ],
     'demo': [],
     'installable': True,
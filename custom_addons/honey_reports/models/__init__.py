@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 
 from . import qr_generator
+from . import report_pipeline
+from . import report_cache
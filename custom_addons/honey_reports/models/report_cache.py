@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import io
+
+from PyPDF2 import PdfFileMerger
+
+from odoo import models, fields, api, tools
+
+
+# Кешируемые отчёты и связи, изменения в которых меняют документ
+CACHED_REPORTS = {
+    'honey_reports.lieferschein_report': [
+        'customer_id', 'customer_id.country_id', 'packaging_ids', 'packaging_ids.batch_id',
+    ],
+    'honey_reports.box_label_report': ['batch_id'],
+}
+# Каждый документ без кеша рендерится отдельным запуском wkhtmltopdf; при
+# большем числе промахов весь отчёт печатается одним проходом без кеша
+REPORT_CACHE_MAX_MISSES = 3
+REPORT_CACHE_SIZE_PARAM = 'honey_reports.report_cache_max_mb'
+DEFAULT_REPORT_CACHE_SIZE_MB = 512
+
+
+class ReportCache(models.Model):
+    _name = 'honey.report.cache'
+    _description = 'Rendered Report Cache'
+    _order = 'last_access desc'
+
+    report_name = fields.Char(
+        string='Report',
+        required=True,
+        readonly=True
+    )
+    res_model = fields.Char(
+        string='Model',
+        required=True,
+        readonly=True
+    )
+    res_id = fields.Integer(
+        string='Record ID',
+        required=True,
+        readonly=True
+    )
+    lang = fields.Char(
+        string='Language',
+        required=True,
+        readonly=True
+    )
+    version = fields.Char(
+        string='Document Version',
+        required=True,
+        readonly=True,
+        help='Дата последнего изменения документа на момент рендеринга'
+    )
+    datas = fields.Binary(
+        string='PDF',
+        attachment=True,
+        readonly=True
+    )
+    file_size = fields.Integer(
+        string='Size',
+        readonly=True
+    )
+    last_access = fields.Datetime(
+        string='Last Access',
+        readonly=True,
+        index=True
+    )
+    hit_count = fields.Integer(
+        string='Hits',
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ('document_uniq', 'unique (report_name, res_id, lang)', 'Only one cached PDF per report, record and language!'),
+    ]
+
+    @api.model
+    def _get_versions(self, report_name, records):
+        """Версия каждого документа: {id: хеш состава и дат изменения}
+
+        В хеш входят пары (id, write_date) самого документа и всех связанных
+        записей, а также часовой пояс пользователя, в котором выводятся даты.
+        Поэтому удаление или перенос строки (например, коробки в другую
+        отгрузку) меняет версию, даже если максимальная дата остаётся прежней.
+        """
+        paths = CACHED_REPORTS.get(report_name, [])
+        tz = self.env.context.get('tz') or self.env.user.tz or 'UTC'
+        versions = {}
+        for record in records:
+            parts = [(record._name, record.id, record.write_date.isoformat())]
+            for path in paths:
+                related = record.mapped(path)
+                parts += sorted(
+                    (related._name, line.id, line.write_date.isoformat() if line.write_date else '')
+                    for line in related
+                )
+            versions[record.id] = '%s:%s' % (tz, hashlib.sha1(repr(parts).encode()).hexdigest())
+        return versions
+
+    @api.model
+    def _lookup(self, report_name, versions, lang):
+        """Актуальные PDF из кеша: {id: содержимое}; время доступа обновляется"""
+        entries = self.search([
+            ('report_name', '=', report_name),
+            ('res_id', 'in', list(versions)),
+            ('lang', '=', lang),
+        ])
+        hits = entries.filtered(lambda entry: entry.version == versions.get(entry.res_id))
+        if hits:
+            self.env.cr.execute("""
+                UPDATE honey_report_cache
+                   SET last_access = now() at time zone 'UTC',
+                       hit_count = hit_count + 1
+                 WHERE id IN %s
+            """, (tuple(hits.ids),))
+        return {entry.res_id: base64.b64decode(entry.datas) for entry in hits}
+
+    @api.model
+    def _store(self, report_name, res_model, pdfs, versions, lang):
+        """Сохранение отрендеренных PDF, заменяя устаревшие версии"""
+        now = fields.Datetime.now()
+        existing = {
+            entry.res_id: entry
+            for entry in self.search([
+                ('report_name', '=', report_name),
+                ('res_id', 'in', list(pdfs)),
+                ('lang', '=', lang),
+            ])
+        }
+        to_create = []
+        for res_id, pdf in pdfs.items():
+            vals = {
+                'version': versions[res_id],
+                'datas': base64.b64encode(pdf),
+                'file_size': len(pdf),
+                'last_access': now,
+                'hit_count': 0,
+            }
+            if res_id in existing:
+                existing[res_id].write(vals)
+            else:
+                to_create.append(dict(vals, report_name=report_name, res_model=res_model, res_id=res_id, lang=lang))
+        if to_create:
+            self.create(to_create)
+
+    @api.model
+    def _cron_evict(self):
+        """Вытеснение давно не использованных PDF сверх лимита размера кеша"""
+        limit = int(self.env['ir.config_parameter'].sudo().get_param(
+            REPORT_CACHE_SIZE_PARAM, DEFAULT_REPORT_CACHE_SIZE_MB)) * 1024 * 1024
+        self.flush(['file_size', 'last_access'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM (
+                    SELECT id, SUM(file_size) OVER (ORDER BY last_access DESC, id DESC) AS running_size
+                      FROM honey_report_cache
+              ) c
+             WHERE running_size > %s
+        """, (limit,))
+        stale = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if stale:
+            stale.unlink()
+
+
+class IrActionsReport(models.Model):
+    _inherit = 'ir.actions.report'
+
+    def _render_qweb_pdf(self, res_ids=None, data=None):
+        # Отчёты с пользовательскими параметрами (не только контекст) не кешируются
+        if (self.report_name not in CACHED_REPORTS or not res_ids
+                or set(data or {}) - {'context', 'report_type'} or tools.config['test_enable']):
+            return super()._render_qweb_pdf(res_ids=res_ids, data=data)
+
+        Cache = self.env['honey.report.cache'].sudo()
+        lang = self.env.lang or 'en_US'
+        records = self.env[self.model].browse(res_ids).exists()
+        if not records:
+            return super()._render_qweb_pdf(res_ids=res_ids, data=data)
+        versions = Cache._get_versions(self.report_name, records)
+        pdfs = Cache._lookup(self.report_name, versions, lang)
+        missing = [res_id for res_id in records.ids if res_id not in pdfs]
+        if len(missing) > REPORT_CACHE_MAX_MISSES:
+            # Первая печать большой волны: один проход без разбиения по документам
+            return super()._render_qweb_pdf(res_ids=res_ids, data=data)
+
+        rendered = {}
+        for res_id in missing:
+            rendered[res_id] = super()._render_qweb_pdf(res_ids=[res_id], data=data)[0]
+        if rendered:
+            Cache._store(self.report_name, self.model, rendered, versions, lang)
+            pdfs.update(rendered)
+
+        if len(records) == 1:
+            return pdfs[records.id], 'pdf'
+        merger = PdfFileMerger(strict=False)
+        for res_id in records.ids:
+            merger.append(io.BytesIO(pdfs[res_id]))
+        output = io.BytesIO()
+        merger.write(output)
+        merger.close()
+        return output.getvalue(), 'pdf'
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PyPDF2 import PdfFileMerger
+
+from odoo import models, api, tools, _
+from odoo.exceptions import UserError
+from odoo.addons.base.models.ir_actions_report import _get_wkhtmltopdf_bin
+
+_logger = logging.getLogger(__name__)
+
+
+# Отчёты, которые при большом количестве документов печатаются порциями
+CHUNKED_REPORTS = (
+    'honey_reports.box_label_report',
+    'honey_reports.lieferschein_report',
+)
+REPORT_CHUNK_SIZE_PARAM = 'honey_reports.report_chunk_size'
+REPORT_WORKERS_PARAM = 'honey_reports.report_workers'
+DEFAULT_REPORT_CHUNK_SIZE = 100
+DEFAULT_REPORT_WORKERS = 4
+
+BOX_LABEL_CHROME = ('header', 'storage', 'footer')
+
+
+def run_wkhtmltopdf(command, pdf_path):
+    """Запуск wkhtmltopdf для одной порции; возвращает путь к PDF"""
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _out, err = process.communicate()
+    if process.returncode not in (0, 1):
+        raise UserError(_('Wkhtmltopdf failed (error code: %s). Message: %s') % (process.returncode, err[-1000:]))
+    return pdf_path
+
+
+class IrActionsReport(models.Model):
+    _inherit = 'ir.actions.report'
+
+    @api.model
+    @tools.ormcache('lang')
+    def _get_box_label_chrome(self, lang):
+        """Статичные блоки этикетки коробки, отрендеренные один раз на язык"""
+        qweb = self.env['ir.qweb'].with_context(lang=lang)
+        return {
+            part: qweb._render('honey_reports.box_label_chrome_%s' % part, {})
+            for part in BOX_LABEL_CHROME
+        }
+
+    def _get_rendering_context(self, docids, data):
+        values = super()._get_rendering_context(docids, data)
+        if self.report_name == 'honey_reports.box_label_report':
+            values['label_chrome'] = self._get_box_label_chrome(self.env.lang or 'en_US')
+        return values
+
+    def _render_qweb_pdf(self, res_ids=None, data=None):
+        params = self.env['ir.config_parameter'].sudo()
+        chunk_size = int(params.get_param(REPORT_CHUNK_SIZE_PARAM, DEFAULT_REPORT_CHUNK_SIZE))
+        if (self.report_name not in CHUNKED_REPORTS or not res_ids or len(res_ids) <= chunk_size
+                or tools.config['test_enable']):
+            return super()._render_qweb_pdf(res_ids=res_ids, data=data)
+        workers = int(params.get_param(REPORT_WORKERS_PARAM, DEFAULT_REPORT_WORKERS))
+        return self._render_qweb_pdf_chunked(res_ids, data, chunk_size, workers), 'pdf'
+
+    def _write_wkhtmltopdf_inputs(self, tmpdir, index, html):
+        """HTML порции во временные файлы и команда wkhtmltopdf для них"""
+        context = dict(self.env.context, debug=False)
+        bodies, _html_ids, header, footer, specific_paperformat_args = self.with_context(context)._prepare_html(html)
+        command = [_get_wkhtmltopdf_bin()] + self._build_wkhtmltopdf_args(
+            self.get_paperformat(),
+            context.get('landscape'),
+            specific_paperformat_args=specific_paperformat_args,
+            set_viewport_size=context.get('set_viewport_size'),
+        )
+        for option, content in (('--header-html', header), ('--footer-html', footer)):
+            if content:
+                path = os.path.join(tmpdir, '%s.%s.html' % (index, option.strip('-')))
+                with open(path, 'wb') as stream:
+                    stream.write(content.encode())
+                command += [option, path]
+        for position, body in enumerate(bodies):
+            path = os.path.join(tmpdir, '%s.body.%s.html' % (index, position))
+            with open(path, 'wb') as stream:
+                stream.write(body.encode())
+            command.append(path)
+        pdf_path = os.path.join(tmpdir, '%s.pdf' % index)
+        return command + [pdf_path], pdf_path
+
+    def _render_qweb_pdf_chunked(self, res_ids, data, chunk_size, workers):
+        """Печать большого количества документов порциями
+
+        HTML каждой порции рендерится в основном потоке (ORM не
+        потокобезопасен) и сразу пишется на диск, а конвертация порций в
+        PDF идёт параллельно в отдельных процессах wkhtmltopdf. Готовые
+        файлы склеиваются с диска, поэтому в памяти одновременно находится
+        HTML только одной порции.
+        """
+        data = dict(data or {}, report_type='pdf')
+        with tempfile.TemporaryDirectory(prefix='honey_report.') as tmpdir, \
+                ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = []
+            for index, start in enumerate(range(0, len(res_ids), chunk_size)):
+                html = self._render_qweb_html(res_ids[start:start + chunk_size], data=data)[0]
+                command, pdf_path = self._write_wkhtmltopdf_inputs(tmpdir, index, html)
+                del html
+                futures.append(executor.submit(run_wkhtmltopdf, command, pdf_path))
+                # Записи порции больше не нужны: освобождаем кеш окружения
+                self.env[self.model].invalidate_cache()
+
+            merger = PdfFileMerger(strict=False)
+            for future in futures:
+                merger.append(future.result())
+            output_path = os.path.join(tmpdir, 'report.pdf')
+            with open(output_path, 'wb') as stream:
+                merger.write(stream)
+            merger.close()
+            _logger.info("Report %s rendered in %s chunks for %s records",
+                         self.report_name, len(futures), len(res_ids))
+            with open(output_path, 'rb') as stream:
+                return stream.read()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import io
+import unittest
+
+from PyPDF2 import PdfFileReader
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+PACKAGES = 5
+CHUNK_SIZE = 2
+
+
+def count_pages(pdf):
+    return PdfFileReader(io.BytesIO(pdf), strict=False).getNumPages()
+
+
+@tagged('post_install', '-at_install')
+class TestReportPipeline(TransactionCase):
+    """Печать порциями должна давать тот же документ, что и обычная печать
+
+    Под test_enable `_render_qweb_pdf` не переключается на порции, поэтому
+    `_render_qweb_pdf_chunked` вызывается напрямую с порцией меньше
+    количества записей.
+    """
+
+    def setUp(self):
+        super().setUp()
+        if self.env['ir.actions.report'].get_wkhtmltopdf_state() != 'ok':
+            raise unittest.SkipTest('wkhtmltopdf is not available')
+        partner = self.env['res.partner'].create({'name': 'Report Test Customer'})
+        order = self.env['sale.order'].create({'partner_id': partner.id})
+        self.shipments = self.env['honey.shipment'].create([
+            {'sale_order_id': order.id} for _index in range(3)
+        ])
+        self.packages = self.env['honey.packaging'].create([{
+            'shipment_id': self.shipments[index % len(self.shipments)].id,
+            'package_size': '20x20x10',
+            'sticks_count': 100,
+            'honey_type': 'acacia',
+        } for index in range(PACKAGES)])
+
+    def _assert_chunked_matches_plain(self, xmlid, res_ids):
+        report = self.env.ref(xmlid)
+        pdf = report._render_qweb_pdf_chunked(res_ids, None, chunk_size=CHUNK_SIZE, workers=2)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        expected_pages = sum(
+            count_pages(report._render_qweb_pdf(res_ids[start:start + CHUNK_SIZE])[0])
+            for start in range(0, len(res_ids), CHUNK_SIZE)
+        )
+        self.assertEqual(count_pages(pdf), expected_pages)
+
+    def test_box_labels_chunked(self):
+        self._assert_chunked_matches_plain('honey_reports.action_box_label_report', self.packages.ids)
+
+    def test_lieferschein_chunked(self):
+        self._assert_chunked_matches_plain('honey_reports.action_lieferschein_report', self.shipments.ids)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Honey Sales Management',
-    'version': '1.2.0',
+    'version': '1.2.1',
     'category': 'Sales',
     'summary': 'Sales orders, commissions and regional management for honey sticks',
     'description': """
@@ -29,9 +29,12 @@
         'security/ir.model.access.csv',
         'security/security.xml',
         'data/ir_sequence_data.xml',
+        'data/ir_cron_data.xml',
+        'views/product_views.xml',
         'views/sale_order_views.xml',
         'views/commission_views.xml',
         'views/payment_commission_views.xml',
+        'views/statement_import_wizard_views.xml',
         'views/menu.xml',
     ],
     'demo': [],
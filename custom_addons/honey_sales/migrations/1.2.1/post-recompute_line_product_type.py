@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Order lines take the honey product type of their product
+
+    honey_product_type on sale.order.line is now a stored related field;
+    the values kept in the existing column are not recomputed by the
+    upgrade, so they are copied over from the product template.
+    """
+    if not version:
+        return
+    cr.execute("""
+        UPDATE sale_order_line line
+           SET honey_product_type = template.honey_product_type
+          FROM product_product product
+          JOIN product_template template ON template.id = product.product_tmpl_id
+         WHERE product.id = line.product_id
+           AND line.honey_product_type IS DISTINCT FROM template.honey_product_type
+    """)
+    cr.execute("""
+        UPDATE sale_order_line
+           SET honey_product_type = NULL
+         WHERE product_id IS NULL
+           AND honey_product_type IS NOT NULL
+    """)
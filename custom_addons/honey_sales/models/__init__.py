@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from . import product
 from . import sale_order
 from . import commission
 from . import payment_commission
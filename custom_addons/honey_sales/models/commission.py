@@ -1,9 +1,18 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
 
+# Bonus rate (%) by regional rank within a month: (worst rank, rate)
+PERFORMANCE_BONUS_TIERS = [
+    (3, 2.0),  # Top 3 in region
+    (5, 1.0),  # Top 5 in region
+]
+
+
 class Commission(models.Model):
     _inherit = 'honey.commission'
 
@@ -25,73 +34,81 @@ class Commission(models.Model):
         digits=(5, 2),
         default=0.0
     )
+    total_with_bonus = fields.Float(
+        string='Total with Bonus',
+        digits=(16, 2),
+        compute='_compute_total_with_bonus',
+        store=True
+    )
     
-    # Regional performance
+    # Regional performance, filled by the monthly bonus calculation
     regional_rank = fields.Integer(
         string='Regional Rank',
-        compute='_compute_regional_rank',
-        store=True
+        readonly=True
     )
     monthly_rank = fields.Integer(
         string='Monthly Rank',
-        compute='_compute_monthly_rank',
-        store=True
+        readonly=True
     )
 
-    @api.depends('agent_id', 'date')
-    def _compute_regional_rank(self):
+    @api.depends('amount', 'performance_bonus')
+    def _compute_total_with_bonus(self):
         for record in self:
-            if record.agent_id and record.region_id:
-                # Calculate rank within region for the month
-                month_start = record.date.replace(day=1)
-                month_end = (month_start + fields.timedelta(days=32)).replace(day=1) - fields.timedelta(days=1)
-                
-                commissions = self.search([
-                    ('agent_id.region_id', '=', record.region_id.id),
-                    ('date', '>=', month_start),
-                    ('date', '<=', month_end),
-                    ('state', 'in', ['confirmed', 'paid'])
-                ])
-                
-                sorted_commissions = commissions.sorted('amount', reverse=True)
-                record.regional_rank = sorted_commissions.ids.index(record.id) + 1 if record.id in sorted_commissions.ids else 0
-            else:
-                record.regional_rank = 0
+            record.total_with_bonus = record.amount + record.performance_bonus
 
-    @api.depends('agent_id', 'date')
-    def _compute_monthly_rank(self):
-        for record in self:
-            if record.agent_id:
-                # Calculate rank for the agent in the month
-                month_start = record.date.replace(day=1)
-                month_end = (month_start + fields.timedelta(days=32)).replace(day=1) - fields.timedelta(days=1)
-                
-                commissions = self.search([
-                    ('agent_id', '=', record.agent_id.id),
-                    ('date', '>=', month_start),
-                    ('date', '<=', month_end),
-                    ('state', 'in', ['confirmed', 'paid'])
-                ])
-                
-                sorted_commissions = commissions.sorted('amount', reverse=True)
-                record.monthly_rank = sorted_commissions.ids.index(record.id) + 1 if record.id in sorted_commissions.ids else 0
-            else:
-                record.monthly_rank = 0
+    @api.model
+    def _calculate_performance_bonus(self, month_start):
+        """Ranks and performance bonus for every commission of one month
+
+        Ranks come from window functions over the confirmed and paid
+        commissions of the month, and ranks, bonus rate, bonus and total are
+        written for the whole month in one statement. Other commissions of
+        the month get zero. amount is left to its own compute.
+        """
+        month_start = month_start.replace(day=1)
+        month_end = month_start + relativedelta(months=1)
+        tiers = ' '.join(
+            'WHEN r.regional_rank <= %s THEN %s' % (rank, rate) for rank, rate in PERFORMANCE_BONUS_TIERS)
+        self.flush(['agent_id', 'region_id', 'date', 'state', 'amount', 'base_amount'])
+        self.env.cr.execute("""
+            WITH ranked AS (
+                SELECT id,
+                       CASE WHEN region_id IS NULL THEN 0
+                            ELSE row_number() OVER (PARTITION BY region_id ORDER BY amount DESC, id) END AS regional_rank,
+                       row_number() OVER (PARTITION BY agent_id ORDER BY amount DESC, id) AS monthly_rank
+                  FROM honey_commission
+                 WHERE date >= %%(start)s AND date < %%(end)s
+                   AND state IN ('confirmed', 'paid')
+            ), rated AS (
+                SELECT c.id, c.amount, c.base_amount,
+                       COALESCE(r.regional_rank, 0) AS regional_rank,
+                       COALESCE(r.monthly_rank, 0) AS monthly_rank,
+                       CASE WHEN r.regional_rank > 0 THEN CASE %(tiers)s ELSE 0 END ELSE 0 END AS rate
+                  FROM honey_commission c
+             LEFT JOIN ranked r ON r.id = c.id
+                 WHERE c.date >= %%(start)s AND c.date < %%(end)s
+            )
+            UPDATE honey_commission c
+               SET regional_rank = v.regional_rank,
+                   monthly_rank = v.monthly_rank,
+                   performance_bonus_rate = v.rate,
+                   performance_bonus = ROUND((v.base_amount * v.rate / 100)::numeric, 2),
+                   total_with_bonus = v.amount + ROUND((v.base_amount * v.rate / 100)::numeric, 2)
+              FROM rated v
+             WHERE c.id = v.id
+         RETURNING c.id
+        """ % {'tiers': tiers}, {'start': month_start, 'end': month_end})
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.browse(ids).invalidate_cache([
+            'regional_rank', 'monthly_rank', 'performance_bonus_rate', 'performance_bonus', 'total_with_bonus',
+        ], ids)
+        return len(ids)
 
     def action_calculate_performance_bonus(self):
-        """Calculate performance bonus based on regional and monthly ranks"""
-        for record in self:
-            if record.regional_rank <= 3:  # Top 3 in region
-                record.performance_bonus_rate = 2.0  # 2% bonus
-            elif record.regional_rank <= 5:  # Top 5 in region
-                record.performance_bonus_rate = 1.0  # 1% bonus
-            else:
-                record.performance_bonus_rate = 0.0
-            
-            if record.performance_bonus_rate > 0:
-                record.performance_bonus = record.base_amount * (record.performance_bonus_rate / 100)
-                # Update total amount
-                record.amount = record.base_amount * (record.commission_rate / 100) + record.performance_bonus
+        """Calculate performance bonus for the months of these commissions"""
+        for month_start in {record.date.replace(day=1) for record in self if record.date}:
+            self._calculate_performance_bonus(month_start)
+        return True
 
 
 class CommissionReport(models.Model):
@@ -1,9 +1,29 @@
 # -*- coding: utf-8 -*-
 
+import re
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
 
+# Уведомлений о начислении, отправляемых за один запуск задания
+NOTIFICATION_BATCH_SIZE = 500
+# Окно сверки по сумме: платёж не дальше стольких дней от даты комиссии
+STATEMENT_MATCH_WINDOW_DAYS = 60
+PAYMENT_REFERENCE_SPLIT = re.compile(r'[\s,;/]+')
+
+
+def normalize_payer_name(name):
+    """Имя плательщика для сравнения: без регистра и лишних пробелов"""
+    return ' '.join((name or '').casefold().split()) or None
+
+
+def normalize_iban(account):
+    """IBAN для сравнения: только буквы и цифры в верхнем регистре"""
+    return re.sub(r'[^0-9A-Za-z]', '', account or '').upper() or None
+
+
 class PaymentCommission(models.Model):
     _name = 'honey.payment.commission'
     _description = 'Payment-based Commission System'
@@ -103,11 +123,29 @@ class PaymentCommission(models.Model):
         string='Payment Confirmation Date'
     )
     
+    # Уведомления, поставленные в очередь при сверке выписки
+    notification_pending = fields.Boolean(
+        string='Notification Pending',
+        default=False,
+        readonly=True
+    )
+    
     # Примечания
     notes = fields.Text(
         string='Notes'
     )
 
+    def init(self):
+        # Сверка выписки ищет комиссии по точному номеру платежа
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_payment_commission_reference_hash_idx
+                ON honey_payment_commission USING hash (payment_reference)
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS honey_payment_commission_notification_idx
+                ON honey_payment_commission (id) WHERE notification_pending
+        """)
+
     @api.depends('order_amount', 'commission_rate')
     def _compute_commission_amount(self):
         for record in self:
@@ -153,6 +191,215 @@ class PaymentCommission(models.Model):
                 raise ValidationError(_('Cannot cancel paid commissions.'))
             record.state = 'cancelled'
 
+    @api.model
+    def _match_statement_lines(self, lines, window_days=STATEMENT_MATCH_WINDOW_DAYS):
+        """Сверка строк банковской выписки с ожидающими оплаты комиссиями
+
+        lines: список словарей с 'date', 'amount', 'reference', а также
+        необязательными 'key' (идентификатор строки выписки), 'payer_name'
+        и 'payer_iban'. Строки, ключ которых уже был сверен при прошлом
+        импорте, пропускаются - повторный импорт той же выписки ничего не
+        подтверждает. Сначала
+        строка ищется по номеру платежа или номеру заказа из назначения
+        платежа (хеш-индекс по payment_reference), затем - по сумме заказа
+        в окне дат. Строка, номер из которой указывает на уже подтверждённый
+        или не ожидающий оплаты заказ, по сумме не сверяется: это повторный
+        платёж, а не оплата другого заказа. Сверка только по сумме
+        принимается, лишь если плательщик (IBAN или имя) совпадает с
+        клиентом заказа. Оплата относится к заказу, поэтому подтверждаются
+        все его комиссии (менеджера и агента). Возвращает (платежи для
+        _confirm_statement_payments, [(номер строки, причина)]).
+        """
+        self.flush(['sale_order_id', 'payment_reference', 'order_amount', 'commission_date', 'payment_confirmed', 'state'])
+        self.env['sale.order'].flush(['name'])
+        self.env.cr.execute("""
+            SELECT id, sale_order_id, order_amount, commission_date, partner_id
+              FROM honey_payment_commission
+             WHERE NOT payment_confirmed
+               AND state IN ('draft', 'pending_payment')
+        """)
+        commissions_by_order = defaultdict(list)
+        orders = {}
+        order_partners = {}
+        for commission_id, order_id, order_amount, commission_date, partner_id in self.env.cr.fetchall():
+            commissions_by_order[order_id].append(commission_id)
+            orders[order_id] = (round((order_amount or 0.0) * 100), commission_date)
+            order_partners[order_id] = partner_id
+        orders_by_amount = defaultdict(list)
+        for order_id, (cents, commission_date) in orders.items():
+            orders_by_amount[cents].append(order_id)
+        payers = self._get_payer_keys(set(order_partners.values()) - {None})
+
+        # Строки, уже сверенные при прошлых импортах
+        keys = [line['key'] for line in lines if line.get('key')]
+        processed_keys = set(self.env['honey.payment.statement.entry'].search(
+            [('key', 'in', keys)]).mapped('key')) if keys else set()
+
+        # Поиск по номерам из назначения платежа одним запросом
+        tokens = [
+            (index, token)
+            for index, line in enumerate(lines)
+            for token in set(PAYMENT_REFERENCE_SPLIT.split(line.get('reference') or ''))
+            if token
+        ]
+        orders_by_line = defaultdict(set)
+        # Строки с номером известного заказа, в том числе уже оплаченного
+        referenced_lines = set()
+        if tokens:
+            self.env.cr.execute("""
+                SELECT v.line, c.sale_order_id
+                  FROM (VALUES %s) AS v(line, token)
+                  JOIN honey_payment_commission c ON c.payment_reference = v.token
+                 UNION
+                SELECT v.line, o.id
+                  FROM (VALUES %s) AS v(line, token)
+                  JOIN sale_order o ON o.name = v.token
+            """ % (', '.join(['%s'] * len(tokens)), ', '.join(['%s'] * len(tokens))), tokens + tokens)
+            for index, order_id in self.env.cr.fetchall():
+                referenced_lines.add(index)
+                if order_id in orders:
+                    orders_by_line[index].add(order_id)
+
+        payments = {}
+        unmatched = []
+        used_orders = set()
+        for index, line in enumerate(lines):
+            if line.get('key') in processed_keys:
+                unmatched.append((index + 1, _('already imported with an earlier statement')))
+                continue
+            cents = round(line['amount'] * 100)
+            if index in referenced_lines:
+                # Заказы, уже оплаченные предыдущими строками выписки, тоже не ожидают оплаты
+                candidates = orders_by_line[index] - used_orders
+                if not candidates:
+                    unmatched.append((index + 1, _('reference belongs to an order that is already confirmed or not pending')))
+                    continue
+                if len(candidates) > 1:
+                    candidates = {order_id for order_id in candidates if orders[order_id][0] == cents}
+                candidates = {order_id for order_id in candidates if cents >= orders[order_id][0]}
+                reason = _('reference matches several orders or the amount is too low')
+            else:
+                candidates = {
+                    order_id for order_id in orders_by_amount.get(cents, [])
+                    if not line['date'] or not orders[order_id][1]
+                    or abs((line['date'] - orders[order_id][1]).days) <= window_days
+                } - used_orders
+                reason = _('no pending commission with this reference or amount')
+                if candidates:
+                    # Одной суммы мало: плательщик должен быть клиентом заказа
+                    line_payer = self._get_line_payer_keys(line)
+                    candidates = {
+                        order_id for order_id in candidates
+                        if line_payer & payers.get(order_partners[order_id], set())
+                    }
+                    reason = _('amount matches, but the payer is not the customer of the order')
+            if len(candidates) != 1:
+                unmatched.append((index + 1, reason if not candidates else _('amount matches several orders')))
+                continue
+            order_id = candidates.pop()
+            used_orders.add(order_id)
+            for commission_id in commissions_by_order[order_id]:
+                payments[commission_id] = (
+                    line['date'], line['amount'], line.get('reference') or None, line.get('key') or None)
+        return payments, unmatched
+
+    @api.model
+    def _get_payer_keys(self, partner_ids):
+        """Признаки плательщика для клиентов: {partner_id: {IBAN и нормализованные имена}}
+
+        Учитываются счета и имя самого контакта и его компании.
+        """
+        if not partner_ids:
+            return {}
+        self.env['res.partner'].flush(['name', 'commercial_partner_id'])
+        self.env['res.partner.bank'].flush(['partner_id', 'sanitized_acc_number'])
+        self.env.cr.execute("""
+            SELECT p.id, p.name, cp.name, b.sanitized_acc_number
+              FROM res_partner p
+              JOIN res_partner cp ON cp.id = COALESCE(p.commercial_partner_id, p.id)
+         LEFT JOIN res_partner_bank b ON b.partner_id IN (p.id, cp.id)
+             WHERE p.id IN %s
+        """, (tuple(partner_ids),))
+        payers = defaultdict(set)
+        for partner_id, name, company_name, account in self.env.cr.fetchall():
+            payers[partner_id].update(
+                key for key in (normalize_payer_name(name), normalize_payer_name(company_name),
+                                normalize_iban(account)) if key)
+        return payers
+
+    @api.model
+    def _get_line_payer_keys(self, line):
+        """Признаки плательщика строки выписки в том же виде, что и _get_payer_keys"""
+        return {
+            key for key in (normalize_payer_name(line.get('payer_name')), normalize_iban(line.get('payer_iban')))
+            if key
+        }
+
+    @api.model
+    def _confirm_statement_payments(self, payments):
+        """Массовое подтверждение оплат по сверке выписки
+
+        payments: {id комиссии: (дата, сумма, номер платежа, ключ строки
+        выписки)}. Все строки обновляются одним запросом, уведомления
+        ставятся в очередь и отправляются заданием. Ключи строк, по которым
+        подтверждена хотя бы одна комиссия, сохраняются, чтобы повторный
+        импорт выписки их пропустил.
+        """
+        if not payments:
+            return self.browse()
+        values = [(commission_id,) + tuple(payment[:3]) for commission_id, payment in payments.items()]
+        self.env.cr.execute("""
+            UPDATE honey_payment_commission c
+               SET payment_confirmed = TRUE,
+                   payment_date = v.payment_date,
+                   payment_amount = v.payment_amount,
+                   payment_reference = COALESCE(v.payment_reference, c.payment_reference),
+                   payment_method = 'bank_transfer',
+                   payment_confirmation_date = %%s,
+                   state = 'confirmed',
+                   notification_pending = TRUE,
+                   write_uid = %%s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES %s) AS v(id, payment_date, payment_amount, payment_reference)
+             WHERE c.id = v.id
+               AND NOT c.payment_confirmed
+         RETURNING c.id
+        """ % ', '.join(['(%s, %s::date, %s::float, %s::varchar)'] * len(values)),
+            [fields.Date.today(), self.env.uid] + [value for row in values for value in row])
+        confirmed = self.browse([row[0] for row in self.env.cr.fetchall()])
+        confirmed.invalidate_cache([
+            'payment_confirmed', 'payment_date', 'payment_amount', 'payment_reference', 'payment_method',
+            'payment_confirmation_date', 'state', 'notification_pending', 'write_uid', 'write_date',
+        ], confirmed.ids)
+        entries = {}
+        for commission in confirmed:
+            payment_date, amount, reference, key = payments[commission.id]
+            if key and key not in entries:
+                entries[key] = {
+                    'key': key,
+                    'date': payment_date,
+                    'amount': amount,
+                    'reference': reference,
+                    'sale_order_id': commission.sale_order_id.id,
+                }
+        if entries:
+            self.env['honey.payment.statement.entry'].create(list(entries.values()))
+        cron = self.env.ref('honey_sales.ir_cron_send_commission_notifications', raise_if_not_found=False)
+        if confirmed and cron:
+            cron._trigger()
+        return confirmed
+
+    @api.model
+    def _cron_send_commission_notifications(self):
+        """Отправка уведомлений о начислении из очереди"""
+        commissions = self.search([('notification_pending', '=', True)], limit=NOTIFICATION_BATCH_SIZE, order='id')
+        if not commissions:
+            return
+        commissions._notify_commission_earned()
+        commissions.write({'notification_pending': False})
+        if len(commissions) == NOTIFICATION_BATCH_SIZE:
+            self.env.ref('honey_sales.ir_cron_send_commission_notifications')._trigger()
+
     def _notify_commission_earned(self):
         """Уведомление о начислении комиссии"""
         for record in self:
@@ -224,3 +471,38 @@ class PaymentCommission(models.Model):
                 'commission_rate': float(agent_rate),
                 'state': 'pending_payment',
             })
+
+
+class PaymentStatementEntry(models.Model):
+    _name = 'honey.payment.statement.entry'
+    _description = 'Reconciled Bank Statement Entry'
+    _order = 'date desc, id desc'
+
+    key = fields.Char(
+        string='Entry Key',
+        required=True,
+        readonly=True,
+        help='Ссылка банка на строку выписки (AcctSvcrRef) или хеш даты, суммы и назначения платежа'
+    )
+    date = fields.Date(
+        string='Date',
+        readonly=True
+    )
+    amount = fields.Float(
+        string='Amount',
+        readonly=True
+    )
+    reference = fields.Char(
+        string='Reference',
+        readonly=True
+    )
+    sale_order_id = fields.Many2one(
+        'sale.order',
+        string='Sale Order',
+        readonly=True,
+        ondelete='set null'
+    )
+
+    _sql_constraints = [
+        ('key_uniq', 'unique (key)', 'This statement entry has already been reconciled!'),
+    ]
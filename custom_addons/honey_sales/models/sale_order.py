@@ -198,12 +198,11 @@ class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
 
     # Honey Sticks specific fields
-    honey_product_type = fields.Selection([
-        ('honey_stick', 'Honey Stick'),
-        ('display', 'Display'),
-        ('packaging', 'Packaging'),
-        ('other', 'Other'),
-    ], string='Product Type', compute='_compute_honey_product_type', store=True)
+    honey_product_type = fields.Selection(
+        string='Product Type',
+        related='product_id.honey_product_type',
+        store=True
+    )
     
     # Batch tracking
     batch_number = fields.Char(
@@ -222,19 +221,3 @@ class SaleOrderLine(models.Model):
         ('standard', 'Standard'),
         ('economy', 'Economy'),
     ], string='Quality Grade', default='standard')
-
-    @api.depends('product_id')
-    def _compute_honey_product_type(self):
-        for record in self:
-            if record.product_id:
-                # Check product category or tags for honey stick type
-                if 'honey' in record.product_id.name.lower() or 'stick' in record.product_id.name.lower():
-                    record.honey_product_type = 'honey_stick'
-                elif 'display' in record.product_id.name.lower():
-                    record.honey_product_type = 'display'
-                elif 'packaging' in record.product_id.name.lower() or 'box' in record.product_id.name.lower():
-                    record.honey_product_type = 'packaging'
-                else:
-                    record.honey_product_type = 'other'
-            else:
-                record.honey_product_type = 'other'
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import hashlib
+import io
+import time
+from collections import defaultdict
+from xml.etree import ElementTree
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from ..models.payment_commission import STATEMENT_MATCH_WINDOW_DAYS
+
+
+def _local_name(tag):
+    """Имя элемента без пространства имён CAMT"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find_text(element, path):
+    """Текст первого элемента по пути из локальных имён"""
+    for name in path:
+        element = next((child for child in element if _local_name(child.tag) == name), None)
+        if element is None:
+            return None
+    return (element.text or '').strip() or None
+
+
+def _find_first_text(element, paths):
+    """Текст по первому из путей, который есть в элементе"""
+    for path in paths:
+        text = _find_text(element, path)
+        if text:
+            return text
+    return None
+
+
+def _children(element, name):
+    return [child for child in element if _local_name(child.tag) == name]
+
+
+def iter_camt_entries(stream):
+    """Поток поступлений из выписки CAMT.053/054
+
+    Элементы разбираются по одному и сразу освобождаются, поэтому память
+    не зависит от размера выписки. Списания (DBIT) пропускаются. Проводка
+    с пакетом платежей (несколько TxDtls) даёт по строке на каждый платёж
+    с его собственной суммой. Ключ строки - ссылка банка (AcctSvcrRef).
+    """
+    for _event, element in ElementTree.iterparse(stream):
+        if _local_name(element.tag) != 'Ntry':
+            continue
+        if _find_text(element, ['CdtDbtInd']) == 'CRDT':
+            date = _find_text(element, ['BookgDt', 'Dt']) or _find_text(element, ['ValDt', 'Dt'])
+            entry_ref = _find_text(element, ['AcctSvcrRef'])
+            transactions = [
+                transaction
+                for details in _children(element, 'NtryDtls')
+                for transaction in _children(details, 'TxDtls')
+            ]
+            if not transactions:
+                yield {
+                    'key': entry_ref and 'camt:%s' % entry_ref,
+                    'date': date,
+                    'amount': _find_text(element, ['Amt']),
+                    'reference': entry_ref if entry_ref and entry_ref != 'NOTPROVIDED' else '',
+                    'payer_name': None,
+                    'payer_iban': None,
+                }
+            for position, transaction in enumerate(transactions):
+                amount = _find_first_text(transaction, [['Amt'], ['AmtDtls', 'TxAmt', 'Amt']])
+                if not amount and len(transactions) == 1:
+                    amount = _find_text(element, ['Amt'])
+                references = [
+                    _find_text(transaction, ['RmtInf', 'Strd', 'CdtrRefInf', 'Ref']),
+                    _find_text(transaction, ['RmtInf', 'Ustrd']),
+                    _find_text(transaction, ['Refs', 'EndToEndId']),
+                    entry_ref if len(transactions) == 1 else None,
+                ]
+                transaction_ref = _find_text(transaction, ['Refs', 'AcctSvcrRef'])
+                if transaction_ref:
+                    key = 'camt:%s' % transaction_ref
+                elif entry_ref:
+                    key = 'camt:%s/%s' % (entry_ref, position)
+                else:
+                    key = None
+                yield {
+                    'key': key,
+                    'date': date,
+                    'amount': amount,
+                    'reference': ' '.join(ref for ref in references if ref and ref != 'NOTPROVIDED'),
+                    'payer_name': _find_first_text(transaction, [
+                        ['RltdPties', 'Dbtr', 'Nm'], ['RltdPties', 'Dbtr', 'Pty', 'Nm'],
+                    ]),
+                    'payer_iban': _find_text(transaction, ['RltdPties', 'DbtrAcct', 'Id', 'IBAN']),
+                }
+        element.clear()
+
+
+def iter_csv_entries(stream):
+    """Поток поступлений из CSV с колонками date, amount, reference
+
+    Необязательные колонки payer и iban используются для проверки
+    плательщика при сверке по сумме.
+    """
+    for row in csv.DictReader(stream):
+        row = {(key or '').strip().lower(): value for key, value in row.items()}
+        yield {
+            'key': None,
+            'date': row.get('date'),
+            'amount': row.get('amount'),
+            'reference': row.get('reference'),
+            'payer_name': row.get('payer'),
+            'payer_iban': row.get('iban'),
+        }
+
+
+def statement_line_key(line, occurrence):
+    """Ключ строки без ссылки банка: хеш даты, суммы, назначения и номера повтора"""
+    raw = '%s|%.2f|%s|%s' % (line['date'] or '', line['amount'], line['reference'], occurrence)
+    return 'hash:%s' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+class PaymentStatementImport(models.TransientModel):
+    _name = 'honey.payment.statement.import'
+    _description = 'Import Bank Statement for Commission Payments'
+
+    data_file = fields.Binary(
+        string='Statement File',
+        required=True,
+        help='Банковская выписка в формате CAMT.053/054 (XML) или CSV'
+    )
+    filename = fields.Char(
+        string='File Name'
+    )
+    file_format = fields.Selection([
+        ('camt', 'CAMT (XML)'),
+        ('csv', 'CSV'),
+    ], string='Format', required=True, default='camt')
+    match_window_days = fields.Integer(
+        string='Date Window (Days)',
+        default=STATEMENT_MATCH_WINDOW_DAYS,
+        help='Для сверки по сумме: допустимое расхождение даты платежа и даты комиссии'
+    )
+
+    # Результаты сверки
+    line_count = fields.Integer(
+        string='Statement Lines',
+        readonly=True
+    )
+    confirmed_count = fields.Integer(
+        string='Confirmed Commissions',
+        readonly=True
+    )
+    unmatched_count = fields.Integer(
+        string='Unmatched Lines',
+        readonly=True
+    )
+    duration = fields.Float(
+        string='Duration (s)',
+        digits=(16, 2),
+        readonly=True
+    )
+    unmatched_log = fields.Text(
+        string='Unmatched Lines Log',
+        readonly=True
+    )
+
+    @api.onchange('filename')
+    def _onchange_filename(self):
+        if self.filename and self.filename.lower().endswith('.csv'):
+            self.file_format = 'csv'
+        elif self.filename:
+            self.file_format = 'camt'
+
+    def _read_lines(self):
+        """Строки выписки: [{'date', 'amount', 'reference'}] и ошибки разбора"""
+        raw = io.BytesIO(base64.b64decode(self.data_file))
+        if self.file_format == 'camt':
+            entries = iter_camt_entries(raw)
+        else:
+            entries = iter_csv_entries(io.TextIOWrapper(raw, encoding='utf-8-sig'))
+
+        lines = []
+        errors = []
+        occurrences = defaultdict(int)
+        for index, entry in enumerate(entries, start=1):
+            try:
+                amount = float((entry['amount'] or '').replace(',', '.'))
+                date = fields.Date.to_date((entry['date'] or '')[:10]) if entry['date'] else None
+            except ValueError:
+                errors.append(_('Line %s: invalid amount or date') % index)
+                continue
+            if amount <= 0:
+                continue
+            line = {
+                'date': date,
+                'amount': amount,
+                'reference': (entry['reference'] or '').strip(),
+                'payer_name': entry['payer_name'],
+                'payer_iban': entry['payer_iban'],
+            }
+            # Одинаковые строки в одной выписке (два равных платежа) различаются номером повтора
+            identity = (date, round(amount * 100), line['reference'])
+            line['key'] = entry['key'] or statement_line_key(line, occurrences[identity])
+            occurrences[identity] += 1
+            lines.append(line)
+        return lines, errors
+
+    def action_import(self):
+        """Сверка выписки и массовое подтверждение оплат"""
+        self.ensure_one()
+        if not self.data_file:
+            raise UserError(_('Please select a statement file to import.'))
+
+        started = time.perf_counter()
+        try:
+            lines, errors = self._read_lines()
+        except (ElementTree.ParseError, UnicodeDecodeError, csv.Error) as e:
+            raise UserError(_('Could not read the statement: %s') % e)
+
+        Commission = self.env['honey.payment.commission']
+        payments, unmatched = Commission._match_statement_lines(lines, self.match_window_days)
+        confirmed = Commission._confirm_statement_payments(payments)
+
+        log = errors + [
+            _('Line %s (%s, %s): %s') % (number, lines[number - 1]['amount'], lines[number - 1]['reference'], reason)
+            for number, reason in unmatched
+        ]
+        self.write({
+            'line_count': len(lines),
+            'confirmed_count': len(confirmed),
+            'unmatched_count': len(unmatched),
+            'duration': time.perf_counter() - started,
+            'unmatched_log': '\n'.join(log[:1000]),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+from . import models
+from . import controllers
+
+
+def post_init_hook(cr, registry):
+    """Построение индекса нормализованных номеров для существующих клиентов"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['res.partner'].search(['|', ('phone', '!=', False), ('mobile', '!=', False)])._sync_whatsapp_phones()
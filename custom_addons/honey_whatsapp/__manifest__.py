@@ -23,14 +23,18 @@
         'mail',
         'honey_participants',
         'honey_sales',
+        'honey_logistics',
     ],
     'data': [
         'security/ir.model.access.csv',
         'views/whatsapp_message_views.xml',
         'views/whatsapp_template_views.xml',
+        'views/whatsapp_event_views.xml',
+        'views/whatsapp_conversation_views.xml',
         'data/whatsapp_template_data.xml',
     ],
     'demo': [],
+    'post_init_hook': 'post_init_hook',
     'installable': True,
     'auto_install': False,
     'application': False,
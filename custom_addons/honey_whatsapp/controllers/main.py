@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import hmac
+import json
+
+from odoo import http
+from odoo.http import request
+
+
+class WhatsAppWebhook(http.Controller):
+
+    def _check_webhook_token(self):
+        """Проверка секретного токена провайдера из заголовка запроса"""
+        expected = request.env['ir.config_parameter'].sudo().get_param('honey_whatsapp.webhook_token')
+        received = request.httprequest.headers.get('X-Honey-Webhook-Token', '')
+        return bool(expected) and hmac.compare_digest(expected, received)
+
+    def _get_batch(self, payload, key):
+        """Список словарей из тела запроса: {key: [...]} или сам список, иначе None"""
+        items = payload.get(key, []) if isinstance(payload, dict) else payload
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+        return items
+
+    def _json_response(self, payload, status=200):
+        return request.make_response(
+            json.dumps(payload),
+            headers=[('Content-Type', 'application/json')],
+            status=status,
+        )
+
+    @http.route('/honey_whatsapp/webhook/status', type='http', auth='public', methods=['POST'], csrf=False)
+    def whatsapp_status_webhook(self, **kwargs):
+        """Приём пачки квитанций о доставке и прочтении сообщений"""
+        if not self._check_webhook_token():
+            return self._json_response({'error': 'forbidden'}, status=403)
+
+        try:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+        except ValueError:
+            return self._json_response({'error': 'invalid json'}, status=400)
+
+        receipts = self._get_batch(payload, 'statuses')
+        if receipts is None:
+            return self._json_response({'error': 'statuses must be a list of objects'}, status=400)
+        result = request.env['honey.whatsapp.message'].sudo()._process_status_receipts(receipts)
+        return self._json_response(result)
+
+    @http.route('/honey_whatsapp/webhook/inbound', type='http', auth='public', methods=['POST'], csrf=False)
+    def whatsapp_inbound_webhook(self, **kwargs):
+        """Приём пачки входящих сообщений от клиентов"""
+        if not self._check_webhook_token():
+            return self._json_response({'error': 'forbidden'}, status=403)
+
+        try:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+        except ValueError:
+            return self._json_response({'error': 'invalid json'}, status=400)
+
+        inbound = self._get_batch(payload, 'messages')
+        if inbound is None:
+            return self._json_response({'error': 'messages must be a list of objects'}, status=400)
+        messages = request.env['honey.whatsapp.message'].sudo()._process_inbound_messages(inbound)
+        return self._json_response({'received': len(inbound), 'created': len(messages)})
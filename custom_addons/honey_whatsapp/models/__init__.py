@@ -2,3 +2,6 @@
 
 from . import whatsapp_message
 from . import whatsapp_template
+from . import whatsapp_event
+from . import whatsapp_phone
+from . import whatsapp_conversation
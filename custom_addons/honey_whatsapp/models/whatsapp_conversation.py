@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+
+
+# Статусы входящих сообщений, которые считаются непрочитанными
+UNREAD_STATUSES = ('sent', 'delivered')
+
+class WhatsAppConversation(models.Model):
+    _name = 'honey.whatsapp.conversation'
+    _description = 'WhatsApp Conversation'
+    _order = 'last_message_date desc, id desc'
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Customer',
+        required=True,
+        ondelete='cascade'
+    )
+    message_ids = fields.One2many(
+        'honey.whatsapp.message',
+        'conversation_id',
+        string='Messages'
+    )
+
+    # Указатель на последнее сообщение и счётчики: увеличиваются при вставке сообщений
+    # и пересчитываются при смене статуса или удалении (_recompute_counters)
+    last_message_id = fields.Many2one(
+        'honey.whatsapp.message',
+        string='Last Message',
+        readonly=True
+    )
+    last_message_date = fields.Datetime(
+        string='Last Message Date',
+        readonly=True,
+        index=True
+    )
+    last_message_text = fields.Text(
+        string='Last Message Text',
+        related='last_message_id.message_text'
+    )
+    message_count = fields.Integer(
+        string='Messages',
+        readonly=True,
+        default=0
+    )
+    unread_count = fields.Integer(
+        string='Unread Messages',
+        readonly=True,
+        default=0
+    )
+
+    _sql_constraints = [
+        ('partner_uniq', 'unique (partner_id)', 'Each customer can only have one WhatsApp conversation!'),
+    ]
+
+    def name_get(self):
+        return [(record.id, record.partner_id.display_name) for record in self]
+
+    @api.model
+    def _get_conversation_ids(self, partner_ids):
+        """Получение (или создание) бесед для клиентов: {partner_id: conversation_id}"""
+        partner_ids = sorted(set(partner_ids))
+        if not partner_ids:
+            return {}
+        self.env.cr.execute("""
+            INSERT INTO honey_whatsapp_conversation
+                (partner_id, message_count, unread_count, create_uid, create_date, write_uid, write_date)
+            SELECT p, 0, 0, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM unnest(%s) AS p
+            ON CONFLICT (partner_id) DO NOTHING
+        """, (self.env.uid, self.env.uid, partner_ids))
+        self.env.cr.execute("""
+            SELECT partner_id, id FROM honey_whatsapp_conversation WHERE partner_id IN %s
+        """, (tuple(partner_ids),))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _register_messages(self, messages):
+        """Привязка новых сообщений к беседам и обновление счётчиков одним UPDATE"""
+        if not messages:
+            return
+        conversation_ids = self._get_conversation_ids(messages.mapped('partner_id').ids)
+
+        stats = {}
+        for message in messages:
+            conversation_id = conversation_ids[message.partner_id.id]
+            entry = stats.setdefault(conversation_id, {'message_ids': [], 'unread': 0, 'last': message})
+            entry['message_ids'].append(message.id)
+            if message.message_type == 'incoming' and message.status in UNREAD_STATUSES:
+                entry['unread'] += 1
+            if (message.message_date, message.id) > (entry['last'].message_date, entry['last'].id):
+                entry['last'] = message
+
+        for conversation_id, entry in stats.items():
+            self.env.cr.execute("""
+                UPDATE honey_whatsapp_message SET conversation_id = %s WHERE id IN %s
+            """, (conversation_id, tuple(entry['message_ids'])))
+
+        values = [
+            (conversation_id, len(entry['message_ids']), entry['unread'], entry['last'].id, entry['last'].message_date)
+            for conversation_id, entry in stats.items()
+        ]
+        self.env.cr.execute("""
+            UPDATE honey_whatsapp_conversation c
+               SET message_count = c.message_count + v.message_count,
+                   unread_count = c.unread_count + v.unread_count,
+                   last_message_id = CASE
+                       WHEN c.last_message_date IS NULL OR v.last_date >= c.last_message_date
+                       THEN v.last_id ELSE c.last_message_id END,
+                   last_message_date = GREATEST(c.last_message_date, v.last_date)
+              FROM (VALUES %s) AS v(id, message_count, unread_count, last_id, last_date)
+             WHERE c.id = v.id
+        """ % ', '.join(['%s'] * len(values)), values)
+
+        messages.invalidate_cache(['conversation_id'], messages.ids)
+        self.browse(list(stats)).invalidate_cache(
+            ['message_count', 'unread_count', 'last_message_id', 'last_message_date'], list(stats))
+
+    def _recompute_counters(self):
+        """Пересчёт счётчиков и последнего сообщения бесед по самим сообщениям
+
+        Один UPDATE на весь набор бесед; вызывается, когда сообщения меняют
+        статус или удаляются и инкрементальное обновление неприменимо.
+        """
+        if not self:
+            return
+        self.env['honey.whatsapp.message'].flush(['conversation_id', 'message_type', 'status', 'message_date'])
+        self.env.cr.execute("""
+            UPDATE honey_whatsapp_conversation c
+               SET message_count = s.message_count,
+                   unread_count = s.unread_count,
+                   last_message_id = s.last_id,
+                   last_message_date = s.last_date
+              FROM (
+                    SELECT conv.id,
+                           COUNT(m.id) AS message_count,
+                           COUNT(m.id) FILTER (WHERE m.message_type = 'incoming'
+                                                 AND m.status IN %s) AS unread_count,
+                           (ARRAY_AGG(m.id ORDER BY m.message_date DESC, m.id DESC))[1] AS last_id,
+                           MAX(m.message_date) AS last_date
+                      FROM honey_whatsapp_conversation conv
+                 LEFT JOIN honey_whatsapp_message m ON m.conversation_id = conv.id
+                     WHERE conv.id IN %s
+                  GROUP BY conv.id
+              ) s
+             WHERE c.id = s.id
+        """, (UNREAD_STATUSES, tuple(self.ids)))
+        self.invalidate_cache(['message_count', 'unread_count', 'last_message_id', 'last_message_date'], self.ids)
+
+    def action_mark_read(self):
+        """Отметить все входящие сообщения беседы как прочитанные"""
+        unread = self.env['honey.whatsapp.message'].search([
+            ('conversation_id', 'in', self.ids),
+            ('message_type', '=', 'incoming'),
+            ('status', 'in', list(UNREAD_STATUSES)),
+        ])
+        # Счётчики бесед пересчитываются в write() сообщений
+        unread.write({'status': 'read'})
+
+    def get_history(self, cursor=None, limit=50):
+        """Постраничная история беседы (keyset-пагинация от новых к старым)
+
+        cursor - пара [message_date, id] последнего полученного сообщения,
+        возвращается в 'next_cursor' предыдущего вызова. Запрос идёт по
+        составному индексу (partner_id, message_date, id), поэтому время
+        ответа не зависит от длины переписки.
+        """
+        self.ensure_one()
+        domain = [('partner_id', '=', self.partner_id.id)]
+        if cursor:
+            cursor_date, cursor_id = fields.Datetime.to_datetime(cursor[0]), cursor[1]
+            domain += [
+                '|',
+                ('message_date', '<', cursor_date),
+                '&', ('message_date', '=', cursor_date), ('id', '<', cursor_id),
+            ]
+        messages = self.env['honey.whatsapp.message'].search_read(
+            domain,
+            ['message_type', 'message_text', 'message_date', 'status', 'sale_order_id', 'shipment_id'],
+            order='message_date desc, id desc',
+            limit=limit,
+        )
+        next_cursor = False
+        if len(messages) == limit:
+            last = messages[-1]
+            next_cursor = [fields.Datetime.to_string(last['message_date']), last['id']]
+        return {
+            'messages': messages,
+            'next_cursor': next_cursor,
+        }
+
+    @api.model
+    def get_partner_history(self, partner_id, cursor=None, limit=50):
+        """История переписки с клиентом по id клиента"""
+        conversation = self.search([('partner_id', '=', partner_id)], limit=1)
+        if not conversation:
+            return {'messages': [], 'next_cursor': False}
+        return conversation.get_history(cursor=cursor, limit=limit)
+
+    def action_view_messages(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('WhatsApp Messages'),
+            'res_model': 'honey.whatsapp.message',
+            'view_mode': 'tree,form',
+            'domain': [('partner_id', '=', self.partner_id.id)],
+            'context': {'default_partner_id': self.partner_id.id},
+        }
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+
+
+class WhatsAppEvent(models.Model):
+    _name = 'honey.whatsapp.event'
+    _description = 'WhatsApp Delivery Event'
+    _order = 'event_date desc, id desc'
+    # Журнал только на добавление: служебные поля write_* не нужны
+    _log_access = False
+
+    message_id = fields.Many2one(
+        'honey.whatsapp.message',
+        string='Message',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Customer',
+        index=True
+    )
+    event_type = fields.Selection([
+        ('sent', 'Sent'),
+        ('delivered', 'Delivered'),
+        ('read', 'Read'),
+        ('failed', 'Failed'),
+    ], string='Event Type', required=True)
+    event_date = fields.Datetime(
+        string='Event Date',
+        required=True,
+        index=True,
+        default=fields.Datetime.now
+    )
+
+    def write(self, vals):
+        raise UserError(_('WhatsApp delivery events are append-only and cannot be modified.'))
+
+    @api.model
+    def _log_events(self, messages, event_type, event_date=None, event_dates=None):
+        """Запись событий доставки для набора сообщений одним create()
+
+        event_dates позволяет передать собственное время события для каждого
+        сообщения ({id сообщения: datetime}), например из квитанций провайдера.
+        """
+        if not messages:
+            return self.browse()
+        event_date = event_date or fields.Datetime.now()
+        event_dates = event_dates or {}
+        return self.create([{
+            'message_id': message.id,
+            'partner_id': message.partner_id.id,
+            'event_type': event_type,
+            'event_date': event_dates.get(message.id, event_date),
+        } for message in messages])
+
+
+class WhatsAppEventReport(models.Model):
+    _name = 'honey.whatsapp.event.report'
+    _description = 'WhatsApp Delivery Statistics'
+    _auto = False
+    _order = 'event_day desc'
+
+    event_day = fields.Date(string='Day', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', readonly=True)
+    sent_count = fields.Integer(string='Sent', readonly=True)
+    delivered_count = fields.Integer(string='Delivered', readonly=True)
+    read_count = fields.Integer(string='Read', readonly=True)
+    failed_count = fields.Integer(string='Failed', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("""
+            CREATE OR REPLACE VIEW %s AS (
+                SELECT
+                    row_number() OVER () AS id,
+                    e.event_date::date AS event_day,
+                    e.partner_id,
+                    count(CASE WHEN e.event_type = 'sent' THEN 1 END) AS sent_count,
+                    count(CASE WHEN e.event_type = 'delivered' THEN 1 END) AS delivered_count,
+                    count(CASE WHEN e.event_type = 'read' THEN 1 END) AS read_count,
+                    count(CASE WHEN e.event_type = 'failed' THEN 1 END) AS failed_count
+                FROM honey_whatsapp_event e
+                GROUP BY e.event_date::date, e.partner_id
+            )
+        """ % self._table)
@@ -1,10 +1,28 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools, _
+from datetime import datetime
+import logging
 import requests
 import json
 
+_logger = logging.getLogger(__name__)
+
+
+# Допустимые переходы статуса по квитанциям провайдера: новый статус -> из каких статусов
+RECEIPT_TRANSITIONS = {
+    'delivered': ('sent',),
+    'read': ('sent', 'delivered'),
+    'failed': ('sent',),
+}
+
+# При нескольких квитанциях на одно сообщение в пачке побеждает самая "поздняя"
+RECEIPT_PRIORITY = {
+    'failed': 1,
+    'delivered': 2,
+    'read': 3,
+}
+
 
 class WhatsAppMessage(models.Model):
     _name = 'honey.whatsapp.message'
@@ -18,6 +36,13 @@ class WhatsAppMessage(models.Model):
         required=True,
         help='Клиент для которого предназначено сообщение'
     )
+    conversation_id = fields.Many2one(
+        'honey.whatsapp.conversation',
+        string='Conversation',
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
     message_type = fields.Selection([
         ('incoming', 'Incoming'),
         ('outgoing', 'Outgoing'),
@@ -37,6 +62,7 @@ class WhatsAppMessage(models.Model):
     # WhatsApp данные
     whatsapp_id = fields.Char(
         string='WhatsApp Message ID',
+        index=True,
         help='Уникальный ID сообщения в WhatsApp'
     )
     phone_number = fields.Char(
@@ -86,16 +112,63 @@ class WhatsAppMessage(models.Model):
         ('custom', 'Custom'),
     ], string='Notification Type')
 
-    @api.model
-    def create(self, vals):
-        """Создание сообщения с автоматической отправкой"""
-        message = super().create(vals)
-        if message.message_type == 'outgoing' and message.status == 'draft':
-            message.action_send()
-        return message
+    def init(self):
+        # Составной индекс для постраничной истории переписки с клиентом
+        tools.create_index(
+            self.env.cr,
+            'honey_whatsapp_message_partner_date_idx',
+            self._table,
+            ['partner_id', 'message_date DESC', 'id DESC'],
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Создание сообщений с привязкой к беседе и автоматической отправкой"""
+        messages = super().create(vals_list)
+        self.env['honey.whatsapp.conversation']._register_messages(messages)
+        messages.filtered(lambda m: m.message_type == 'outgoing' and m.status == 'draft').action_send()
+        return messages
+
+    def write(self, vals):
+        # Статус влияет только на непрочитанные входящие, тип, дата и клиент - на всю беседу
+        if {'message_type', 'message_date', 'partner_id'} & set(vals):
+            conversations = self.conversation_id
+        elif 'status' in vals:
+            conversations = self.filtered(lambda m: m.message_type == 'incoming').conversation_id
+        else:
+            conversations = self.env['honey.whatsapp.conversation']
+        result = super().write(vals)
+        if 'partner_id' in vals:
+            conversations |= self._move_to_partner_conversation()
+        if conversations:
+            conversations._recompute_counters()
+        return result
+
+    def _move_to_partner_conversation(self):
+        """Перенос сообщений в беседу их текущего клиента; возвращает новые беседы"""
+        Conversation = self.env['honey.whatsapp.conversation']
+        conversation_ids = Conversation._get_conversation_ids(self.partner_id.ids)
+        for conversation_id in set(conversation_ids.values()):
+            messages = self.filtered(lambda m: conversation_ids[m.partner_id.id] == conversation_id)
+            super(WhatsAppMessage, messages).write({'conversation_id': conversation_id})
+        return Conversation.browse(list(set(conversation_ids.values())))
+
+    def unlink(self):
+        conversations = self.conversation_id
+        result = super().unlink()
+        conversations.exists()._recompute_counters()
+        return result
 
     def action_send(self):
-        """Отправка сообщения через WhatsApp API"""
+        """Отправка сообщения через WhatsApp API
+
+        Ошибка отправки не прерывает транзакцию: сообщение помечается как
+        failed, а событие сохраняется вместе с ним (исключение откатило бы
+        и статус, и запись в журнале событий).
+        """
+        events = self.env['honey.whatsapp.event']
+        sent_messages = self.browse()
+        failed_messages = self.browse()
         for message in self:
             if message.status != 'draft':
                 continue
@@ -105,36 +178,197 @@ class WhatsAppMessage(models.Model):
                 # Для демонстрации просто меняем статус
                 message.status = 'sent'
                 message.whatsapp_id = f"WA_{message.id}_{fields.Datetime.now().strftime('%Y%m%d%H%M%S')}"
-                
-                # Логирование отправки
-                message._log_activity('message_sent', f'Message sent to {message.partner_id.name}')
+                sent_messages |= message
                 
             except Exception as e:
+                _logger.warning("Failed to send WhatsApp message %s: %s", message.id, e)
                 message.status = 'failed'
-                raise ValidationError(_('Failed to send message: %s') % str(e))
+                failed_messages |= message
+
+        # Логирование отправки одной пачкой
+        events._log_events(sent_messages, 'sent')
+        events._log_events(failed_messages, 'failed')
 
     def action_mark_as_read(self):
         """Отметить сообщение как прочитанное"""
-        for message in self:
-            if message.status in ['sent', 'delivered']:
-                message.status = 'read'
+        messages = self.filtered(lambda m: m.status in ['sent', 'delivered'])
+        messages.write({'status': 'read'})
+        self.env['honey.whatsapp.event']._log_events(messages, 'read')
 
     def action_mark_as_delivered(self):
         """Отметить сообщение как доставленное"""
-        for message in self:
-            if message.status == 'sent':
-                message.status = 'delivered'
-
-    def _log_activity(self, activity_type, note):
-        """Логирование активности"""
-        self.env['mail.activity'].create({
-            'activity_type_id': self.env.ref('mail.mail_activity_data_todo').id,
-            'summary': f'WhatsApp: {note}',
-            'note': note,
-            'res_id': self.id,
-            'res_model': self._name,
-            'user_id': self.env.user.id,
-        })
+        messages = self.filtered(lambda m: m.status == 'sent')
+        messages.write({'status': 'delivered'})
+        self.env['honey.whatsapp.event']._log_events(messages, 'delivered')
+
+    @api.model
+    def _process_status_receipts(self, receipts):
+        """Применение пачки квитанций о доставке/прочтении от провайдера
+
+        Каждая квитанция - словарь {'id': whatsapp_id, 'status': ..., 'timestamp': ...}.
+        Сообщения ищутся по индексу whatsapp_id, статусы меняются одним UPDATE
+        на каждый новый статус. Дубликаты и квитанции, пришедшие не по порядку
+        (например, delivered после read), игнорируются условием на текущий статус.
+        """
+        latest = {}
+        for receipt in receipts:
+            whatsapp_id = receipt.get('id')
+            status = receipt.get('status')
+            if not whatsapp_id or status not in RECEIPT_TRANSITIONS:
+                continue
+            current = latest.get(whatsapp_id)
+            if not current or RECEIPT_PRIORITY[status] > RECEIPT_PRIORITY[current[0]]:
+                latest[whatsapp_id] = (status, self._parse_receipt_timestamp(receipt.get('timestamp')))
+
+        by_status = {}
+        for whatsapp_id, (status, timestamp) in latest.items():
+            by_status.setdefault(status, {})[whatsapp_id] = timestamp
+
+        events = self.env['honey.whatsapp.event']
+        updated = {}
+        for status, timestamps in by_status.items():
+            self.env.cr.execute("""
+                UPDATE honey_whatsapp_message
+                   SET status = %s,
+                       write_uid = %s,
+                       write_date = (now() at time zone 'UTC')
+                 WHERE whatsapp_id IN %s
+                   AND status IN %s
+             RETURNING id, whatsapp_id, conversation_id, message_type
+            """, (status, self.env.uid, tuple(timestamps), RECEIPT_TRANSITIONS[status]))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                continue
+            messages = self.browse([row[0] for row in rows])
+            messages.invalidate_cache(['status', 'write_uid', 'write_date'], messages.ids)
+            events._log_events(
+                messages, status,
+                event_dates={row[0]: timestamps[row[1]] for row in rows},
+            )
+            self.env['honey.whatsapp.conversation'].browse(list({
+                conversation_id for _id, _wa_id, conversation_id, message_type in rows
+                if conversation_id and message_type == 'incoming'
+            }))._recompute_counters()
+            updated[status] = len(rows)
+
+        return {
+            'received': len(receipts),
+            'updated': sum(updated.values()),
+            'ignored': len(receipts) - sum(updated.values()),
+            'by_status': updated,
+        }
+
+    @api.model
+    def _parse_receipt_timestamp(self, value):
+        """Время квитанции: unix timestamp или строка даты, иначе текущее время
+
+        Значения вне допустимого диапазона дат тоже заменяются текущим временем.
+        """
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            try:
+                return datetime.utcfromtimestamp(int(value))
+            except (OverflowError, ValueError, OSError):
+                return fields.Datetime.now()
+        if isinstance(value, str) and value:
+            try:
+                return fields.Datetime.to_datetime(value)
+            except ValueError:
+                pass
+        return fields.Datetime.now()
+
+    @api.model
+    def _process_inbound_messages(self, payloads):
+        """Приём пачки входящих сообщений от провайдера
+
+        Каждое сообщение - словарь {'from': номер, 'text': ..., 'id': whatsapp_id,
+        'timestamp': ...}. Отправитель сопоставляется с клиентом через индекс
+        нормализованных номеров, открытый заказ и отгрузка клиента находятся
+        одним запросом на всю пачку. Повторно присланные сообщения пропускаются.
+        """
+        whatsapp_ids = [payload['id'] for payload in payloads if payload.get('id')]
+        known_ids = set(self.search([('whatsapp_id', 'in', whatsapp_ids)]).mapped('whatsapp_id')) if whatsapp_ids else set()
+
+        Phone = self.env['honey.whatsapp.phone']
+        senders = {payload.get('from') for payload in payloads if payload.get('from')}
+        partner_by_sender = Phone._find_partners(senders)
+
+        # Неизвестные отправители заводятся как новые контакты с номером в E.164,
+        # один контакт на номер, в каком бы формате он ни пришёл
+        senders_by_number = {}
+        for sender, partner in partner_by_sender.items():
+            if not partner:
+                senders_by_number.setdefault(Phone._normalize_sender(sender) or sender, []).append(sender)
+        if senders_by_number:
+            numbers = sorted(senders_by_number)
+            new_partners = self.env['res.partner'].create([{
+                'name': number,
+                'mobile': number,
+                'preferred_contact_method': 'whatsapp',
+            } for number in numbers])
+            for number, partner in zip(numbers, new_partners):
+                partner_by_sender.update(dict.fromkeys(senders_by_number[number], partner))
+
+        partner_ids = list({partner.id for partner in partner_by_sender.values()})
+        open_orders = self._get_open_documents(partner_ids)
+
+        vals_list = []
+        for payload in payloads:
+            sender = payload.get('from')
+            if not sender or payload.get('id') in known_ids:
+                continue
+            partner = partner_by_sender[sender]
+            sale_order_id, shipment_id = open_orders.get(partner.id, (False, False))
+            vals_list.append({
+                'partner_id': partner.id,
+                'message_type': 'incoming',
+                'message_text': payload.get('text') or '',
+                'message_date': self._parse_receipt_timestamp(payload.get('timestamp')),
+                'whatsapp_id': payload.get('id'),
+                'sale_order_id': sale_order_id,
+                'shipment_id': shipment_id,
+                'status': 'delivered',
+            })
+            if payload.get('id'):
+                known_ids.add(payload['id'])
+        return self.create(vals_list) if vals_list else self.browse()
+
+    @api.model
+    def receive_inbound(self, sender, message_text, whatsapp_id=None, timestamp=None):
+        """Приём одного входящего сообщения"""
+        return self._process_inbound_messages([{
+            'from': sender,
+            'text': message_text,
+            'id': whatsapp_id,
+            'timestamp': timestamp,
+        }])
+
+    @api.model
+    def _get_open_documents(self, partner_ids):
+        """Последний открытый заказ и отгрузка по каждому клиенту: {partner_id: (order_id, shipment_id)}"""
+        if not partner_ids:
+            return {}
+        documents = {partner_id: [False, False] for partner_id in partner_ids}
+
+        orders = self.env['sale.order'].search_read([
+            ('partner_id', 'in', partner_ids),
+            ('state', 'in', ['sale', 'done']),
+            ('delivery_status', 'not in', ['delivered', 'returned']),
+        ], ['partner_id'], order='date_order desc, id desc')
+        for order in orders:
+            partner_id = order['partner_id'][0]
+            if not documents[partner_id][0]:
+                documents[partner_id][0] = order['id']
+
+        shipments = self.env['honey.shipment'].search_read([
+            ('customer_id', 'in', partner_ids),
+            ('state', 'not in', ['delivered', 'returned', 'cancelled']),
+        ], ['customer_id'], order='shipment_date desc, id desc')
+        for shipment in shipments:
+            partner_id = shipment['customer_id'][0]
+            if not documents[partner_id][1]:
+                documents[partner_id][1] = shipment['id']
+
+        return {partner_id: tuple(docs) for partner_id, docs in documents.items()}
 
     @api.model
     def send_order_confirmation(self, sale_order):
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+from odoo import models, fields, api, _
+
+
+def normalize_phone(number, country_code=None):
+    """Приведение номера к формату E.164 (+<код страны><номер>)
+
+    country_code - телефонный код страны клиента для номеров, введённых
+    в национальном формате. Возвращает None, если номер не распознан.
+    """
+    if not number:
+        return None
+    number = number.strip()
+    digits = re.sub(r'\D', '', number)
+    if not digits:
+        return None
+
+    if number.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif country_code:
+        country_code = str(country_code)
+        if country_code == '7' and len(digits) == 11 and digits[0] in '78':
+            # Российские номера 8XXXXXXXXXX / 7XXXXXXXXXX
+            digits = '7' + digits[1:]
+        elif digits.startswith('0'):
+            digits = country_code + digits.lstrip('0')
+        elif not digits.startswith(country_code) or len(digits) <= 10:
+            digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+class WhatsAppPhone(models.Model):
+    _name = 'honey.whatsapp.phone'
+    _description = 'WhatsApp Phone Index'
+    # Индекс поддерживается из res.partner, служебные поля не нужны
+    _log_access = False
+
+    name = fields.Char(
+        string='Phone (E.164)',
+        required=True,
+        help='Нормализованный номер телефона в формате E.164'
+    )
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Customer',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    source = fields.Selection([
+        ('mobile', 'Mobile'),
+        ('phone', 'Phone'),
+    ], string='Source', required=True)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique (name)', 'Phone number is already assigned to another customer!'),
+    ]
+
+    @api.model
+    def _normalize(self, number, country=None):
+        """Ключ индекса для номера, введённого вручную в карточке клиента
+
+        Номера в национальном формате дополняются кодом страны клиента
+        или компании.
+        """
+        country_code = (country and country.phone_code) or self.env.company.country_id.phone_code
+        return normalize_phone(number, country_code)
+
+    @api.model
+    def _normalize_sender(self, number):
+        """Ключ индекса для номера отправителя от провайдера
+
+        Провайдер всегда присылает номер в международном формате, но без
+        '+', поэтому код страны компании к нему не добавляется.
+        """
+        number = (number or '').strip()
+        if not number:
+            return None
+        return normalize_phone(number if number.startswith('+') else '+' + number)
+
+    @api.model
+    def _find_partners(self, numbers):
+        """Поиск клиентов по номерам отправителей: {исходный номер: res.partner}"""
+        keys = {number: self._normalize_sender(number) for number in numbers}
+        entries = self.search([('name', 'in', [key for key in keys.values() if key])])
+        partner_by_key = {entry.name: entry.partner_id for entry in entries}
+        return {
+            number: partner_by_key.get(key, self.env['res.partner'])
+            for number, key in keys.items()
+        }
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    whatsapp_phone_ids = fields.One2many(
+        'honey.whatsapp.phone',
+        'partner_id',
+        string='WhatsApp Phone Keys'
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super().create(vals_list)
+        partners.filtered(lambda p: p.phone or p.mobile)._sync_whatsapp_phones()
+        return partners
+
+    def write(self, vals):
+        result = super().write(vals)
+        if {'phone', 'mobile', 'country_id'} & set(vals):
+            self._sync_whatsapp_phones()
+        return result
+
+    def _sync_whatsapp_phones(self):
+        """Пересчёт нормализованных номеров клиентов в индексе honey.whatsapp.phone
+
+        Номер принадлежит тому клиенту, который занял его первым; конфликты
+        разрешаются через уникальный индекс (ON CONFLICT DO NOTHING).
+        """
+        if not self:
+            return
+        self.env['honey.whatsapp.phone'].flush()
+        self.env.cr.execute("DELETE FROM honey_whatsapp_phone WHERE partner_id IN %s", (tuple(self.ids),))
+
+        Phone = self.env['honey.whatsapp.phone']
+        rows = []
+        for partner in self:
+            for source in ('mobile', 'phone'):
+                key = Phone._normalize(partner[source], partner.country_id)
+                if key:
+                    rows.append((key, partner.id, source))
+
+        if rows:
+            values = ', '.join(['%s'] * len(rows))
+            self.env.cr.execute(
+                "INSERT INTO honey_whatsapp_phone (name, partner_id, source) VALUES "
+                + values + " ON CONFLICT (name) DO NOTHING",
+                rows,
+            )
+        self.env['honey.whatsapp.phone'].invalidate_cache()
+        self.invalidate_cache(['whatsapp_phone_ids'], self.ids)
@@ -1,6 +1,21 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import re
+
+from odoo import models, fields, api, tools, _
+
+
+# Переменная шаблона вида {partner_name}
+TEMPLATE_VARIABLE_RE = re.compile(r'\{(\w+)\}')
+
+# Переменная шаблона -> поле записи, из которого берётся значение
+TEMPLATE_VARIABLE_FIELDS = {
+    'order_number': 'name',
+    'shipment_number': 'name',
+    'amount': 'amount_total',
+    'boxes_count': 'boxes_count',
+    'tracking_number': 'tracking_number',
+}
 
 
 class WhatsAppTemplate(models.Model):
@@ -73,36 +88,86 @@ class WhatsAppTemplate(models.Model):
         help='Шаблон уведомления о готовности отгрузки'
     )
 
+    @api.model
+    @tools.ormcache('template_id', 'write_date')
+    def _get_compiled_template(self, template_id, write_date):
+        """Компиляция текста шаблона в программу из пар (литерал, переменная)
+
+        Результат кэшируется по id шаблона и write_date, поэтому после
+        изменения шаблона автоматически используется новая версия.
+        """
+        template_text = self.browse(template_id).template_text or ''
+        program = []
+        position = 0
+        for match in TEMPLATE_VARIABLE_RE.finditer(template_text):
+            program.append((template_text[position:match.start()], match.group(1)))
+            position = match.end()
+        program.append((template_text[position:], None))
+        return tuple(program)
+
+    def _get_template_values(self, records, variables):
+        """Предзагрузка значений переменных для всего набора записей"""
+        record_fields = records._fields
+        partner_field = 'partner_id' if 'partner_id' in record_fields else 'customer_id'
+
+        field_names = {
+            TEMPLATE_VARIABLE_FIELDS[variable]
+            for variable in variables
+            if variable in TEMPLATE_VARIABLE_FIELDS and TEMPLATE_VARIABLE_FIELDS[variable] in record_fields
+        }
+        if 'partner_name' in variables:
+            field_names.add(partner_field)
+
+        # Одно чтение на поле для всего набора вместо обхода атрибутов каждой записи
+        rows = records.read(list(field_names), load=None) if field_names else [{'id': record.id} for record in records]
+
+        partner_names = {}
+        if 'partner_name' in variables:
+            partner_ids = {row[partner_field] for row in rows if row.get(partner_field)}
+            partners = self.env['res.partner'].browse(partner_ids)
+            partner_names = {partner['id']: partner['name'] for partner in partners.read(['name'])}
+
+        today = fields.Date.today().strftime('%d.%m.%Y')
+        values = {}
+        for row in rows:
+            record_values = {'date': today}
+            if 'partner_name' in variables:
+                record_values['partner_name'] = partner_names.get(row.get(partner_field), '')
+            for variable in variables:
+                field_name = TEMPLATE_VARIABLE_FIELDS.get(variable)
+                if field_name not in row:
+                    continue
+                value = row[field_name]
+                if variable == 'amount':
+                    value = f"{value:,.2f}"
+                elif variable == 'tracking_number':
+                    value = value or 'Будет предоставлен'
+                record_values[variable] = str(value)
+            values[row['id']] = record_values
+        return values
+
+    def render_template_batch(self, records):
+        """Рендеринг шаблона для набора записей, возвращает {id записи: текст}"""
+        self.ensure_one()
+        program = self._get_compiled_template(self.id, self.write_date)
+        variables = {variable for _literal, variable in program if variable}
+        values = self._get_template_values(records, variables)
+
+        rendered = {}
+        for record_id, record_values in values.items():
+            parts = []
+            for literal, variable in program:
+                parts.append(literal)
+                if variable:
+                    # Неизвестные переменные остаются в тексте как есть
+                    parts.append(record_values.get(variable, '{%s}' % variable))
+            rendered[record_id] = ''.join(parts)
+        return rendered
+
     def render_template(self, record):
         """Рендеринг шаблона с данными записи"""
         self.ensure_one()
-        
-        # Базовые переменные
-        variables = {
-            'partner_name': record.partner_id.name if hasattr(record, 'partner_id') else record.customer_id.name,
-            'date': fields.Date.today().strftime('%d.%m.%Y'),
-        }
-        
-        # Специфичные переменные для разных типов записей
-        if hasattr(record, 'name'):
-            variables['order_number'] = record.name
-            variables['shipment_number'] = record.name
-            
-        if hasattr(record, 'amount_total'):
-            variables['amount'] = f"{record.amount_total:,.2f}"
-            
-        if hasattr(record, 'boxes_count'):
-            variables['boxes_count'] = record.boxes_count
-            
-        if hasattr(record, 'tracking_number'):
-            variables['tracking_number'] = record.tracking_number or 'Будет предоставлен'
-        
-        # Замена переменных в шаблоне
-        rendered_text = self.template_text
-        for key, value in variables.items():
-            rendered_text = rendered_text.replace(f'{{{key}}}', str(value))
-            
-        return rendered_text
+        return self.render_template_batch(record)[record.id]
 
     @api.model
     def get_template_by_type(self, template_type):